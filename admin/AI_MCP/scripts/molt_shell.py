@@ -14,6 +14,7 @@ call your existing PHP OpenAI endpoint.
 
 import os, sys, json, re, subprocess, time
 from pathlib import Path
+from logtail import tail_lines
 
 # ---- CONFIG ----
 READ_ROOTS = ["/var/log", "/web/private/logs", str(Path.home() / ".clawdbot" / "inbox" / "logs")]
@@ -54,8 +55,8 @@ def cmd_read(args):
     if not is_under(path, READ_ROOTS):
         return f"ERR not allowed: READ {path}"
     try:
-        out = subprocess.check_output(["tail", "-n", str(lines), path], text=True, errors="ignore")
-        return out
+        out = tail_lines(path, lines)
+        return "\n".join(out) + "\n" if out else ""
     except Exception as e:
         return f"ERR read failed: {e}"
 
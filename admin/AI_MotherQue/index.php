@@ -112,10 +112,14 @@ if ($queueDbExists) {
         $db = new PDO('sqlite:' . $MOTHER_QUEUE_DB);
         $db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
         
-        // Get stats by status
-        $result = $db->query("SELECT status, COUNT(*) as cnt FROM jobs GROUP BY status");
+        // Get stats by status (trigger-maintained by mq.py; fall back to a scan on old DBs)
+        $hasCounts = $db->query("SELECT 1 FROM sqlite_master WHERE type='table' AND name='job_status_counts'")->fetchColumn();
+        $sql = $hasCounts
+            ? "SELECT status, SUM(n) as cnt FROM job_status_counts GROUP BY status"
+            : "SELECT status, COUNT(*) as cnt FROM jobs GROUP BY status";
+        $result = $db->query($sql);
         foreach ($result as $row) {
-            $queueStats[$row['status']] = $row['cnt'];
+            $queueStats[$row['status']] = (int)$row['cnt'];
         }
         
         // Get recent jobs (limit 20)
@@ -0,0 +1,116 @@
+# /web/private/lib/mother_queue/mq_handlers.py
+"""
+Job handler registry for worker.py.
+
+Handlers are plain callables `fn(job, payload)`. Script-backed handlers load a
+worker script (e.g. ingest_bash_history_to_kb.py) as a module once and call its
+`main(argv)` in-process on every job, so each job no longer pays interpreter
+startup, imports and bootstrap path resolution. `isolate=True` keeps the old
+fork-per-job behaviour for scripts that must not share the worker's process.
+
+Every run is timed per handler; `format_metrics()` renders the totals.
+"""
+import importlib.util, os, subprocess, sys, threading, time
+from typing import Any, Callable, Dict, List, Optional
+
+Handler = Callable[[Dict[str, Any], Dict[str, Any]], None]
+ArgvBuilder = Callable[[Dict[str, Any]], List[str]]
+
+
+class HandlerRegistry:
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._modules: Dict[str, Any] = {}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, fn: Optional[Handler] = None):
+        """Register fn for job `name`; usable as a decorator when fn is omitted."""
+        def deco(f: Handler) -> Handler:
+            self._handlers[name] = f
+            return f
+        return deco(fn) if fn is not None else deco
+
+    def register_script(self, name: str, script_path: str, argv: ArgvBuilder, isolate: bool = False) -> None:
+        """
+        Run `script_path` for job `name`. argv(payload) builds the script's
+        argument list (and should raise on a bad payload). In-process mode needs
+        the script to expose `main(argv) -> int`; a non-zero return fails the job.
+        """
+        def run(job: Dict[str, Any], payload: Dict[str, Any]) -> None:
+            args = argv(payload)
+            if isolate:
+                subprocess.check_call([sys.executable, script_path, *args])
+                return
+            mod = self._load(name, script_path)
+            try:
+                rc = mod.main(args)
+            except SystemExit as e:  # argparse errors and explicit exits
+                rc = e.code
+            if rc not in (0, None):
+                raise RuntimeError(f"{os.path.basename(script_path)} exited with {rc}")
+
+        self._handlers[name] = run
+
+    def has(self, name: str) -> bool:
+        return name in self._handlers
+
+    def run(self, name: str, job: Dict[str, Any], payload: Dict[str, Any]) -> None:
+        fn = self._handlers.get(name)
+        if fn is None:
+            raise RuntimeError(f"Unknown job name: {name}")
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            fn(job, payload)
+            ok = True
+        finally:
+            self._record(name, time.perf_counter() - t0, ok)
+
+    def _load(self, name: str, script_path: str):
+        """Import a script once per process; later jobs reuse the module."""
+        with self._lock:
+            mod = self._modules.get(script_path)
+            if mod is not None:
+                return mod
+            t0 = time.perf_counter()
+            spec = importlib.util.spec_from_file_location(f"mq_job_{name}", script_path)
+            if spec is None or spec.loader is None:
+                raise RuntimeError(f"Cannot load job script: {script_path}")
+            # Scripts import their siblings (notes_config, bash_tokens, ...), as they would
+            # when run directly from their own directory.
+            script_dir = os.path.dirname(os.path.abspath(script_path))
+            if script_dir not in sys.path:
+                sys.path.insert(0, script_dir)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            if not callable(getattr(mod, "main", None)):
+                raise RuntimeError(f"Job script has no main(): {script_path}")
+            self._modules[script_path] = mod
+            self._metric(name)["load_s"] += time.perf_counter() - t0
+            return mod
+
+    def _metric(self, name: str) -> Dict[str, float]:
+        return self._metrics.setdefault(name, {"runs": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0, "load_s": 0.0})
+
+    def _record(self, name: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            m = self._metric(name)
+            m["runs"] += 1
+            m["errors"] += 0 if ok else 1
+            m["total_s"] += seconds
+            m["max_s"] = max(m["max_s"], seconds)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._metrics.items()}
+
+    def format_metrics(self) -> List[str]:
+        out = []
+        for name, m in sorted(self.metrics().items()):
+            avg = m["total_s"] / m["runs"] if m["runs"] else 0.0
+            out.append(
+                f"handler={name} runs={int(m['runs'])} errors={int(m['errors'])} "
+                f"avg={avg:.3f}s max={m['max_s']:.3f}s total={m['total_s']:.3f}s load={m['load_s']:.3f}s"
+            )
+        return out
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 # /web/html/admin/AI/scripts/worker.py
-import json, os, sys, time, traceback
-from mq import MotherQueue
+import argparse, json, os, sys, time, traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from mq import LeaseKeeper, MotherQueue, QueueWaker
+from mq_handlers import HandlerRegistry
 
 DB = os.environ.get("MOTHER_QUEUE_DB", "/web/private/db/memory/mother_queue.db")
 PIDFILE = "/tmp/mq_worker_{queue}.pid"
 AUTO_EXIT_SECONDS = 300  # Exit after 5 minutes
+BATCH_SIZE = int(os.environ.get("MQ_BATCH_SIZE", "10"))  # jobs claimed per lease transaction
+CONCURRENCY = int(os.environ.get("MQ_CONCURRENCY", "1"))  # jobs in flight per queue
+LEASE_SECONDS = 120
+REAP_INTERVAL_SECONDS = 60  # how often the worker requeues expired leases
+IDLE_MAX_SECONDS = float(os.environ.get("MQ_IDLE_MAX_SECONDS", "30"))  # backoff cap while the queue stays empty
 SCRIPTS_DIR = os.environ.get("MCP_SCRIPTS_DIR", "/web/private/mcp/scripts")
 ALLOWED_EXTS = (".py", ".sh")
 
@@ -37,31 +44,34 @@ def run_job_script(script_path: str, payload: dict):
     raise RuntimeError(f"Unsupported script type: {script_path}")
 
 
-def handle_job(job, payload):
-    name = job["name"]
+HANDLERS = HandlerRegistry()
+HANDLERS.register("noop", lambda job, payload: None)
 
-    if name == "noop":
-        return
+def _ingest_argv(payload):
+    user = payload.get("user")
+    if user not in ("samekhi", "root"):
+        raise RuntimeError(f"Bad user: {user}")
+    return [user]
 
-    # Optional: keep legacy hardcoded ones during transition
-    if name == "ingest_bash_history":
-        user = payload.get("user")
-        if user not in ("samekhi", "root"):
-            raise RuntimeError(f"Bad user: {user}")
-
-        import subprocess
-        subprocess.check_call([
-            sys.executable,
-            "/web/private/scripts/ingest_bash_history_to_kb.py",
-            user
-        ])
-        return
+# Runs in-process (module imported once); MQ_ISOLATE_INGEST=1 forks per job as before.
+HANDLERS.register_script(
+    "ingest_bash_history",
+    "/web/private/scripts/ingest_bash_history_to_kb.py",
+    _ingest_argv,
+    isolate=os.environ.get("MQ_ISOLATE_INGEST") == "1",
+)
+
+def handle_job(job, payload):
+    name = job["name"]
 
-    script = find_script_for_job(name)
-    if not script:
-        raise RuntimeError(f"tool/skill not found: {name} (no script in {SCRIPTS_DIR})")
+    if not HANDLERS.has(name):
+        script = find_script_for_job(name)
+        if not script:
+            raise RuntimeError(f"tool/skill not found: {name} (no script in {SCRIPTS_DIR})")
+        # MCP scripts take the payload as JSON, not main(argv); always fork them.
+        HANDLERS.register(name, lambda job, payload, script=script: run_job_script(script, payload))
 
-    run_job_script(script, payload)
+    HANDLERS.run(name, job, payload)
 
 def acquire_lock(pidfile):
     """Try to acquire a PID lock. Returns True if successful, False if another worker is running."""
@@ -89,46 +99,142 @@ def release_lock(pidfile):
     except OSError:
         pass
 
+def idle_wait(waker, idle, sleep_s, deadline):
+    """Block until poked or `idle` elapses; return the next idle interval (adaptive backoff)."""
+    if waker.wait(min(idle, max(0.0, deadline - time.time()))):
+        return sleep_s
+    return min(idle * 2, IDLE_MAX_SECONDS)
+
+def reap_if_due(mq, last_reap):
+    """Requeue jobs stranded by dead workers every REAP_INTERVAL_SECONDS."""
+    now = time.time()
+    if now - last_reap < REAP_INTERVAL_SECONDS:
+        return last_reap
+    reaped = mq.reap_expired()
+    if reaped:
+        print(f"[mq] reaped {reaped} expired lease(s)")
+    return now
+
+def run_serial(mq, waker, keeper, queue, sleep_s, batch_size, deadline):
+    """One worker: lease a batch, run it in order, settle it in one go."""
+    idle = sleep_s
+    last_reap = 0.0
+    while time.time() < deadline:
+        last_reap = reap_if_due(mq, last_reap)
+        batch = mq.lease_many(queue, limit=batch_size, lease_seconds=LEASE_SECONDS, worker=keeper.worker)
+        if not batch:
+            idle = idle_wait(waker, idle, sleep_s, deadline)
+            continue
+        idle = sleep_s
+        keeper.add(job["id"] for job, _ in batch)
+
+        done, failed = [], []
+        try:
+            for job, payload in batch:
+                try:
+                    handle_job(job, payload)
+                    done.append(job["id"])
+                except Exception as e:
+                    err = f"{e}\n{traceback.format_exc()}"
+                    failed.append((job["id"], err))
+        finally:
+            # Settle whatever finished, even if we were interrupted mid-batch.
+            mq.ack_many(done, worker=keeper.worker)
+            mq.fail_many(failed, retry_delay_seconds=60, worker=keeper.worker)
+            keeper.discard(job["id"] for job, _ in batch)
+
+def run_pool(mq, waker, keeper, queue, sleep_s, batch_size, concurrency, use_processes, deadline):
+    """
+    Supervisor: a single lease loop feeding `concurrency` worker threads/processes.
+    Only this loop talks to the DB; it leases no more jobs than there are free
+    slots so nothing sits leased in a local backlog while its lease runs down.
+    Finished jobs poke the waker, so one wait covers both new work and free slots.
+    """
+    executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    inflight = {}  # future -> job_id
+    idle = sleep_s
+    last_reap = 0.0
+
+    with executor_cls(max_workers=concurrency) as pool:
+        while inflight or time.time() < deadline:
+            free = concurrency - len(inflight)
+            leased = []
+            if free > 0 and time.time() < deadline:
+                last_reap = reap_if_due(mq, last_reap)
+                leased = mq.lease_many(queue, limit=min(batch_size, free), lease_seconds=LEASE_SECONDS,
+                                        worker=keeper.worker)
+                keeper.add(job["id"] for job, _ in leased)
+                for job, payload in leased:
+                    fut = pool.submit(handle_job, job, payload)
+                    inflight[fut] = job["id"]
+                    fut.add_done_callback(waker.poke)
+
+            done, failed = [], []
+            for fut in [f for f in inflight if f.done()]:
+                job_id = inflight.pop(fut)
+                e = fut.exception()
+                if e is None:
+                    done.append(job_id)
+                else:
+                    err = f"{e}\n{''.join(traceback.format_exception(type(e), e, e.__traceback__))}"
+                    failed.append((job_id, err))
+            mq.ack_many(done, worker=keeper.worker)
+            mq.fail_many(failed, retry_delay_seconds=60, worker=keeper.worker)
+            keeper.discard(done)
+            keeper.discard(job_id for job_id, _ in failed)
+
+            if leased or done or failed:
+                idle = sleep_s
+                continue
+            if not inflight and time.time() >= deadline:
+                break
+            # Past the deadline we are only draining in-flight jobs; their pokes wake us.
+            idle = idle_wait(waker, idle, sleep_s, max(deadline, time.time() + idle))
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: worker.py <queue> [sleep_seconds]")
-        sys.exit(2)
+    parser = argparse.ArgumentParser(description="MotherQueue worker")
+    parser.add_argument("queue", help="Queue name")
+    parser.add_argument("sleep_seconds", nargs="?", type=int, default=2, help="Initial idle poll interval (backs off to MQ_IDLE_MAX_SECONDS)")
+    parser.add_argument("batch_size", nargs="?", type=int, default=BATCH_SIZE, help="Jobs claimed per lease")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help="Jobs run at once for this queue (1 = classic serial worker)")
+    parser.add_argument("--processes", action="store_true",
+                        help="Run jobs in worker processes instead of threads")
+    args = parser.parse_args()
+
+    queue = args.queue
+    sleep_s = args.sleep_seconds
+    batch_size = max(1, args.batch_size)
+    concurrency = max(1, args.concurrency)
 
-    queue = sys.argv[1]
-    sleep_s = int(sys.argv[2]) if len(sys.argv) >= 3 else 2
-    
     pidfile = PIDFILE.format(queue=queue)
-    
-    # Try to acquire lock
+
+    # The lock belongs to the supervisor; pool workers never touch it.
     if not acquire_lock(pidfile):
         print(f"[mq] Another worker for queue '{queue}' is already running. Exiting.")
         sys.exit(0)
 
     mq = MotherQueue(DB)
-    print(f"[mq] worker up. db={DB} queue={queue} pid={os.getpid()} auto_exit={AUTO_EXIT_SECONDS}s")
-    
-    start_time = time.time()
+    waker = QueueWaker(queue)
+    mode = "serial" if concurrency == 1 else ("processes" if args.processes else "threads")
+    print(f"[mq] worker up. db={DB} queue={queue} pid={os.getpid()} auto_exit={AUTO_EXIT_SECONDS}s "
+          f"batch={batch_size} concurrency={concurrency} mode={mode}")
 
-    try:
-        while True:
-            # Check if we should auto-exit
-            if time.time() - start_time > AUTO_EXIT_SECONDS:
-                print(f"[mq] Auto-exit after {AUTO_EXIT_SECONDS}s")
-                break
-            
-            leased = mq.lease_one(queue, lease_seconds=120)
-            if not leased:
-                time.sleep(sleep_s)
-                continue
+    deadline = time.time() + AUTO_EXIT_SECONDS
 
-            job, payload = leased
-            try:
-                handle_job(job, payload)
-                mq.ack(job["id"])
-            except Exception as e:
-                err = f"{e}\n{traceback.format_exc()}"
-                mq.fail(job["id"], err, retry_delay_seconds=60)
+    try:
+        with LeaseKeeper(mq, lease_seconds=LEASE_SECONDS) as keeper:
+            if concurrency == 1:
+                run_serial(mq, waker, keeper, queue, sleep_s, batch_size, deadline)
+            else:
+                run_pool(mq, waker, keeper, queue, sleep_s, batch_size, concurrency, args.processes, deadline)
+        print(f"[mq] Auto-exit after {AUTO_EXIT_SECONDS}s")
     finally:
+        # Process-pool children keep their own counters; these cover serial/thread mode.
+        for line in HANDLERS.format_metrics():
+            print(f"[mq] {line}")
+        waker.close()
+        mq.close()
         release_lock(pidfile)
 
 if __name__ == "__main__":
@@ -241,6 +241,13 @@ $rows = [
     ['model_timeout_seconds', 'LLM request timeout in seconds (e.g. 900 for 15 minutes)'],
     ['percent_rewrite', '0-100 chance for rewrite'],
     ['limit_per_run', 'Max files per run'],
+    ['llm_concurrency', 'Parallel LLM requests per run (1 = serial)'],
+    ['cache_results', 'Reuse earlier results for identical file content (same action/model/prompt)'],
+    ['llm_stream', 'Stream LLM replies and stop once the code block / JSON is complete'],
+    ['llm_stream_usage', 'Request token usage in streamed OpenAI-compatible replies (turn off if the server rejects stream_options)'],
+    ['chunk_large_files', 'Analyze files over max_filesize_kb in parts (summaries/audits) instead of skipping/truncating'],
+    ['chunk_kb', 'Target part size in KB for chunked analysis'],
+    ['max_chunked_kb', 'Largest code file analyzed in parts; logs use this much of their tail'],
     ['max_filesize_kb', 'Max KB read for code'],
     ['log_tail_lines', 'Tail lines for .log'],
     ['respect_gitignore', 'Basic .gitignore respect'],
@@ -109,12 +109,39 @@ function cw_cwdb_init(PDO $pdo): void
         action_id INTEGER PRIMARY KEY,
         suggestions TEXT
     )');
-    $pdo->exec('CREATE VIEW IF NOT EXISTS vw_last_actions AS
-        SELECT a.*, f.path FROM actions a
-        JOIN files f ON f.id = a.file_id
-        WHERE a.id IN (
-            SELECT MAX(id) FROM actions GROUP BY file_id
-        )');
+    $pdo->exec('CREATE INDEX IF NOT EXISTS idx_actions_dedupe ON actions(file_id, model, action, status, created_at)');
+
+    // Latest action per file, kept current by triggers (replaces MAX(id) ... GROUP BY file_id).
+    $pdo->exec('CREATE TABLE IF NOT EXISTS file_latest_action (
+        file_id INTEGER PRIMARY KEY,
+        action_id INTEGER NOT NULL
+    )');
+    $pdo->exec('CREATE TRIGGER IF NOT EXISTS trg_actions_latest_ins AFTER INSERT ON actions
+        WHEN NEW.file_id IS NOT NULL
+        BEGIN
+            INSERT INTO file_latest_action(file_id, action_id) VALUES (NEW.file_id, NEW.id)
+                ON CONFLICT(file_id) DO UPDATE SET action_id = excluded.action_id
+                WHERE excluded.action_id > file_latest_action.action_id;
+        END');
+    $pdo->exec('CREATE TRIGGER IF NOT EXISTS trg_actions_latest_del AFTER DELETE ON actions
+        WHEN OLD.id = (SELECT action_id FROM file_latest_action WHERE file_id = OLD.file_id)
+        BEGIN
+            DELETE FROM file_latest_action WHERE file_id = OLD.file_id;
+            INSERT INTO file_latest_action(file_id, action_id)
+                SELECT file_id, MAX(id) FROM actions WHERE file_id = OLD.file_id GROUP BY file_id;
+        END');
+
+    // Migration: older DBs have the MAX(id)-based view; swap it and backfill once.
+    $viewSql = (string)$pdo->query("SELECT sql FROM sqlite_master WHERE type='view' AND name='vw_last_actions'")->fetchColumn();
+    if (strpos($viewSql, 'file_latest_action') === false) {
+        $pdo->exec('DROP VIEW IF EXISTS vw_last_actions');
+        $pdo->exec('CREATE VIEW vw_last_actions AS
+            SELECT a.*, f.path FROM file_latest_action l
+            JOIN actions a ON a.id = l.action_id
+            JOIN files f ON f.id = l.file_id');
+        $pdo->exec('INSERT OR REPLACE INTO file_latest_action(file_id, action_id)
+            SELECT file_id, MAX(id) FROM actions WHERE file_id IS NOT NULL GROUP BY file_id');
+    }
 
     $pdo->exec('CREATE TABLE IF NOT EXISTS queued_files (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -192,25 +219,17 @@ function cw_pick_random_action(array $cfg): string
 
 function cw_is_file_already_processed(PDO $pdo, string $path, string $model, string $action): bool
 {
-    $filesize = @filesize($path);
-    if ($filesize === false) $filesize = 0;
-    
-    $stmt = $pdo->prepare('SELECT COUNT(*) as cnt FROM actions a JOIN files f ON f.id = a.file_id 
-        WHERE f.path = ? AND a.model = ? AND a.action = ? AND a.status = ?');
+    // One lookup, answered from idx_actions_dedupe
+    $stmt = $pdo->prepare('SELECT MAX(created_at) as last_run FROM actions
+        WHERE file_id = (SELECT id FROM files WHERE path = ?) AND model = ? AND action = ? AND status = ?');
     $stmt->execute([$path, $model, strtolower($action), 'ok']);
     $row = $stmt->fetch();
-    $count = (int)($row['cnt'] ?? 0);
-    
-    if ($count === 0) {
+    if (!is_array($row) || empty($row['last_run'])) {
         return false; // Not processed yet
     }
-    
-    // Found a previous action - check if file has changed by comparing filesize or last_seen
-    $stmt = $pdo->prepare('SELECT MAX(a.created_at) as last_run FROM actions a JOIN files f ON f.id = a.file_id 
-        WHERE f.path = ? AND a.model = ? AND a.action = ? AND a.status = ? LIMIT 1');
-    $stmt->execute([$path, $model, strtolower($action), 'ok']);
-    $row = $stmt->fetch();
-    $lastRunTime = isset($row['last_run']) ? strtotime((string)$row['last_run']) : 0;
+
+    // Found a previous action - check if file has changed since
+    $lastRunTime = (int)strtotime((string)$row['last_run']);
     $lastModTime = (int)@filemtime($path);
     
     // If file was modified after last run, reprocess it
@@ -42,6 +42,13 @@ function cw_config_template(): array
         'percent_docs' => 15,
         'percent_refactor' => 15,
         'limit_per_run' => 5,
+        'llm_concurrency' => 1,
+        'cache_results' => true,
+        'llm_stream' => true,
+        'llm_stream_usage' => true,
+        'chunk_large_files' => false,
+        'chunk_kb' => 48,
+        'max_chunked_kb' => 2048,
         'lockfile' => '/tmp/codewalker.lock',
         'respect_gitignore' => true,
 
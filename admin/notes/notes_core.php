@@ -213,6 +213,8 @@ function ensureDb(): SQLite3
 			path TEXT NOT NULL,
 			inode TEXT,
 			last_line INTEGER DEFAULT 0,
+			byte_offset INTEGER DEFAULT 0,
+			tail_sha1 TEXT,
 			updated_at TEXT,
 			PRIMARY KEY (host, path)
 		)'
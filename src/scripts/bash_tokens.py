@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Base-command parsing for bash history lines.
+
+Shared by ingest_bash_history_to_kb.py (base_cmd for every history line),
+classify_bash_commands.py (fallback when the model returns no base_cmd) and
+queue_bash_searches.py (log labels). One compiled regex splits the line into
+shell words and operators; the first command word of the first simple command
+wins, after skipping:
+  - leading VAR=value assignments (quoted values may contain spaces)
+  - sudo and its options (sudo -u www-data php ... -> php)
+  - subshell/group openers: (cd x && make) -> cd, { make; } -> make
+  - redirections and their targets: >out ls -> ls, 2>/dev/null make -> make
+    (digits directly before < or > are a file-descriptor prefix)
+
+Pipes, &&, ||, ; and & all end the first command, so `ls|grep x` gives ls.
+Quotes and backslashes are removed from the result (\\ls -> ls).
+
+Plain lines (no quotes, operators, brackets or '=') skip the tokenizer and
+take the first whitespace-separated word. Histories repeat the same lines
+heavily, so results are also memoized on the raw line (LRU, CACHE_SIZE
+entries).
+
+This module is intentionally dependency-light (stdlib only).
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+CACHE_SIZE = 65536
+
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<redir>\d*(?:<<<|<<-|<<|<>|<&|>&|>>|>\||<|>)|&>>|&>)
+    | (?P<op>&&|\|\||[|;&])
+    | (?P<word>(?:\$\([^)]*\)|[^\s'"\\|&;<>()]|\\.|'[^']*'|"(?:[^"\\]|\\.)*")+)
+    | (?P<other>\S)
+    """,
+    re.X,
+)
+_ENV_ASSIGN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*=")
+# Lines without any of these need no tokenizing: the first whitespace word is the command
+_NEEDS_TOKENIZER_RE = re.compile(r"""['"\\|&;<>(){}=]""")
+_UNQUOTE_RE = re.compile(r"""\\(.)|['"]""")
+
+# sudo options whose value is the next word
+_SUDO_ARG_OPTS = frozenset(("-u", "-g", "-C", "-D", "-h", "-p", "-r", "-t", "-U"))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def base_command(line: str) -> str:
+    """First real command of a history line ('' for blanks, comments and bare assignments)."""
+    s = line.strip()
+    if not s or s.startswith("#"):
+        return ""
+
+    if not _NEEDS_TOKENIZER_RE.search(s):
+        head = s.split(None, 1)[0]
+        if head != "sudo":
+            return head
+
+    in_sudo = False
+    skip_next = False
+    for m in _TOKEN_RE.finditer(s):
+        if m.group("redir"):
+            skip_next = True  # the redirect target (file, fd or heredoc word)
+            continue
+        word = m.group("word")
+        if word is None:
+            if m.group("op"):
+                break
+            continue  # ( < > etc.
+        if word == "{":
+            continue
+        if skip_next:
+            skip_next = False
+            continue
+        if in_sudo and word.startswith("-"):
+            skip_next = word in _SUDO_ARG_OPTS
+            continue
+        if _ENV_ASSIGN_RE.match(word):
+            continue
+        if word == "sudo" and not in_sudo:
+            in_sudo = True
+            continue
+        return _UNQUOTE_RE.sub(r"\1", word)
+
+    return "sudo" if in_sudo else ""
+
+
+def cache_info():
+    return base_command.cache_info()
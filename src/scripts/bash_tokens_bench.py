@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# /web/html/src/scripts/bash_tokens_bench.py
+"""
+bash_tokens.base_command micro-benchmark and golden check.
+
+Times, over a history corpus:
+  - legacy     the old ingest_bash_history_to_kb.base_command (re.split +
+               split() + env-assignment regex per line)
+  - tokenizer  bash_tokens.base_command without the cache
+  - cached     bash_tokens.base_command (LRU on the raw line)
+
+The corpus is the given history files (real ~/.bash_history files are the
+point), or a synthetic Zipf-like one when none are given. Afterwards, distinct
+lines where legacy and tokenizer disagree are listed so changes in base_cmd
+grouping can be reviewed. Expected results live in tests/test_bash_tokens.py.
+
+Usage:
+  python3 bash_tokens_bench.py [--history /root/.bash_history ...] [--lines 500000] [--show 30]
+"""
+import argparse, os, random, re, sys, time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bash_tokens
+
+_legacy_env_re = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=.*$")
+
+
+def legacy_base_command(full_cmd: str) -> str:
+    s = full_cmd.strip()
+    if not s or s.startswith("#"):
+        return ""
+    seg = re.split(r"\s*(?:&&|;)\s*", s, maxsplit=1)[0].strip()
+    if not seg:
+        return ""
+    toks = seg.split()
+    if not toks:
+        return ""
+    i = 0
+    while i < len(toks) and _legacy_env_re.match(toks[i]):
+        i += 1
+    if i >= len(toks):
+        return ""
+    if toks[i] == "sudo" and i + 1 < len(toks):
+        i += 1
+    return toks[i]
+
+
+def synthetic_corpus(lines: int) -> list:
+    rnd = random.Random(3)
+    heads = ["git status", "git log --oneline -n 20", "ls -la", "cd /var/www", "sudo systemctl restart nginx",
+             "docker ps -a", "FOO=1 make -j8", "tail -f /var/log/syslog", "grep -rn TODO . | head",
+             "python3 manage.py migrate", "sudo -u www-data php artisan", "cd /srv && git pull",
+             "kubectl get pods -n prod", "ssh deploy@host", "(cd build && cmake ..)", "echo $PATH"]
+    distinct = [f"{rnd.choice(heads)} {i}" for i in range(3000)] + heads
+    weights = [1.0 / (i + 1) for i in range(len(distinct))]
+    return rnd.choices(distinct, weights=weights, k=lines)
+
+
+def load_corpus(paths: list) -> list:
+    out = []
+    for p in paths:
+        with open(p, "rb") as f:
+            out.extend(raw.decode("utf-8", errors="ignore").rstrip("\r\n") for raw in f)
+    return out
+
+
+def timed(label: str, fn, corpus: list) -> list:
+    t0 = time.perf_counter()
+    res = [fn(s) for s in corpus]
+    dt = time.perf_counter() - t0
+    print(f"[bash_tokens_bench] {label:<10} {dt * 1000:9.1f} ms  {len(corpus) / dt:12.0f} lines/s")
+    return res
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark base_command parsers")
+    ap.add_argument("--history", nargs="*", default=[], help="History files to use as the corpus")
+    ap.add_argument("--lines", type=int, default=500_000, help="Synthetic corpus size (no --history)")
+    ap.add_argument("--show", type=int, default=30, help="Distinct legacy/tokenizer differences to print")
+    args = ap.parse_args()
+
+    corpus = load_corpus(args.history) if args.history else synthetic_corpus(args.lines)
+    print(f"[bash_tokens_bench] corpus lines={len(corpus)} distinct={len(set(corpus))} "
+          f"source={'files' if args.history else 'synthetic'}")
+
+    uncached = bash_tokens.base_command.__wrapped__
+    old = timed("legacy", legacy_base_command, corpus)
+    new = timed("tokenizer", uncached, corpus)
+    bash_tokens.base_command.cache_clear()
+    timed("cached", bash_tokens.base_command, corpus)
+    print(f"[bash_tokens_bench] cache {bash_tokens.cache_info()}")
+
+    diffs = Counter((s, o, n) for s, o, n in zip(corpus, old, new) if o != n)
+    print(f"[bash_tokens_bench] legacy/tokenizer differ on {sum(diffs.values())} lines ({len(diffs)} distinct)")
+    for (s, o, n), cnt in diffs.most_common(args.show):
+        print(f"  x{cnt:<6} {o!r:>24} -> {n!r:<24} {s[:100]!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
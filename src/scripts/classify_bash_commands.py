@@ -79,12 +79,14 @@ In your ingest script, after inserting/upserting a commands row, ensure there’
 
 
 
-import os, sys, json, sqlite3, datetime, fcntl, logging, urllib.request, re, time
+import os, sys, json, sqlite3, datetime, fcntl, logging, urllib.parse, re, time, threading, http.client
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from logging.handlers import RotatingFileHandler
 from typing import Dict, Any, List, Tuple
 
 from notes_config import get_config, get_private_root
-from ai_templates import compile_payload_by_name, payload_to_chat_parts
+from ai_templates import compile_payload_by_name, payload_to_chat_parts, render_template
+from bash_tokens import base_command
 
 PRIVATE_ROOT = get_private_root(__file__)
 KB_DB = os.path.join(PRIVATE_ROOT, "db/memory/bash_history.db")
@@ -93,7 +95,15 @@ LOCK = os.path.join(PRIVATE_ROOT, "locks", "classify_bash_commands.lock")
 LOG_PATH = os.path.join(PRIVATE_ROOT, "logs/classify_bash_commands.log")
 
 PROMPT_VERSION = "bash_cmd_v1"
+# stored for rows answered by the multi-command batch prompt (PER_PROMPT > 1)
+PROMPT_VERSION_BATCH = "bash_cmd_batch_v1"
 BATCH = int(os.getenv("BASH_AI_BATCH", "20"))
+# >1 runs that many classifications in parallel and batches the status writes
+WORKERS = max(1, int(os.getenv("BASH_AI_WORKERS", "1")))
+FLUSH_ROWS = max(1, int(os.getenv("BASH_AI_FLUSH_ROWS", "25")))
+FLUSH_SEC = float(os.getenv("BASH_AI_FLUSH_SEC", "10"))
+# >1 sends that many commands per prompt (JSON array answer keyed by cmd_id); unparseable items are retried alone
+PER_PROMPT = max(1, int(os.getenv("BASH_AI_PER_PROMPT", "1")))
 
 HUMAN_DB_DEFAULT = os.path.join(PRIVATE_ROOT, "db/memory/human_notes.db")
 AI_DB_DEFAULT = os.path.join(PRIVATE_ROOT, "db/memory/notes_ai_metadata.db")
@@ -272,48 +282,76 @@ def mark_working(db: sqlite3.Connection, cmd_id: int):
     """, (now(), cmd_id))
     db.commit()
 
-def mark_done(db: sqlite3.Connection, cmd_id: int, payload: Dict[str, Any]):
+def mark_working_many(db: sqlite3.Connection, cmd_ids: List[int]):
+    db.executemany("""
+      UPDATE command_ai
+      SET status='working', updated_at=?, last_error=NULL
+      WHERE cmd_id=?
+    """, [(now(), cmd_id) for cmd_id in cmd_ids])
+    db.commit()
+
+DONE_SQL = """
+  UPDATE command_ai
+  SET status='done',
+      model=?,
+      prompt_version=?,
+      result_json=?,
+      summary=?,
+      search_query=?,
+      known=?,
+      updated_at=?,
+      last_error=NULL
+  WHERE cmd_id=?
+"""
+
+ERROR_SQL = """
+  UPDATE command_ai
+  SET status='error', updated_at=?, last_error=?
+  WHERE cmd_id=?
+"""
+
+def _done_params(cmd_id: int, payload: Dict[str, Any], prompt_version: str = PROMPT_VERSION) -> Tuple:
     summary = payload.get("intent", "") or ""
     search_query = payload.get("search_query", None)
     known = 1 if payload.get("known") else 0
-
-    db.execute("""
-      UPDATE command_ai
-      SET status='done',
-          model=?,
-          prompt_version=?,
-          result_json=?,
-          summary=?,
-          search_query=?,
-          known=?,
-          updated_at=?,
-          last_error=NULL
-      WHERE cmd_id=?
-    """, (
+    return (
         MODEL,
-        PROMPT_VERSION,
+        prompt_version,
         json.dumps(payload, ensure_ascii=False),
         summary,
         search_query if isinstance(search_query, str) else None,
         known,
         now(),
         cmd_id
-    ))
+    )
+
+def _error_params(cmd_id: int, err: str) -> Tuple:
+    return (now(), err[:500], cmd_id)
+
+def mark_done(db: sqlite3.Connection, cmd_id: int, payload: Dict[str, Any]):
+    db.execute(DONE_SQL, _done_params(cmd_id, payload))
     db.commit()
 
 def mark_error(db: sqlite3.Connection, cmd_id: int, err: str):
-    db.execute("""
-      UPDATE command_ai
-      SET status='error', updated_at=?, last_error=?
-      WHERE cmd_id=?
-    """, (now(), err[:500], cmd_id))
+    db.execute(ERROR_SQL, _error_params(cmd_id, err))
     db.commit()
 
+def flush_status(db: sqlite3.Connection, done_rows: List[Tuple], error_rows: List[Tuple]):
+    """Write buffered done/error rows in one transaction."""
+    if not done_rows and not error_rows:
+        return
+    with db:
+        if done_rows:
+            db.executemany(DONE_SQL, done_rows)
+        if error_rows:
+            db.executemany(ERROR_SQL, error_rows)
+
 def validate_payload(full_cmd: str, base_cmd: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     # Force required keys and types
     out = {
         "full_cmd": full_cmd,
-        "base_cmd": (payload.get("base_cmd") or base_cmd or "").strip(),
+        # Models sometimes answer "sudo apt" or "apt update"; keep the command word only
+        "base_cmd": base_command(str(payload.get("base_cmd") or "")) or (base_cmd or "").strip(),
         "known": bool(payload.get("known", False)),
         "intent": (payload.get("intent") or "unknown").strip(),
         "keywords": payload.get("keywords") if isinstance(payload.get("keywords"), list) else [],
@@ -326,44 +364,83 @@ def validate_payload(full_cmd: str, base_cmd: str, payload: Dict[str, Any]) -> D
         out["keywords"] = []
     # If base_cmd ended up empty, fallback
     if not out["base_cmd"]:
-        out["base_cmd"] = base_cmd or full_cmd.split()[0]
+        out["base_cmd"] = base_command(full_cmd) or (full_cmd.split() or [""])[0]
     return out
 
-def local_ai_classify(full_cmd: str, base_cmd: str) -> Dict[str, Any]:
-    """
-    Default implementation uses Ollama CLI (local).
-    If you use an HTTP endpoint, swap this function.
-    """
-    fallback_prompt = f"""You are a bash command classifier.
-
-Return ONLY valid JSON (no markdown, no extra text).
-Schema:
-{{
+SCHEMA_TEXT = """Schema:
+{
   "base_cmd": string,
   "known": boolean,
   "intent": string,
   "keywords": [string,...],
   "search_query": string|null,
   "notes": string
-}}
+}
 
 Rules:
 - base_cmd should be the first real command (skip leading 'sudo' and env assignments).
 - If you are not confident, set known=false and search_query=null.
-- search_query should be a good web query to learn what the command does.
+- search_query should be a good web query to learn what the command does."""
+
+FALLBACK_PROMPT = f"""You are a bash command classifier.
+
+Return ONLY valid JSON (no markdown, no extra text).
+{SCHEMA_TEXT}
 
 Command:
-full_cmd: {full_cmd}
-base_cmd_guess: {base_cmd}
+full_cmd: {{{{ full_cmd }}}}
+base_cmd_guess: {{{{ base_cmd }}}}
 """
 
-    template_name = os.getenv("AI_TEMPLATE_BASH_CLASSIFIER", "Bash Command Classifier")
+FALLBACK_BATCH_PROMPT = f"""You are a bash command classifier.
+
+Return ONLY a valid JSON array (no markdown, no extra text) with one object per
+command below, in the same order. Each object must include the "cmd_id" it was
+given plus these fields.
+{SCHEMA_TEXT}
+
+Commands (one JSON object per line):
+{{{{ commands }}}}
+"""
+
+# One cron run is one process, so templates are read from ai_header.db once per run.
+_template_cache: Dict[Tuple[str, str, Tuple[str, ...]], Tuple[str, Dict[str, Any]]] = {}
+_template_lock = threading.Lock()
+
+def _placeholder_bindings(variables: Tuple[str, ...]) -> Dict[str, Any]:
+    """Bind each variable to its own {{ name }}; dotted names nest ("cmd.full" -> {"cmd": {"full": ...}})."""
+    bindings: Dict[str, Any] = {}
+    for v in variables:
+        *parents, leaf = v.split(".")
+        node = bindings
+        for part in parents:
+            node = node.setdefault(part, {})
+            if not isinstance(node, dict):
+                raise ValueError(f"template variable {v!r} conflicts with {part!r}")
+        if isinstance(node.get(leaf), dict):
+            raise ValueError(f"template variable {v!r} conflicts with {v + '.*'!r}")
+        node[leaf] = "{{ %s }}" % v
+    return bindings
+
+def compiled_prompt(template_name: str, fallback_prompt: str, variables: Tuple[str, ...]) -> Tuple[str, Dict[str, Any]]:
+    """
+    (prompt_text, options) for a payload template, compiled once per
+    (template, fallback, variables) and reused for the rest of the run. The
+    variables are bound to their own {{ name }} placeholders at compile time,
+    so render_template() fills in each command later without going back to
+    ai_header.db or re-parsing the payload. Dotted variables ("cmd.full") are
+    bound as nested dicts, matching render_template's dot lookup; pass the
+    render-time values nested the same way.
+    """
+    key = (template_name, fallback_prompt, tuple(variables))
+    with _template_lock:
+        hit = _template_cache.get(key)
+        if hit:
+            return hit[0], dict(hit[1])
+
     compiled = compile_payload_by_name(
         template_name,
-        {
-            "full_cmd": full_cmd,
-            "base_cmd": base_cmd,
-        },
+        _placeholder_bindings(variables),
         template_type="payload",
     )
     payload_tpl = compiled.get("payload") if isinstance(compiled, dict) else {}
@@ -380,6 +457,12 @@ base_cmd_guess: {base_cmd}
         prompt_parts.append(user_text.strip())
     prompt = "\n\n".join(prompt_parts).strip() or fallback_prompt
 
+    with _template_lock:
+        _template_cache[key] = (prompt, options)
+    return prompt, dict(options)
+
+def ollama_generate(prompt: str, options: Dict[str, Any], timeout: float = 60) -> str:
+    """Ollama /api/generate, returning the stripped 'response' text."""
     ollama_url = os.getenv("OLLAMA_URL", OLLAMA_URL_DEFAULT).rstrip("/")
     api_url = f"{ollama_url}/api/generate"
 
@@ -391,14 +474,7 @@ base_cmd_guess: {base_cmd}
     }
 
     try:
-        req = urllib.request.Request(
-            api_url,
-            data=json.dumps(req_body).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            raw = resp.read().decode("utf-8", errors="ignore")
+        raw = http_post_json(api_url, req_body, timeout=timeout)
     except Exception as e:
         raise RuntimeError(f"ollama_http_failed url={api_url} err={e}")
 
@@ -411,10 +487,84 @@ base_cmd_guess: {base_cmd}
     txt = (data.get("response") or "").strip()
     if not txt:
         raise RuntimeError(f"ollama_empty_response url={api_url} body={_truncate(raw, 800)}")
+    return txt
+
+def local_ai_classify(full_cmd: str, base_cmd: str) -> Dict[str, Any]:
+    """
+    Default implementation uses the Ollama HTTP API (local).
+    If you use a different endpoint, swap ollama_generate.
+    """
+    template_name = os.getenv("AI_TEMPLATE_BASH_CLASSIFIER", "Bash Command Classifier")
+    prompt, options = compiled_prompt(template_name, FALLBACK_PROMPT, ("full_cmd", "base_cmd"))
+    txt = ollama_generate(render_template(prompt, {"full_cmd": full_cmd, "base_cmd": base_cmd}), options)
 
     # Parse the model output as JSON, with a small repair pass for common bad escapes.
     return _parse_model_json(txt)
 
+def local_ai_classify_batch(items: List[Tuple[int, str, str]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Classify several commands with one prompt. Returns {cmd_id: raw object}
+    for every item the answer contained; missing or malformed items are simply
+    absent, so the caller can retry them one at a time.
+    """
+    template_name = os.getenv("AI_TEMPLATE_BASH_CLASSIFIER_BATCH", "Bash Command Classifier Batch")
+    prompt, options = compiled_prompt(template_name, FALLBACK_BATCH_PROMPT, ("commands",))
+    commands = "\n".join(
+        json.dumps({"cmd_id": cmd_id, "full_cmd": full_cmd, "base_cmd_guess": base_cmd}, ensure_ascii=False)
+        for cmd_id, full_cmd, base_cmd in items
+    )
+    # generation time grows with the number of answers
+    txt = ollama_generate(render_template(prompt, {"commands": commands}), options, timeout=60 + 10 * len(items))
+
+    wanted = {cmd_id for cmd_id, _, _ in items}
+    out: Dict[int, Dict[str, Any]] = {}
+    for obj in _parse_model_json_objects(txt):
+        try:
+            cmd_id = int(obj.get("cmd_id"))
+        except (TypeError, ValueError):
+            continue
+        if cmd_id in wanted and cmd_id not in out:
+            out[cmd_id] = obj
+    return out
+
+
+_http_local = threading.local()
+
+def http_post_json(url: str, body: Dict[str, Any], timeout: float = 60) -> str:
+    """
+    POST JSON over a keep-alive connection owned by the calling thread, so a
+    run (or each pool worker) reuses one socket to Ollama instead of
+    connecting per command. A reused socket the server already closed is
+    retried once on a fresh connection.
+    """
+    u = urllib.parse.urlsplit(url)
+    key = (u.scheme, u.netloc)
+    path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+    data = json.dumps(body).encode("utf-8")
+    conns = getattr(_http_local, "conns", None)
+    if conns is None:
+        conns = _http_local.conns = {}
+
+    while True:
+        conn = conns.get(key)
+        fresh = conn is None
+        if fresh:
+            cls = http.client.HTTPSConnection if u.scheme == "https" else http.client.HTTPConnection
+            conn = conns[key] = cls(u.netloc, timeout=timeout)
+        try:
+            conn.request("POST", path, body=data, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            raw = resp.read()
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            conns.pop(key, None)
+            if fresh or isinstance(e, TimeoutError):
+                raise
+            continue
+        if resp.status >= 400:
+            raise RuntimeError(f"HTTP Error {resp.status}: {resp.reason} {_truncate(raw.decode('utf-8', errors='ignore'), 300)}")
+        return raw.decode("utf-8", errors="ignore")
+
 
 def _truncate(s: str, n: int = 2000) -> str:
     s = s or ""
@@ -486,6 +636,198 @@ def _parse_model_json(txt: str) -> Dict[str, Any]:
         raise last_err
     raise json.JSONDecodeError("invalid_json", txt, 0)
 
+def _parse_model_json_objects(txt: str) -> List[Dict[str, Any]]:
+    """
+    Objects from a batch answer: a JSON array (or {"results": [...]}) when it
+    parses, otherwise every complete top-level {...} that can be decoded, so one
+    broken item does not cost the rest of the batch.
+    """
+    txt = (txt or "").strip()
+    start, end = txt.find("["), txt.rfind("]")
+    candidates = [txt]
+    if start != -1 and end > start:
+        candidates.append(txt[start : end + 1])
+    for c in list(candidates):
+        rc = _repair_invalid_json_escapes(c)
+        if rc != c:
+            candidates.append(rc)
+
+    for c in candidates:
+        try:
+            val = json.loads(c)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(val, dict):
+            val = val.get("results") or val.get("items") or [val]
+        if isinstance(val, list):
+            return [v for v in val if isinstance(v, dict)]
+
+    out = []
+    dec = json.JSONDecoder()
+    text = _repair_invalid_json_escapes(txt)
+    i = text.find("{")
+    while i != -1:
+        try:
+            obj, i = dec.raw_decode(text, i)
+            if isinstance(obj, dict):
+                out.append(obj)
+        except json.JSONDecodeError:
+            i += 1
+        i = text.find("{", i)
+    return out
+
+def classify_one(full_cmd: str, base_cmd: str) -> Dict[str, Any]:
+    return validate_payload(full_cmd, base_cmd, local_ai_classify(full_cmd, base_cmd))
+
+def classify_group(items: List[Tuple[int, str, str]]) -> Tuple[List[Tuple[int, str, str, Any, str]], int]:
+    """
+    Classify items with one batch prompt and retry, one command per prompt,
+    every item that is missing from the answer or fails validation. Returns
+    ([(cmd_id, full_cmd, base_cmd, payload_or_exception, prompt_version)],
+    singles_retried); prompt_version says which prompt produced the answer.
+    A transport failure of the batch request fails all items without retries.
+    """
+    if len(items) == 1:
+        cmd_id, full_cmd, base_cmd = items[0]
+        try:
+            return [(cmd_id, full_cmd, base_cmd, classify_one(full_cmd, base_cmd), PROMPT_VERSION)], 0
+        except Exception as e:
+            return [(cmd_id, full_cmd, base_cmd, e, PROMPT_VERSION)], 0
+
+    try:
+        answers = local_ai_classify_batch(items)
+    except Exception as e:
+        return [(cmd_id, full_cmd, base_cmd, e, PROMPT_VERSION_BATCH) for cmd_id, full_cmd, base_cmd in items], 0
+
+    out = []
+    retried = 0
+    for cmd_id, full_cmd, base_cmd in items:
+        raw = answers.get(cmd_id)
+        if raw is not None:
+            try:
+                out.append((cmd_id, full_cmd, base_cmd, validate_payload(full_cmd, base_cmd, raw), PROMPT_VERSION_BATCH))
+                continue
+            except Exception:
+                pass
+        retried += 1
+        try:
+            out.append((cmd_id, full_cmd, base_cmd, classify_one(full_cmd, base_cmd), PROMPT_VERSION))
+        except Exception as e:
+            out.append((cmd_id, full_cmd, base_cmd, e, PROMPT_VERSION))
+    return out, retried
+
+def _error_text(e: Exception, full_cmd: str, base_cmd: str) -> str:
+    err_text = str(e)
+    if isinstance(e, json.JSONDecodeError):
+        try:
+            prompt_debug = f"full_cmd={full_cmd} base_cmd_guess={base_cmd}"
+            err_text = f"json_decode_error: {e} ({prompt_debug})"
+        except Exception:
+            pass
+    return err_text
+
+def _log_done(logger: logging.Logger, cmd_id: int, payload: Dict[str, Any]):
+    logger.info(
+        "done cmd_id=%s known=%s base_cmd=%s",
+        int(cmd_id),
+        1 if payload.get("known") else 0,
+        payload.get("base_cmd", ""),
+    )
+
+def _log_error(logger: logging.Logger, cmd_id: int, full_cmd: str, base_cmd: str, err_text: str):
+    logger.exception(
+        "error cmd_id=%s base_cmd=%s full_cmd=%s err=%s",
+        int(cmd_id),
+        _truncate(base_cmd, 200),
+        _truncate(full_cmd, 500),
+        _truncate(err_text, 500),
+    )
+
+def run_serial(db: sqlite3.Connection, pending: List[Tuple[int, str, str]], logger: logging.Logger) -> Tuple[int, int, int]:
+    processed = 0
+    done = 0
+    errors = 0
+
+    for cmd_id, full_cmd, base_cmd in pending:
+        processed += 1
+        try:
+            mark_working(db, cmd_id)
+            payload = classify_one(full_cmd, base_cmd)
+            mark_done(db, cmd_id, payload)
+            done += 1
+            _log_done(logger, cmd_id, payload)
+
+        except Exception as e:
+            errors += 1
+            err_text = _error_text(e, full_cmd, base_cmd)
+            mark_error(db, cmd_id, err_text)
+            _log_error(logger, cmd_id, full_cmd, base_cmd, err_text)
+
+    return processed, done, errors
+
+def run_pool(db: sqlite3.Connection, pending: List[Tuple[int, str, str]], logger: logging.Logger) -> Tuple[int, int, int]:
+    """
+    WORKERS prompts in flight at once (each worker thread keeps its own Ollama
+    connection), each covering up to PER_PROMPT commands via classify_group.
+    Only the main thread touches SQLite: the batch is marked working in one
+    transaction, and done/error rows are buffered and written every FLUSH_ROWS
+    results or FLUSH_SEC seconds, whichever comes first. Each row still ends
+    up done or error with its own last_error.
+    """
+    processed = 0
+    done = 0
+    errors = 0
+    done_rows: List[Tuple] = []
+    error_rows: List[Tuple] = []
+    last_flush = time.time()
+    flushes = 0
+    prompts = 0
+    retried = 0
+    groups = [pending[i : i + PER_PROMPT] for i in range(0, len(pending), PER_PROMPT)]
+
+    mark_working_many(db, [cmd_id for cmd_id, _, _ in pending])
+    try:
+        with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="classify") as pool:
+            futures = [pool.submit(classify_group, group) for group in groups]
+            for fut in as_completed(futures):
+                results, group_retried = fut.result()
+                prompts += 1 + group_retried
+                retried += group_retried
+                for cmd_id, full_cmd, base_cmd, res, prompt_version in results:
+                    processed += 1
+                    if not isinstance(res, Exception):
+                        done_rows.append(_done_params(cmd_id, res, prompt_version))
+                        done += 1
+                        _log_done(logger, cmd_id, res)
+                        continue
+                    errors += 1
+                    err_text = _error_text(res, full_cmd, base_cmd)
+                    error_rows.append(_error_params(cmd_id, err_text))
+                    logger.error(
+                        "error cmd_id=%s base_cmd=%s full_cmd=%s err=%s",
+                        int(cmd_id),
+                        _truncate(base_cmd, 200),
+                        _truncate(full_cmd, 500),
+                        _truncate(err_text, 500),
+                        exc_info=res,
+                    )
+
+                if len(done_rows) + len(error_rows) >= FLUSH_ROWS or time.time() - last_flush >= FLUSH_SEC:
+                    flush_status(db, done_rows, error_rows)
+                    done_rows, error_rows = [], []
+                    last_flush = time.time()
+                    flushes += 1
+    finally:
+        # results already in hand are kept even if the run is interrupted
+        flush_status(db, done_rows, error_rows)
+        flushes += 1 if (done_rows or error_rows) else 0
+
+    logger.info(
+        "pool workers=%s per_prompt=%s prompts=%s singles_retried=%s flushes=%s",
+        int(WORKERS), int(PER_PROMPT), int(prompts), int(retried), int(flushes),
+    )
+    return processed, done, errors
+
 def main():
     logger = setup_logging()
 
@@ -507,47 +849,15 @@ def main():
             job_upsert_finish(hb, JOB_NAME, True, dur_ms, "noop pending=0")
             return
 
-        logger.info("start pending=%s batch=%s model=%s", int(len(pending)), int(BATCH), MODEL)
-
-        processed = 0
-        done = 0
-        errors = 0
+        logger.info(
+            "start pending=%s batch=%s workers=%s per_prompt=%s model=%s",
+            int(len(pending)), int(BATCH), int(WORKERS), int(PER_PROMPT), MODEL,
+        )
 
-        for cmd_id, full_cmd, base_cmd in pending:
-            processed += 1
-            try:
-                mark_working(db, cmd_id)
-                raw = local_ai_classify(full_cmd, base_cmd)
-                payload = validate_payload(full_cmd, base_cmd, raw)
-                mark_done(db, cmd_id, payload)
-                done += 1
-
-                logger.info(
-                    "done cmd_id=%s known=%s base_cmd=%s",
-                    int(cmd_id),
-                    1 if payload.get("known") else 0,
-                    payload.get("base_cmd", ""),
-                )
-
-            except Exception as e:
-                errors += 1
-                err_text = str(e)
-
-                if isinstance(e, json.JSONDecodeError):
-                    try:
-                        prompt_debug = f"full_cmd={full_cmd} base_cmd_guess={base_cmd}"
-                        err_text = f"json_decode_error: {e} ({prompt_debug})"
-                    except Exception:
-                        pass
-
-                mark_error(db, cmd_id, err_text)
-                logger.exception(
-                    "error cmd_id=%s base_cmd=%s full_cmd=%s err=%s",
-                    int(cmd_id),
-                    _truncate(base_cmd, 200),
-                    _truncate(full_cmd, 500),
-                    _truncate(err_text, 500),
-                )
+        if WORKERS > 1 or PER_PROMPT > 1:
+            processed, done, errors = run_pool(db, pending, logger)
+        else:
+            processed, done, errors = run_serial(db, pending, logger)
 
         logger.info("finish processed=%s done=%s errors=%s", int(processed), int(done), int(errors))
         dur_ms = int((time.time() - t0) * 1000)
@@ -12,7 +12,7 @@ CodeWalker — cron‑safe AI code & log walker for /web on .152
 Quick start (suggested):
     1) Config is stored in /web/private/db/codewalker_settings.db (seeded from CONFIG_TEMPLATE below)
   2) mkdir -p /web/private/db /web/private/logs /web/AI/bin
-  3) cp this file to /web/AI/bin/codewalker.py && chmod +x /web/AI/bin/codewalker.py
+  3) cp this file and logtail.py to /web/AI/bin/ && chmod +x /web/AI/bin/codewalker.py
     4) Cron:  */20 * * * * /usr/bin/python3 /web/AI/bin/codewalker.py --limit 30 >> /web/private/logs/codewalker.cron.log 2>&1
 
 Safety defaults:
@@ -43,9 +43,13 @@ import signal
 import socket
 import sqlite3
 import sys
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
+import logtail
+
 # Third‑party
 try:
     import requests
@@ -90,6 +94,13 @@ CONFIG_TEMPLATE = {
     "percent_docs": 15,           # % chance of docs action
     "percent_refactor": 15,       # % chance of refactor action
     "limit_per_run": 5,
+    "llm_concurrency": 1,         # parallel llm_chat calls per run (1 = serial)
+    "cache_results": True,        # reuse responses for identical content/action/model/prompt
+    "llm_stream": True,           # stream replies; stop once the code block / JSON is complete
+    "llm_stream_usage": True,     # ask OpenAI-style servers for token usage when streaming (stream_options)
+    "chunk_large_files": False,   # map-reduce files over max_filesize_kb instead of skipping/truncating
+    "chunk_kb": 48,               # target chunk size in chunked mode
+    "max_chunked_kb": 2048,       # chunked mode cap (code files above it are still skipped; logs use their tail)
     "lockfile": "/tmp/codewalker.lock",
     "respect_gitignore": True,
     "use_active_ai": False,       # Follow /web/html/lib/ai_bootstrap.php active connection
@@ -105,6 +116,11 @@ CONFIG_TEMPLATE = {
 DB_SETTINGS = "/web/private/db/codewalker_settings.db"
 
 
+PROMPT_TEMPLATES_DDL = (
+    "CREATE TABLE IF NOT EXISTS prompt_templates (name TEXT PRIMARY KEY, description TEXT, content TEXT NOT NULL, is_default INTEGER NOT NULL DEFAULT 0, created_at TEXT, updated_at TEXT)"
+)
+
+
 def _ensure_settings_db(db_path: str = DB_SETTINGS) -> None:
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     conn = sqlite3.connect(db_path)
@@ -115,6 +131,8 @@ def _ensure_settings_db(db_path: str = DB_SETTINGS) -> None:
                 value TEXT
             )"""
         )
+        # Backward compatibility: prompt_templates table may not exist yet on older DBs.
+        conn.execute(PROMPT_TEMPLATES_DDL)
         # Seed defaults (do not overwrite existing keys)
         for key, value in CONFIG_TEMPLATE.items():
             conn.execute(
@@ -125,58 +143,74 @@ def _ensure_settings_db(db_path: str = DB_SETTINGS) -> None:
     finally:
         conn.close()
 
-def get_all_settings():
-    _ensure_settings_db(DB_SETTINGS)
-    conn = sqlite3.connect(DB_SETTINGS)
+
+# In-memory snapshot of the settings DB (settings + prompt templates). Loaded
+# once, reused until the DB changes: PRAGMA data_version on the held connection
+# moves when another connection (PHP admin UI, other runs) commits, and the file
+# stat catches the DB being replaced or rewritten outside SQLite.
+_settings_lock = threading.Lock()
+_settings_state: dict = {"path": None, "conn": None, "stamp": None, "settings": {}, "templates": {}}
+
+
+def _decode_setting(value):
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT key, value FROM settings")
-        rows = cur.fetchall()
-    finally:
-        conn.close()
-    settings = {}
-    for key, value in rows:
-        try:
-            settings[key] = json.loads(value)
-        except Exception:
-            settings[key] = value
-    return settings         
+        return json.loads(value)
+    except Exception:
+        return value
 
-def get_setting(key, default=None):
-    _ensure_settings_db(DB_SETTINGS)
-    conn = sqlite3.connect(DB_SETTINGS)
+
+def _settings_stat():
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT value FROM settings WHERE key=?", (key,))
-        row = cur.fetchone()
-    finally:
-        conn.close()
-    if row:
-        try:
-            return json.loads(row[0])
-        except Exception:
-            return row[0]               
+        fst = os.stat(DB_SETTINGS)
+    except OSError:
+        return None
+    return (fst.st_ino, fst.st_mtime_ns, fst.st_size)
+
+
+def _settings_snapshot() -> dict:
+    with _settings_lock:
+        st = _settings_state
+        file_stamp = _settings_stat()
+        held = st["stamp"][1] if st["stamp"] else None
+        if st["conn"] is None or st["path"] != DB_SETTINGS or file_stamp is None or held is None or held[0] != file_stamp[0]:
+            # first use, DB_SETTINGS repointed, or the file was replaced: reconnect
+            if st["conn"] is not None:
+                st["conn"].close()
+            _ensure_settings_db(DB_SETTINGS)
+            st.update(path=DB_SETTINGS, conn=sqlite3.connect(DB_SETTINGS, check_same_thread=False), stamp=None)
+            file_stamp = _settings_stat()
+
+        conn = st["conn"]
+        stamp = (conn.execute("PRAGMA data_version").fetchone()[0], file_stamp)
+        if stamp != st["stamp"]:
+            st["settings"] = {k: _decode_setting(v) for k, v in conn.execute("SELECT key, value FROM settings")}
+            st["templates"] = {
+                name: content for name, content in conn.execute("SELECT name, content FROM prompt_templates")
+                if isinstance(content, str) and content.strip()
+            }
+            st["stamp"] = stamp
+        return st
+
+
+def get_all_settings():
+    return dict(_settings_snapshot()["settings"])
+
+
+def get_setting(key, default=None):
+    settings = _settings_snapshot()["settings"]
+    if key in settings:
+        return settings[key]
     return default
 
 
 def load_active_ai_settings() -> dict:
     """Load active AI connection from /web/private/db/codewalker_settings.db (shared with PHP version)."""
     try:
-        conn = sqlite3.connect(DB_SETTINGS)
-        cur = conn.cursor()
-        cur.execute("SELECT key, value FROM settings WHERE key IN ('provider', 'base_url', 'api_key', 'model', 'model_timeout_seconds', 'backend')")
-        rows = cur.fetchall()
-        conn.close()
-        
-        active = {}
-        for key, value in rows:
-            try:
-                active[key] = json.loads(value)
-            except Exception:
-                active[key] = value
-        return active
+        settings = _settings_snapshot()["settings"]
     except Exception:
         return {}
+    keys = ('provider', 'base_url', 'api_key', 'model', 'model_timeout_seconds', 'backend')
+    return {k: settings[k] for k in keys if k in settings}
 
 
 
@@ -193,21 +227,7 @@ def get_prompt_template(name: str) -> str | None:
     name = (name or "").strip()
     if not name:
         return None
-    _ensure_settings_db(DB_SETTINGS)
-    conn = sqlite3.connect(DB_SETTINGS)
-    try:
-        # Backward compatibility: prompt_templates table may not exist yet on older DBs.
-        conn.execute(
-            "CREATE TABLE IF NOT EXISTS prompt_templates (name TEXT PRIMARY KEY, description TEXT, content TEXT NOT NULL, is_default INTEGER NOT NULL DEFAULT 0, created_at TEXT, updated_at TEXT)"
-        )
-        cur = conn.cursor()
-        cur.execute("SELECT content FROM prompt_templates WHERE name=?", (name,))
-        row = cur.fetchone()
-        if row and isinstance(row[0], str) and row[0].strip():
-            return row[0]
-        return None
-    finally:
-        conn.close()
+    return _settings_snapshot()["templates"].get(name)
 
 PROMPT_POOL_A = [
     "Refactor to smaller pure functions and add docstrings; preserve behavior.",
@@ -464,18 +484,9 @@ def sha256_bytes(data: bytes) -> str:
 
 
 def tail_lines(path: str, n: int) -> str:
-    """Tail last n lines efficiently for large log files."""
+    """Exact last n lines of a (possibly multi-GB) log; see logtail.py."""
     try:
-        # Fast tail: read from end in chunks
-        avg_line_len = 120
-        to_read = n * avg_line_len
-        size = os.path.getsize(path)
-        with open(path, "rb") as f:
-            if size > to_read:
-                f.seek(-to_read, os.SEEK_END)
-            data = f.read()
-        text = data.decode("utf-8", errors="ignore")
-        return "\n".join(text.splitlines()[-n:])
+        return "\n".join(logtail.tail_lines(path, n))
     except Exception as e:
         logging.warning(f"tail_lines failed for {path}: {e}")
         return ""
@@ -488,6 +499,16 @@ def unified_diff(a_text: str, b_text: str, a_name: str, b_name: str) -> str:
 
 # ---------------------- SQLite ----------------------
 
+# Bump when DDL changes; stored in PRAGMA user_version so db_connect can skip
+# the DDL on every run once a DB is current.
+SCHEMA_VERSION = 1
+
+# store_result writes are committed together: after this many files, or once
+# the oldest uncommitted write is this old (LLM calls can take minutes, so
+# finished work never sits unflushed for long).
+WRITE_BATCH_SIZE = 25
+WRITE_FLUSH_SECONDS = 30
+
 DDL = r"""
 PRAGMA journal_mode=WAL;
 CREATE TABLE IF NOT EXISTS files (
@@ -546,12 +567,58 @@ CREATE TABLE IF NOT EXISTS refactors (
   action_id INTEGER PRIMARY KEY,
   suggestions TEXT
 );
+CREATE INDEX IF NOT EXISTS idx_actions_dedupe ON actions(file_id, model, action, status, created_at);
+-- Latest action per file, kept current by triggers (replaces MAX(id) ... GROUP BY file_id).
+CREATE TABLE IF NOT EXISTS file_latest_action (
+  file_id INTEGER PRIMARY KEY,
+  action_id INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS trg_actions_latest_ins AFTER INSERT ON actions
+WHEN NEW.file_id IS NOT NULL
+BEGIN
+  INSERT INTO file_latest_action(file_id, action_id) VALUES (NEW.file_id, NEW.id)
+    ON CONFLICT(file_id) DO UPDATE SET action_id = excluded.action_id
+    WHERE excluded.action_id > file_latest_action.action_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_actions_latest_del AFTER DELETE ON actions
+WHEN OLD.id = (SELECT action_id FROM file_latest_action WHERE file_id = OLD.file_id)
+BEGIN
+  DELETE FROM file_latest_action WHERE file_id = OLD.file_id;
+  INSERT INTO file_latest_action(file_id, action_id)
+    SELECT file_id, MAX(id) FROM actions WHERE file_id = OLD.file_id GROUP BY file_id;
+END;
 CREATE VIEW IF NOT EXISTS vw_last_actions AS
-  SELECT a.*, f.path FROM actions a
-  JOIN files f ON f.id = a.file_id
-  WHERE a.id IN (
-    SELECT MAX(id) FROM actions GROUP BY file_id
-  );
+  SELECT a.*, f.path FROM file_latest_action l
+  JOIN actions a ON a.id = l.action_id
+  JOIN files f ON f.id = l.file_id;
+CREATE TABLE IF NOT EXISTS scan_dirs (
+  path TEXT PRIMARY KEY,
+  parent TEXT,
+  mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS scan_files (
+  path TEXT PRIMARY KEY,
+  dir TEXT,
+  ext TEXT,
+  size INTEGER,
+  mtime_ns INTEGER,
+  inode INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_scan_files_dir ON scan_files(dir);
+CREATE TABLE IF NOT EXISTS scan_meta (
+  key TEXT PRIMARY KEY,
+  value TEXT
+);
+CREATE TABLE IF NOT EXISTS result_cache (
+  file_hash TEXT,
+  action TEXT,
+  model TEXT,
+  prompt_hash TEXT,
+  response TEXT,
+  action_id INTEGER,
+  created_at TEXT,
+  PRIMARY KEY (file_hash, action, model, prompt_hash)
+) WITHOUT ROWID;
 CREATE TABLE IF NOT EXISTS queued_files (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     path TEXT UNIQUE,
@@ -563,18 +630,110 @@ CREATE TABLE IF NOT EXISTS queued_files (
 """
 
 
+def _migrate_last_actions(conn: sqlite3.Connection) -> None:
+    """One-off: swap an old MAX(id)-based vw_last_actions for the file_latest_action
+    version and backfill the table from existing actions."""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type='view' AND name='vw_last_actions'").fetchone()
+    if row and "file_latest_action" in (row[0] or ""):
+        return
+    conn.execute("DROP VIEW IF EXISTS vw_last_actions")
+    conn.execute(
+        """CREATE VIEW vw_last_actions AS
+             SELECT a.*, f.path FROM file_latest_action l
+             JOIN actions a ON a.id = l.action_id
+             JOIN files f ON f.id = l.file_id"""
+    )
+    conn.execute(
+        """INSERT OR REPLACE INTO file_latest_action(file_id, action_id)
+             SELECT file_id, MAX(id) FROM actions WHERE file_id IS NOT NULL GROUP BY file_id"""
+    )
+    conn.commit()
+
+
 def db_connect(db_path: str) -> sqlite3.Connection:
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     conn = sqlite3.connect(db_path)
     conn.execute("PRAGMA foreign_keys=ON")
-    for stmt in DDL.strip().split(";\n"):
-        s = stmt.strip()
-        if s:
-            conn.execute(s)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return conn
+    # executescript: trigger bodies contain ';' so the DDL can't be split per statement
+    conn.executescript(DDL)
+    _migrate_last_actions(conn)
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
     return conn
 
 
-def db_get_or_create_file(conn: sqlite3.Connection, path: str, ext: str, hsh: str) -> int:
+class WriteBatch:
+    """Buffer finished results in memory and write them in one short transaction per batch.
+
+    Nothing is written while LLM calls are in flight: flush() takes the write
+    lock with BEGIN IMMEDIATE, upserts the buffered files rows (keyed by path),
+    applies every buffered store_result and commits, so other writers (the PHP
+    queue/settings pages) only wait for that burst and a run pays one commit
+    per batch rather than one per file.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, run_id: int, cfg: dict,
+                 size: int = WRITE_BATCH_SIZE, max_age: float = WRITE_FLUSH_SECONDS):
+        self.conn = conn
+        self.run_id = run_id
+        self.cfg = cfg
+        self.size = max(1, size)
+        self.max_age = max_age
+        self.items: list = []
+        self.files: dict = {}  # path -> (ext, hash) for db_get_or_create_file
+        self.commits = 0
+        self._first = 0.0
+
+    def touch_file(self, path: str, ext: str, hsh: str) -> None:
+        """Queue the files row upsert (last_seen/ext/last_hash) for a file read this run."""
+        self._start()
+        self.files[path] = (ext, hsh)
+        self._maybe_flush()
+
+    def add(self, task: dict, res: dict) -> None:
+        """Queue one finished task; flush when the batch is full or old."""
+        self._start()
+        self.items.append((task, res))
+        self._maybe_flush()
+
+    def _start(self) -> None:
+        if not self.items and not self.files:
+            self._first = time.monotonic()
+
+    def _maybe_flush(self) -> None:
+        if max(len(self.items), len(self.files)) >= self.size or time.monotonic() - self._first >= self.max_age:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.items and not self.files:
+            return
+        items, self.items = self.items, []
+        files, self.files = self.files, {}
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            file_ids = {
+                path: db_get_or_create_file(self.conn, path, ext, hsh, commit=False)
+                for path, (ext, hsh) in files.items()
+            }
+            for task, res in items:
+                try:
+                    task["file_id"] = file_ids.get(task["path"]) or db_get_or_create_file(
+                        self.conn, task["path"], task["ext"], task["hash"], commit=False
+                    )
+                    store_result(self.conn, self.run_id, self.cfg, task, res)
+                except sqlite3.OperationalError:
+                    raise
+                except Exception as e:
+                    logging.exception(f"Unhandled error storing {task['path']}: {e}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.commits += 1
+
+
+def db_get_or_create_file(conn: sqlite3.Connection, path: str, ext: str, hsh: str, commit: bool = True) -> int:
     now = human_ts()
     cur = conn.cursor()
     cur.execute("SELECT id, last_hash FROM files WHERE path=?", (path,))
@@ -582,17 +741,19 @@ def db_get_or_create_file(conn: sqlite3.Connection, path: str, ext: str, hsh: st
     if row:
         fid, last_hash = row
         cur.execute("UPDATE files SET last_seen=?, ext=?, last_hash=? WHERE id=?", (now, ext, hsh, fid))
-        conn.commit()
+        if commit:
+            conn.commit()
         return fid
     cur.execute(
         "INSERT INTO files(path,ext,first_seen,last_seen,last_hash) VALUES(?,?,?,?,?)",
         (path, ext, now, now, hsh),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
 
-def db_insert_action(conn: sqlite3.Connection, run_id: int, file_id: int, action: str, model: str, backend: str, prompt: str, file_hash: str, status: str, error: str | None, tokens_in: int | None, tokens_out: int | None) -> int:
+def db_insert_action(conn: sqlite3.Connection, run_id: int, file_id: int, action: str, model: str, backend: str, prompt: str, file_hash: str, status: str, error: str | None, tokens_in: int | None, tokens_out: int | None, commit: bool = True) -> int:
     cur = conn.cursor()
     cur.execute(
         """
@@ -601,7 +762,8 @@ def db_insert_action(conn: sqlite3.Connection, run_id: int, file_id: int, action
         """,
         (run_id, file_id, action, model, backend, prompt, file_hash, tokens_in, tokens_out, status, error or "", human_ts()),
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
 # ---------------------- LLM backends ----------------------
@@ -610,13 +772,129 @@ class LLMError(Exception):
     pass
 
 
-def llm_chat(cfg: dict, messages: list[dict], model: str | None = None) -> tuple[str, dict]:
+class BackendDown(LLMError):
+    """Backend unreachable, timed out or answered 5xx; `auto` skips it for a while."""
+
+
+# Connect timeout is short so a dead backend fails in seconds, not after model_timeout.
+CONNECT_TIMEOUT_SECONDS = 5
+# After a failure, `auto` skips that backend for this long (doubling per
+# consecutive failure, capped), instead of re-probing it for every file.
+BACKEND_RETRY_SECONDS = 30
+BACKEND_RETRY_MAX_SECONDS = 600
+
+_http_local = threading.local()
+_health_lock = threading.Lock()
+_backend_health: dict[str, dict] = {}
+
+
+def _http_session(backend: str) -> requests.Session:
+    """Keep-alive session per backend, one set per thread (requests.Session is not thread-safe)."""
+    sessions = getattr(_http_local, "sessions", None)
+    if sessions is None:
+        sessions = _http_local.sessions = {}
+    sess = sessions.get(backend)
+    if sess is None:
+        sess = sessions[backend] = requests.Session()
+    return sess
+
+
+def backend_available(name: str) -> bool:
+    with _health_lock:
+        h = _backend_health.get(name)
+        return h is None or h["dead_until"] <= time.time()
+
+
+def mark_backend(name: str, ok: bool, error: str | None = None) -> None:
+    with _health_lock:
+        if ok:
+            _backend_health.pop(name, None)
+            return
+        h = _backend_health.setdefault(name, {"failures": 0, "dead_until": 0.0, "error": ""})
+        h["failures"] += 1
+        delay = min(BACKEND_RETRY_MAX_SECONDS, BACKEND_RETRY_SECONDS * 2 ** (h["failures"] - 1))
+        h["dead_until"] = time.time() + delay
+        h["error"] = (error or "")[:200]
+    logging.warning(f"Backend {name} failed ({error}); skipping it for {delay}s in auto mode")
+
+
+class _StopDetector:
+    """Watch a streamed reply and report when the expected artefact is complete:
+    expect='code' -> first fenced block closed; expect='json' -> top-level JSON
+    object closed (or a fenced block, for models that wrap JSON in ```json).
+    Works incrementally so long replies aren't rescanned per token.
+    """
+
+    def __init__(self, expect: str | None):
+        self.expect = expect
+        self.parts: list[str] = []
+        self._tail = ""
+        self._fences = 0
+        # JSON scanner state
+        self._started = False
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._dead = False
+
+    def feed(self, delta: str) -> bool:
+        self.parts.append(delta)
+        if not self.expect:
+            return False
+        window = self._tail + delta
+        found = window.count("```")
+        self._tail = window[-2:]
+        if found:
+            self._fences += found
+            if self._fences >= 2 and CODE_BLOCK_RE.search(self.text):
+                return True
+        if self.expect == "json" and not self._dead:
+            return self._feed_json(delta)
+        return False
+
+    def _feed_json(self, delta: str) -> bool:
+        for ch in delta:
+            if not self._started:
+                if ch.isspace():
+                    continue
+                if ch != "{":
+                    self._dead = True  # prose or a fence first; only the fence check applies
+                    return False
+                self._started = True
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    return True
+        return False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def llm_chat(cfg: dict, messages: list[dict], model: str | None = None, expect: str | None = None) -> tuple[str, dict]:
     """Try backends based on cfg['backend'] with graceful fallback.
     Returns (text, meta) where meta can include usage/token counts.
+
+    With llm_stream (default on) replies are streamed; `expect` ('code' or
+    'json') closes the stream as soon as that artefact is complete, which also
+    stops generation on the server.
     """
     backend_pref = (cfg.get("backend") or "auto").lower()
     tried = []
     model = model or cfg.get("model") or ""
+    stream = bool(cfg.get("llm_stream", True))
 
     # Some models can take a long time on large contexts.
     # Default is 15 minutes; configurable via settings DB.
@@ -626,20 +904,81 @@ def llm_chat(cfg: dict, messages: list[dict], model: str | None = None) -> tuple
         model_timeout = 900
     if model_timeout < 1:
         model_timeout = 1
-
-    def _try_lmstudio():
-        url = (cfg.get("base_url") or os.getenv("LLM_BASE_URL") or "http://192.168.0.210:1234") + "/v1/chat/completions"
-        print(f"LM Studio URL: {url}")
+    timeout = (min(CONNECT_TIMEOUT_SECONDS, model_timeout), model_timeout)
+
+    def _read_stream(r, parse_line) -> tuple[str, dict | None, bool]:
+        """Accumulate streamed deltas; parse_line(bytes) -> (delta, usage, done)."""
+        det = _StopDetector(expect)
+        usage = None
+        deadline = time.monotonic() + model_timeout
+        done = False
+        try:
+            for line in r.iter_lines():
+                if not line or done:
+                    # after the done marker keep reading to the end of the body,
+                    # so the keep-alive connection goes back to the pool
+                    continue
+                delta, u, done = parse_line(line)
+                if u:
+                    usage = u
+                if delta and det.feed(delta):
+                    # closing mid-body drops the connection; the server stops generating
+                    return det.text, usage, True
+                if time.monotonic() > deadline:
+                    raise LLMError(f"stream exceeded {model_timeout}s")
+        finally:
+            r.close()
+        return det.text, usage, False
+
+    def _openai_line(line: bytes):
+        if not line.startswith(b"data:"):
+            return "", None, False
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return "", None, True
+        j = json.loads(data)
+        delta = "".join(((c.get("delta") or {}).get("content") or "") for c in (j.get("choices") or []))
+        return delta, j.get("usage"), False
+
+    def _post_openai(name: str, url: str, label: str):
         payload = {"model": model, "messages": messages, "temperature": 0.2}
         headers = {"Content-Type": "application/json"}
         if cfg.get("api_key") or os.getenv("LLM_API_KEY"):
             headers["Authorization"] = f"Bearer {cfg.get('api_key') or os.getenv('LLM_API_KEY')}"
-        r = requests.post(url, json=payload, headers=headers, timeout=model_timeout)
+        if stream:
+            payload["stream"] = True
+            # Some OpenAI-compatible servers reject unknown fields; llm_stream_usage=false drops it.
+            if cfg.get("llm_stream_usage", True):
+                payload["stream_options"] = {"include_usage": True}
+        r = _http_session(name).post(url, json=payload, headers=headers, timeout=timeout, stream=stream)
         if r.status_code >= 400:
-            raise LLMError(f"LM Studio {r.status_code}: {r.text[:200]}")
+            body = r.text[:200]
+            r.close()
+            raise (BackendDown if r.status_code >= 500 else LLMError)(f"{label} {r.status_code}: {body}")
+        if stream and "text/event-stream" in (r.headers.get("Content-Type") or ""):
+            text, usage, early = _read_stream(r, _openai_line)
+            if not text:
+                raise LLMError(f"{label}: empty content")
+            return text, {"backend": name, "raw": None, "usage": usage, "stopped_early": early}
+        # Server ignored stream=true (or streaming is off): plain JSON body
         j = r.json()
         text = j["choices"][0]["message"]["content"]
-        return text, {"backend": "lmstudio", "raw": j, "usage": j.get("usage")}
+        return text, {"backend": name, "raw": j, "usage": j.get("usage")}
+
+    def _try_lmstudio():
+        url = (cfg.get("base_url") or os.getenv("LLM_BASE_URL") or "http://192.168.0.210:1234") + "/v1/chat/completions"
+        print(f"LM Studio URL: {url}")
+        return _post_openai("lmstudio", url, "LM Studio")
+
+    def _ollama_line(line: bytes):
+        j = json.loads(line)
+        if j.get("error"):
+            raise LLMError(f"Ollama: {j['error']}")
+        delta = (j.get("message") or {}).get("content") or j.get("response") or ""
+        usage = None
+        if j.get("done"):
+            usage = {"prompt_tokens": j.get("prompt_eval_count"), "completion_tokens": j.get("eval_count")}
+        return delta, usage, bool(j.get("done"))
 
     def _try_ollama():
         #url = (cfg.get("base_url") or "http://192.168.0.152:11434") + "/api/chat"
@@ -651,60 +990,32 @@ def llm_chat(cfg: dict, messages: list[dict], model: str | None = None) -> tuple
             "model": model,
             "messages": messages,
             "options": {"temperature": 0.2},
-            # Ollama chat/generate endpoints stream by default; disable streaming so we get one JSON object.
-            "stream": False,
+            # Streamed replies are NDJSON, one {"message": {"content": ...}} per line, last one has done=true.
+            "stream": stream,
         }
-        r = requests.post(url, json=payload, timeout=model_timeout)
+        r = _http_session("ollama").post(url, json=payload, timeout=timeout, stream=stream)
         if r.status_code >= 400:
-            raise LLMError(f"Ollama {r.status_code}: {r.text[:200]}")
-        # Ollama sometimes returns NDJSON (one JSON object per line). Be tolerant.
-        try:
-            j = r.json()
-        except Exception:
-            raw = (r.text or "").strip()
-            if not raw:
-                raise
-            last_obj = None
-            for line in raw.splitlines():
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    last_obj = json.loads(line)
-                except Exception:
-                    continue
-            if last_obj is None:
-                raise
-            j = last_obj
-        text = j.get("message", {}).get("content") or j.get("content")
-        if not text:
-            # Non-streaming /chat returns aggregated messages under 'message'
-            msgs = j.get("messages") or []
-            if msgs:
-                text = msgs[-1].get("content", "")
+            body = r.text[:200]
+            r.close()
+            raise (BackendDown if r.status_code >= 500 else LLMError)(f"Ollama {r.status_code}: {body}")
+        text, usage, early = _read_stream(r, _ollama_line)
         if not text:
             raise LLMError("Ollama: empty content")
-        return text, {"backend": "ollama", "raw": j}
+        return text, {"backend": "ollama", "raw": None, "usage": usage, "stopped_early": early}
 
     def _try_openai_compat():
         base = cfg.get("base_url") or os.getenv("LLM_BASE_URL")
         if not base:
             raise LLMError("openai_compat requires base_url (LLM_BASE_URL)")
         url = base.rstrip("/") + "/v1/chat/completions"
-        payload = {"model": model, "messages": messages, "temperature": 0.2}
-        headers = {"Content-Type": "application/json"}
-        if cfg.get("api_key") or os.getenv("LLM_API_KEY"):
-            headers["Authorization"] = f"Bearer {cfg.get('api_key') or os.getenv('LLM_API_KEY')}"
-        r = requests.post(url, json=payload, headers=headers, timeout=model_timeout)
-        if r.status_code >= 400:
-            raise LLMError(f"OpenAI‑compat {r.status_code}: {r.text[:200]}")
-        j = r.json()
-        text = j["choices"][0]["message"]["content"]
-        return text, {"backend": "openai_compat", "raw": j, "usage": j.get("usage")}
+        return _post_openai("openai_compat", url, "OpenAI‑compat")
 
     sequence = []
     if backend_pref == "auto":
         sequence = [_try_lmstudio, _try_ollama, _try_openai_compat]
+        # Skip backends that recently failed, unless that would leave nothing to try.
+        alive = [fn for fn in sequence if backend_available(fn.__name__.replace("_try_", ""))]
+        sequence = alive or sequence
     elif backend_pref == "lmstudio":
         sequence = [_try_lmstudio]
     elif backend_pref == "ollama":
@@ -721,11 +1032,18 @@ def llm_chat(cfg: dict, messages: list[dict], model: str | None = None) -> tuple
         try:
             text, meta = fn()
             meta["backend"] = meta.get("backend") or name
+            mark_backend(name, True)
             return text, meta
+        except (requests.ConnectionError, requests.Timeout, BackendDown) as e:
+            tried.append(name)
+            last_exc = e
+            # Only a backend that is down is skipped; 4xx, empty or malformed replies
+            # and config errors say nothing about its health.
+            if backend_pref == "auto":
+                mark_backend(name, False, str(e))
         except Exception as e:
             tried.append(name)
             last_exc = e
-            continue
     raise LLMError(f"All backends failed (tried: {tried}): {last_exc}")
 
 # ---------------------- Walker ----------------------
@@ -745,16 +1063,24 @@ def should_skip_dir(rel_dir: str, exclude_dirs: list[str]) -> bool:
     return False
 
 
-def gather_candidates(cfg: dict) -> list[str]:
+def code_size_cap(cfg: dict) -> int:
+    """Largest code file worth picking: max_filesize_kb, or max_chunked_kb in chunked mode."""
+    kb = int(cfg.get("max_filesize_kb", 512))
+    if cfg.get("chunk_large_files"):
+        kb = max(kb, int(cfg.get("max_chunked_kb", 2048)))
+    return kb * 1024
+
+
+def _scan_rules(cfg: dict) -> dict:
+    """Resolve scan_path, exclude_dirs, file_types and .gitignore patterns once per run."""
     base = Path(cfg["scan_path"]).resolve()
     ex = cfg.get("exclude_dirs") or []
     ex = [e.strip("/") for e in ex]
     ex = list(dict.fromkeys(ex))  # dedupe
 
     file_types = set([e.lstrip(".").lower() for e in cfg.get("file_types", [])])
-    max_bytes = int(cfg.get("max_filesize_kb", 512)) * 1024
     respect_gitignore = bool(cfg.get("respect_gitignore", True))
-    git_ignores: set[str] = set()
+    git_ignores: list[str] = []
 
     if respect_gitignore:
         gi_path = base / ".gitignore"
@@ -764,9 +1090,23 @@ def gather_candidates(cfg: dict) -> list[str]:
                     s = line.strip()
                     if not s or s.startswith("#"):
                         continue
-                    git_ignores.add(s)
+                    git_ignores.append(s)
             except Exception:
                 pass
+    git_ignores = list(dict.fromkeys(git_ignores))
+
+    # One compiled alternation instead of fnmatch() per pattern per directory.
+    ignore_re = re.compile("|".join(fnmatch.translate(p) for p in git_ignores)) if git_ignores else None
+    return {"base": base, "exclude": ex, "file_types": file_types, "git_ignores": git_ignores, "ignore_re": ignore_re}
+
+
+def _walk_candidates(cfg: dict, rules: dict) -> list[str]:
+    """Full os.walk of scan_path (used when no DB connection is available)."""
+    base = rules["base"]
+    ex = rules["exclude"]
+    file_types = rules["file_types"]
+    ignore_re = rules["ignore_re"]
+    max_bytes = code_size_cap(cfg)
 
     candidates: list[str] = []
     for root, dirs, files in os.walk(base, followlinks=False):
@@ -778,8 +1118,8 @@ def gather_candidates(cfg: dict) -> list[str]:
             dirs[:] = []
             continue
         # prune by .gitignore patterns (basic)
-        if respect_gitignore and git_ignores:
-            dirs[:] = [d for d in dirs if not any(fnmatch.fnmatch(d, pat) for pat in git_ignores)]
+        if ignore_re is not None:
+            dirs[:] = [d for d in dirs if not ignore_re.match(d)]
         for fn in files:
             ext = fn.split(".")[-1].lower() if "." in fn else ""
             if ext not in file_types:
@@ -792,21 +1132,159 @@ def gather_candidates(cfg: dict) -> list[str]:
             except OSError:
                 continue
             candidates.append(full)
-    
-    # Collect all candidates, then randomize and limit
-    random.shuffle(candidates)
+    return candidates
+
+
+def refresh_scan_index(conn: sqlite3.Connection, cfg: dict, rules: dict | None = None) -> dict:
+    """Bring scan_dirs/scan_files up to date with scan_path.
+
+    Every directory is stat()ed, but only directories whose mtime changed since
+    the last run are listed again; unchanged directories reuse their indexed
+    files and subdirectories. A directory's mtime moves whenever an entry is
+    added, removed or renamed in it, which is all the index tracks (size is
+    re-checked at selection time). Changing scan_path, exclude_dirs,
+    file_types or .gitignore rebuilds the index from scratch.
+    """
+    rules = rules or _scan_rules(cfg)
+    base = rules["base"]
+    ex = rules["exclude"]
+    file_types = rules["file_types"]
+    ignore_re = rules["ignore_re"]
+    t0 = time.time()
+
+    fingerprint = sha256_bytes(json.dumps(
+        [str(base), ex, sorted(file_types), rules["git_ignores"]], ensure_ascii=False
+    ).encode("utf-8"))
+    row = conn.execute("SELECT value FROM scan_meta WHERE key='rules'").fetchone()
+    if not row or row[0] != fingerprint:
+        conn.execute("DELETE FROM scan_dirs")
+        conn.execute("DELETE FROM scan_files")
+        conn.execute("INSERT OR REPLACE INTO scan_meta(key,value) VALUES('rules',?)", (fingerprint,))
+
+    known: dict[str, int] = {}
+    children: dict[str, list[str]] = {}
+    for path, parent, mtime_ns in conn.execute("SELECT path, parent, mtime_ns FROM scan_dirs"):
+        known[path] = mtime_ns
+        if parent is not None:
+            children.setdefault(parent, []).append(path)
+
+    visited: set[str] = set()
+    rescanned = 0
+    stack = [(str(base), None)]
+    while stack:
+        d, parent = stack.pop()
+        try:
+            st = os.stat(d)
+        except OSError:
+            continue
+        visited.add(d)
+
+        if known.get(d) == st.st_mtime_ns:
+            stack.extend((c, d) for c in children.get(d, ()))
+            continue
+
+        rescanned += 1
+        subdirs: list[str] = []
+        rows: list[tuple] = []
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if ignore_re is not None and ignore_re.match(entry.name):
+                                continue
+                            if should_skip_dir(os.path.relpath(entry.path, base), ex):
+                                continue
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            name = entry.name
+                            ext = name.split(".")[-1].lower() if "." in name else ""
+                            if ext not in file_types:
+                                continue
+                            est = entry.stat()
+                            rows.append((entry.path, d, ext, est.st_size, est.st_mtime_ns, est.st_ino))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.warning(f"scan index: cannot list {d}: {e}")
+            continue
+
+        conn.execute("DELETE FROM scan_files WHERE dir=?", (d,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO scan_files(path,dir,ext,size,mtime_ns,inode) VALUES(?,?,?,?,?,?)", rows
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO scan_dirs(path,parent,mtime_ns) VALUES(?,?,?)", (d, parent, st.st_mtime_ns)
+        )
+        stack.extend((c, d) for c in subdirs)
+
+    gone = [(p,) for p in known if p not in visited]
+    if gone:
+        conn.executemany("DELETE FROM scan_files WHERE dir=?", gone)
+        conn.executemany("DELETE FROM scan_dirs WHERE path=?", gone)
+    conn.commit()
+
+    stats = {"dirs": len(visited), "rescanned": rescanned, "removed": len(gone), "seconds": round(time.time() - t0, 3)}
+    logging.info(f"Scan index: dirs={stats['dirs']} rescanned={rescanned} removed={len(gone)} in {stats['seconds']}s")
+    return stats
+
+
+def gather_candidates(cfg: dict, conn: sqlite3.Connection | None = None) -> list[str]:
+    """Pick up to limit_per_run random files under scan_path.
+
+    With a DB connection the persistent scan index is refreshed and sampled;
+    without one this falls back to a full walk.
+    """
+    rules = _scan_rules(cfg)
     limit = int(cfg.get("limit_per_run") or 50)
-    return candidates[:limit]
+    max_bytes = code_size_cap(cfg)
+
+    if conn is None:
+        # Collect all candidates, then randomize and limit
+        candidates = _walk_candidates(cfg, rules)
+        random.shuffle(candidates)
+        return candidates[:limit]
+
+    refresh_scan_index(conn, cfg, rules)
+    if not rules["file_types"]:
+        return []
+
+    # In-place edits don't touch the directory mtime, so the indexed size may be
+    # stale: re-check the size cap on the sampled files only.
+    marks = ",".join("?" for _ in rules["file_types"])
+    cur = conn.execute(
+        f"SELECT path, ext FROM scan_files WHERE ext IN ({marks}) ORDER BY RANDOM()",
+        sorted(rules["file_types"]),
+    )
+    candidates: list[str] = []
+    for path, ext in cur:
+        try:
+            if ext in CODE_LIKE_EXT and os.path.getsize(path) > max_bytes:
+                # too big for code; skip (logs handled later)
+                continue
+        except OSError:
+            continue
+        candidates.append(path)
+        if len(candidates) >= limit:
+            break
+    cur.close()
+    return candidates
 
 
-def is_file_already_processed(conn: sqlite3.Connection, path: str, model: str, action: str) -> bool:
+def is_file_already_processed(conn: sqlite3.Connection, path: str, model: str, action: str, file_id: int | None = None) -> bool:
     """Check if file has already been processed with this model/action and hasn't been modified."""
     try:
         cur = conn.cursor()
         # Check if there's a successful action for this file/model/action combo
+        # (answered from idx_actions_dedupe alone)
+        if file_id is None:
+            row = cur.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+            if not row:
+                return False
+            file_id = row[0]
         cur.execute(
-            "SELECT MAX(created_at) FROM actions WHERE file_id = (SELECT id FROM files WHERE path = ?) AND model = ? AND action = ? AND status = ?",
-            (path, model, action, "ok")
+            "SELECT MAX(created_at) FROM actions WHERE file_id = ? AND model = ? AND action = ? AND status = ?",
+            (file_id, model, action, "ok")
         )
         row = cur.fetchone()
         if not row or not row[0]:
@@ -855,6 +1333,135 @@ def read_payload_for_model(path: str, cfg: dict) -> tuple[str, str]:
         return "", ext
 
 
+def read_file_window(path: str, start: int, limit: int) -> tuple[bytes, str, int]:
+    """One streaming pass: return (bytes[start:start+limit], sha256 of the whole file, size)."""
+    h = hashlib.sha256()
+    window = bytearray()
+    pos = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            h.update(chunk)
+            lo = max(start - pos, 0)
+            hi = min(start + limit - pos, len(chunk))
+            if lo < hi:
+                window += chunk[lo:hi]
+            pos += len(chunk)
+    return bytes(window), h.hexdigest(), pos
+
+
+def read_file_for_model(path: str, cfg: dict) -> tuple[str, str, str, int]:
+    """Like read_payload_for_model, but also return (sha256, size) of the whole
+    file, hashed in the same streaming pass that collects the payload.
+    Logs still take their payload from the tail.
+    """
+    ext = path.split(".")[-1].lower()
+    max_bytes = int(cfg.get("max_filesize_kb", 512)) * 1024
+    head, hsh, size = read_file_window(path, 0, 0 if ext == "log" else max_bytes)
+    if ext == "log":
+        payload = tail_lines(path, int(cfg.get("log_tail_lines", 1200)))
+    else:
+        payload = head.decode("utf-8", errors="ignore")
+    return payload, ext, hsh, size
+
+
+# ---------------------- Chunked (map-reduce) mode ----------------------
+
+# Top-level definitions in the languages we scan; preferred chunk boundaries.
+CHUNK_BOUNDARY_RE = re.compile(
+    r"^(?:(?:async\s+)?def|class|function|interface|trait|(?:(?:abstract|final|public|private|protected|static)\s+)+function)\b"
+)
+
+CHUNK_NOTE = "This is one part of a larger file; cover only what is in this part."
+
+AUDIT_INSTR = (
+    "You are CodeWalker, a careful code and log auditor. List concrete findings in the content: bugs, security risks, "
+    "performance problems and recurring errors, each with a line or excerpt reference. Be concise; say 'none' if nothing stands out."
+)
+
+SUMMARY_MERGE_INSTR = (
+    "You are CodeWalker. Merge the partial JSON summaries below (one per part of the same file, in order) into a single summary "
+    "of the whole file. Return *valid JSON only* with keys: "
+    "{file_purpose, key_functions, inputs_outputs, dependencies, side_effects, risks, todos, test_ideas}."
+)
+
+
+def split_code_chunks(text: str, chunk_bytes: int) -> list[tuple[str, str]]:
+    """Split source into (label, text) parts of about chunk_bytes, cutting before
+    a top-level def/class/function once a part is half full, else at a line end."""
+    out: list[tuple[str, str]] = []
+    cur: list[str] = []
+    cur_bytes = 0
+    start = 1
+    for i, line in enumerate(text.splitlines(keepends=True), 1):
+        n = len(line)
+        if cur and (cur_bytes + n > chunk_bytes or (cur_bytes >= chunk_bytes // 2 and CHUNK_BOUNDARY_RE.match(line))):
+            out.append((f"lines {start}-{i - 1}", "".join(cur)))
+            cur, cur_bytes, start = [], 0, i
+        cur.append(line)
+        cur_bytes += n
+    if cur:
+        out.append((f"lines {start}-{start + len(cur) - 1}", "".join(cur)))
+    return out
+
+
+def split_log_chunks(data: bytes, offset: int, chunk_bytes: int) -> list[tuple[str, str]]:
+    """Split a log window that starts at `offset` (a multiple of chunk_bytes) at
+    the first newline after each multiple of chunk_bytes. Boundaries depend only
+    on absolute file offsets, so appending to a log changes just the last part."""
+    pos = 0
+    if offset > 0:
+        nl = data.find(b"\n")  # drop the partial first line
+        pos = nl + 1 if nl >= 0 else len(data)
+    out: list[tuple[str, str]] = []
+    k = 1
+    while pos < len(data):
+        nominal = k * chunk_bytes
+        k += 1
+        if nominal <= pos:
+            continue
+        nl = data.find(b"\n", nominal)
+        end = nl + 1 if nl >= 0 else len(data)
+        out.append((f"bytes {offset + pos}-{offset + end}", data[pos:end].decode("utf-8", errors="ignore")))
+        pos = end
+    return out
+
+
+def chunk_plan(cfg: dict, path: str) -> tuple[int, int] | None:
+    """Return (window_start, window_len) when `path` should go through chunked mode."""
+    if not cfg.get("chunk_large_files"):
+        return None
+    ext = path.split(".")[-1].lower()
+    max_bytes = int(cfg.get("max_filesize_kb", 512)) * 1024
+    max_chunked = int(cfg.get("max_chunked_kb", 2048)) * 1024
+    chunk_bytes = max(4096, int(cfg.get("chunk_kb", 48)) * 1024)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    if size <= max_bytes:
+        return None
+    if ext == "log":
+        # last max_chunked bytes, aligned down so chunk boundaries stay put as the log grows
+        start = (max(0, size - max_chunked) // chunk_bytes) * chunk_bytes
+        return start, size - start
+    if size > max_chunked:
+        return None
+    return 0, size
+
+
+
+def cache_lookup(conn: sqlite3.Connection, file_hash: str, action: str, model: str, prompt_hash: str) -> str | None:
+    """Return the stored model response for identical content + action + model + prompt, if any."""
+    row = conn.execute(
+        "SELECT response FROM result_cache WHERE file_hash=? AND action=? AND model=? AND prompt_hash=?",
+        (file_hash, action, model, prompt_hash),
+    ).fetchone()
+    return row[0] if row else None
+
+
 SUMMARIZE_INSTR = (
     "You are CodeWalker, an expert static analyzer. Read the file content and produce a compact, actionable JSON summary. "
     "Focus on purpose, key functions, inputs/outputs, dependencies, side effects, security or performance risks, and immediate TODOs. "
@@ -884,6 +1491,336 @@ def extract_first_codeblock(text: str) -> tuple[str, str] | None:
 
 # ---------------------- Main run ----------------------
 
+def prepare_task(conn: sqlite3.Connection, cfg: dict, path: str, batch: WriteBatch) -> dict | None:
+    """Read the file, pick the action and build the LLM messages.
+    Returns None when the file is empty or already processed. The files row
+    is only queued on `batch`; task["file_id"] is filled in when it flushes.
+    """
+    plan = chunk_plan(cfg, path)
+    try:
+        # hash full file (not only payload) to detect change
+        if plan:
+            ext = path.split(".")[-1].lower()
+            window, hsh, size = read_file_window(path, plan[0], plan[1])
+            payload = window.decode("utf-8", errors="ignore")
+        else:
+            payload, ext, hsh, size = read_file_for_model(path, cfg)
+    except OSError as e:
+        logging.warning(f"read_file_for_model failed {path}: {e}")
+        return None
+    if not payload.strip():
+        return None
+    # written with the batch: no per-file commit, and no write transaction open during LLM calls
+    batch.touch_file(path, ext, hsh)
+
+    # Decide action based on file type
+    if ext == "log":
+        action = "summarize"
+    else:
+        action = pick_random_action(cfg)
+        if plan and action != "summarize":
+            # only summaries and audits can be merged from parts
+            action = "audit" if action == "audit" else "summarize"
+
+    # Check for deduplication: skip if already processed with same model/action
+    model = cfg.get("model") or ""
+    if is_file_already_processed(conn, path, model, action):
+        logging.info(f"[skip] {path} (already processed)")
+        return None
+
+    # Build prompts
+    file_meta = f"File: {path}\nExt: {ext}\nSize: {size} bytes\nLastModified: {human_ts(os.path.getmtime(path))}\n"
+
+    chunks = None
+    if plan:
+        chunk_bytes = max(4096, int(cfg.get("chunk_kb", 48)) * 1024)
+        if ext == "log":
+            parts = split_log_chunks(window, plan[0], chunk_bytes)
+        else:
+            parts = split_code_chunks(payload, chunk_bytes)
+        if action == "summarize":
+            tpl = cfg.get("prompt_summarize_template") or "summarize"
+            base_system = get_prompt_template(str(tpl)) or SUMMARIZE_INSTR
+        else:
+            tpl = cfg.get("prompt_audit_template") or "audit"
+            base_system = get_prompt_template(str(tpl)) or AUDIT_INSTR
+        chunk_system = f"{base_system}\n{CHUNK_NOTE}"
+        # Part prompts carry no path or position, so identical parts (unchanged
+        # functions, old log segments, copies) hit the cache wherever they sit.
+        chunk_prompt_hash = sha256_bytes(f"{ext}\n{chunk_system}".encode("utf-8"))
+        chunks = []
+        for label, text in parts:
+            chash = sha256_bytes(text.encode("utf-8"))
+            safe_text = text.replace("```", "``\\`")
+            chunks.append({
+                "label": label,
+                "hash": chash,
+                "messages": [
+                    {"role": "system", "content": chunk_system},
+                    {"role": "user", "content": f"Ext: {ext}\nCONTENT:\n```{ext}\n{safe_text}\n```"},
+                ],
+                "cached": cache_lookup(conn, chash, f"{action}:chunk", model, chunk_prompt_hash)
+                if cfg.get("cache_results", True) else None,
+            })
+        prompt_used = f"{chunk_system} [chunked: {len(chunks)} parts]"
+        messages = None
+        payload = ""
+    elif action == "summarize":
+        summarize_tpl_name = (cfg.get("prompt_summarize_template") or "summarize")
+        summarize_system = get_prompt_template(str(summarize_tpl_name)) or SUMMARIZE_INSTR
+        messages = [
+            {"role": "system", "content": summarize_system},
+            {"role": "user", "content": file_meta + "\nCONTENT:\n```" + ext + "\n" + payload + "\n```"},
+        ]
+        prompt_used = summarize_system
+    else:
+        # choose a prompt (flat distribution across all prompts; deterministic per file)
+        extra, _prompt_used = pick_rewrite_prompt_deterministic(
+            cfg,
+            strategy="flat",          # or "by_pool"
+            weights={"A": 1, "B": 2}, # only used if strategy="by_pool"
+            file_path=path            # makes selection stable for this file
+        )
+
+        rewrite_tpl_name = (cfg.get("prompt_rewrite_template") or "rewrite")
+        rewrite_system = get_prompt_template(str(rewrite_tpl_name)) or REWRITE_INSTR_PREFIX
+        prompt_used = f"{rewrite_system} {extra}".strip()
+
+        # fence-safety if content may include ```
+        safe_payload = payload.replace("```", "``\\`")
+
+        messages = [
+            {"role": "system", "content": prompt_used},
+            {"role": "user", "content": f"{file_meta}\nRewrite the entire file below.\n```{ext}\n{safe_payload}\n```"},
+        ]
+
+    # Identical content already answered with the same action/model/prompt
+    # (touched files, copies, vendored duplicates): reuse instead of re-asking.
+    prompt_hash = sha256_bytes(f"{ext}\n{prompt_used}".encode("utf-8"))
+    cached = None
+    if cfg.get("cache_results", True):
+        cached = cache_lookup(conn, hsh, action, model, prompt_hash)
+
+    return {
+        "path": path,
+        "ext": ext,
+        "hash": hsh,
+        "file_id": None,
+        "action": action,
+        "prompt": prompt_used,
+        "prompt_hash": prompt_hash,
+        "messages": messages,
+        "chunks": chunks,
+        "chunk_prompt_hash": chunk_prompt_hash if chunks else None,
+        # rewrite replies end at the first code block, summaries at the JSON object
+        "expect": {"summarize": "json", "rewrite": "code"}.get(action),
+        "content": payload,
+        "cached": cached,
+    }
+
+
+# Caps concurrent llm_chat calls across whole-file tasks and chunk calls; set by run_once.
+_llm_slots: threading.BoundedSemaphore | None = None
+
+
+def _llm_call(cfg: dict, messages: list[dict], expect: str | None) -> tuple[str, dict]:
+    gate = _llm_slots
+    if gate is None:
+        return llm_chat(cfg, messages, model=cfg.get("model"), expect=expect)
+    with gate:
+        return llm_chat(cfg, messages, model=cfg.get("model"), expect=expect)
+
+
+def _merge_chunk_results(cfg: dict, task: dict, parts: list[tuple[str, str]]) -> tuple[str, int, int]:
+    """Reduce step: audits are concatenated per part; summaries are merged by
+    one more model call, falling back to a JSON list of the part summaries."""
+    if task["action"] != "summarize":
+        return "\n\n".join(f"## {label}\n{text.strip()}" for label, text in parts), 0, 0
+
+    body = "\n\n".join(f"PART {label}:\n{text.strip()}" for label, text in parts)
+    messages = [
+        {"role": "system", "content": SUMMARY_MERGE_INSTR},
+        {"role": "user", "content": f"File: {task['path']}\nExt: {task['ext']}\n\n{body}"},
+    ]
+    try:
+        text, meta = _llm_call(cfg, messages, "json")
+        json.loads(text.strip())
+        usage = meta.get("usage") or {}
+        return text.strip(), usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    except Exception as e:
+        logging.warning(f"Summary merge failed for {task['path']}: {e}; storing part summaries")
+    merged = []
+    for label, text in parts:
+        try:
+            merged.append({"part": label, "summary": json.loads(text.strip())})
+        except Exception:
+            merged.append({"part": label, "summary": {"raw": text}})
+    return json.dumps({"parts": merged}, ensure_ascii=False), 0, 0
+
+
+def call_llm_chunked(cfg: dict, task: dict) -> dict:
+    """Map uncached parts concurrently, then reduce. New part responses are
+    returned in res['chunk_cache'] for store_result to cache (no DB access here)."""
+    chunks = task["chunks"]
+    texts: dict[int, str] = {i: c["cached"] for i, c in enumerate(chunks) if c["cached"] is not None}
+    todo = [i for i in range(len(chunks)) if i not in texts]
+    new_cache: list[tuple[str, str]] = []
+    errors: list[str] = []
+    tokens_in = tokens_out = 0
+    backend = cfg.get("backend")
+
+    if todo:
+        try:
+            workers = max(1, min(len(todo), int(cfg.get("llm_concurrency") or 1)))
+        except Exception:
+            workers = 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cw-chunk") as pool:
+            futs = {pool.submit(_llm_call, cfg, chunks[i]["messages"], task.get("expect")): i for i in todo}
+            for fut in futs:
+                i = futs[fut]
+                try:
+                    text, meta = fut.result()
+                except Exception as e:
+                    errors.append(f"{chunks[i]['label']}: {e}")
+                    continue
+                if not text or not text.strip():
+                    errors.append(f"{chunks[i]['label']}: empty response")
+                    continue
+                texts[i] = text
+                new_cache.append((chunks[i]["hash"], text))
+                backend = meta.get("backend", backend)
+                usage = meta.get("usage") or {}
+                tokens_in += usage.get("prompt_tokens") or 0
+                tokens_out += usage.get("completion_tokens") or 0
+
+    logging.info(f"[chunks] {task['path']}: {len(chunks)} parts, {len(chunks) - len(todo)} cached, {len(todo)} sent")
+    res = {"text": "", "backend": backend, "tokens_in": tokens_in or None, "tokens_out": tokens_out or None,
+           "status": "error", "error": "; ".join(errors)[:1000], "chunk_cache": new_cache}
+    if errors:
+        return res
+
+    text, t_in, t_out = _merge_chunk_results(cfg, task, [(chunks[i]["label"], texts[i]) for i in range(len(chunks))])
+    res.update(text=text, status="ok", error=None,
+               tokens_in=(tokens_in + t_in) or None, tokens_out=(tokens_out + t_out) or None)
+    return res
+
+
+def call_llm(cfg: dict, task: dict) -> dict:
+    """Run llm_chat for one prepared task. Safe to call from worker threads (no DB access)."""
+    if task.get("chunks"):
+        return call_llm_chunked(cfg, task)
+    try:
+        text, meta = _llm_call(cfg, task["messages"], task.get("expect"))
+        usage = meta.get("usage") or {}
+        return {
+            "text": text,
+            "backend": meta.get("backend", cfg.get("backend")),
+            "tokens_in": usage.get("prompt_tokens"),
+            "tokens_out": usage.get("completion_tokens"),
+            "status": "ok",
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "text": "",
+            "backend": cfg.get("backend"),
+            "tokens_in": None,
+            "tokens_out": None,
+            "status": "error",
+            "error": str(e),
+        }
+
+
+def store_result(conn: sqlite3.Connection, run_id: int, cfg: dict, task: dict, res: dict) -> None:
+    """Record the action and its result rows, then mark the queued entry done.
+    Does not commit; WriteBatch.flush() calls it inside its own transaction.
+    """
+    path = task["path"]
+    action = task["action"]
+    text = res["text"]
+    status = res["status"]
+    err = res["error"]
+
+    action_id = db_insert_action(
+        conn, run_id, task["file_id"], action, cfg.get("model"), res["backend"], task["prompt"], task["hash"],
+        status, err, res["tokens_in"], res["tokens_out"], commit=False
+    )
+
+    if status == "ok":
+        # Validate response is not empty
+        if not text or text.strip() == "":
+            status = "error"
+            err = "Empty response from AI model"
+            conn.execute("UPDATE actions SET status=?, error=? WHERE id=?", (status, err, action_id))
+        elif action == "summarize":
+            # Expect valid JSON; if invalid, store raw text
+            summary_text = text.strip()
+            try:
+                # minimal validation
+                json.loads(summary_text)
+            except Exception:
+                # Wrap as JSON
+                summary_text = json.dumps({"raw": text}, ensure_ascii=False)
+            conn.execute("INSERT OR REPLACE INTO summaries(action_id,summary) VALUES(?,?)", (action_id, summary_text))
+        elif action == "rewrite":
+            # rewrite: try to extract code block; fallback to full text
+            body = text
+            blk = extract_first_codeblock(text)
+            if blk:
+                body = blk[1]
+            new_text = body
+            old_text = task["content"]
+            diff = unified_diff(old_text, new_text, path, path + ".rewritten")
+            conn.execute(
+                "INSERT OR REPLACE INTO rewrites(action_id,rewrite,diff) VALUES(?,?,?)",
+                (action_id, new_text, diff),
+            )
+        elif action == "audit":
+            conn.execute(
+                "INSERT OR REPLACE INTO audits(action_id,findings) VALUES(?,?)",
+                (action_id, text),
+            )
+        elif action == "test":
+            conn.execute(
+                "INSERT OR REPLACE INTO tests(action_id,strategy) VALUES(?,?)",
+                (action_id, text),
+            )
+        elif action == "docs":
+            conn.execute(
+                "INSERT OR REPLACE INTO docs(action_id,documentation) VALUES(?,?)",
+                (action_id, text),
+            )
+        elif action == "refactor":
+            conn.execute(
+                "INSERT OR REPLACE INTO refactors(action_id,suggestions) VALUES(?,?)",
+                (action_id, text),
+            )
+        else:
+            status = "error"
+            err = "Unsupported action type: {0}".format(action)
+            conn.execute("UPDATE actions SET status=?, error=? WHERE id=?", (status, err, action_id))
+    else:
+        logging.warning(f"Action failed for {path}: {err}")
+
+    for chunk_hash, chunk_text in res.get("chunk_cache") or ():
+        conn.execute(
+            "INSERT OR REPLACE INTO result_cache(file_hash,action,model,prompt_hash,response,action_id,created_at) VALUES(?,?,?,?,?,?,?)",
+            (chunk_hash, f"{action}:chunk", cfg.get("model") or "", task["chunk_prompt_hash"], chunk_text, action_id, human_ts()),
+        )
+
+    if status == "ok" and task.get("cached") is None:
+        conn.execute(
+            "INSERT OR REPLACE INTO result_cache(file_hash,action,model,prompt_hash,response,action_id,created_at) VALUES(?,?,?,?,?,?,?)",
+            (task["hash"], action, cfg.get("model") or "", task["prompt_hash"], text, action_id, human_ts()),
+        )
+
+    # Mark queued entry as done if present
+    try:
+        conn.execute("UPDATE queued_files SET status='done' WHERE path=? AND status='pending'", (path,))
+    except Exception:
+        pass
+
+
 def run_once(cfg: dict) -> None:
     # Locking
     lockfile = cfg.get("lockfile") or "/tmp/codewalker.lock"
@@ -905,8 +1842,9 @@ def run_once(cfg: dict) -> None:
         "INSERT INTO runs(started_at,host,pid,config_json) VALUES(?,?,?,?)",
         (human_ts(), socket.gethostname(), os.getpid(), json.dumps(cfg, ensure_ascii=False)),
     )
-    conn.commit()
+    conn.commit()  # the run row is committed up front, before any LLM work
     run_id = cur.lastrowid
+    batch = WriteBatch(conn, run_id, cfg)
 
     try:
         limit = int(cfg.get("limit_per_run") or 50)
@@ -927,7 +1865,7 @@ def run_once(cfg: dict) -> None:
                 return
         else:
             # mode=cron (default): scan filesystem and prioritize queued work first
-            candidates = gather_candidates(cfg)
+            candidates = gather_candidates(cfg, conn)
 
         # If we have queued paths and we're not already queue-only, reorder to prioritize queued files
         if mode not in ("que", "queue") and queued_paths:
@@ -943,160 +1881,71 @@ def run_once(cfg: dict) -> None:
                     prioritized.append(p)
             candidates = prioritized
         processed = 0
+        reused = 0
         logging.info(f"Found {len(candidates)} candidate files")
 
-        for path in candidates:
-            if processed >= limit:
-                break
-            try:
-                payload, ext = read_payload_for_model(path, cfg)
-                if not payload.strip():
-                    continue
-                # hash full file (not only payload) to detect change
-                with open(path, "rb") as f:
-                    full_bytes = f.read()
-                hsh = sha256_bytes(full_bytes)
-                file_id = db_get_or_create_file(conn, path, ext, hsh)
-
-                # Skip unchanged if last action already saw this hash recently (optional)
-                # (We always log action to see cadence; you can add a dedup check if desired.)
-
-                # Decide action based on file type
-                if ext == "log":
-                    action = "summarize"
-                else:
-                    action = pick_random_action(cfg)
-
-                # Check for deduplication: skip if already processed with same model/action
-                model = cfg.get("model") or ""
-                if is_file_already_processed(conn, path, model, action):
-                    logging.info(f"[skip] {path} (already processed)")
-                    continue
-
-                # Build prompts
-                file_meta = f"File: {path}\nExt: {ext}\nSize: {len(full_bytes)} bytes\nLastModified: {human_ts(os.path.getmtime(path))}\n"
-
-                if action == "summarize":
-                    summarize_tpl_name = (cfg.get("prompt_summarize_template") or "summarize")
-                    summarize_system = get_prompt_template(str(summarize_tpl_name)) or SUMMARIZE_INSTR
-                    messages = [
-                        {"role": "system", "content": summarize_system},
-                        {"role": "user", "content": file_meta + "\nCONTENT:\n```" + ext + "\n" + payload + "\n```"},
-                    ]
-                    prompt_used = summarize_system
-                else:                    
-                    # choose a prompt (flat distribution across all prompts; deterministic per file)
-                    extra, _prompt_used = pick_rewrite_prompt_deterministic(
-                        cfg,
-                        strategy="flat",          # or "by_pool"
-                        weights={"A": 1, "B": 2}, # only used if strategy="by_pool"
-                        file_path=path            # makes selection stable for this file
-                    )
-
-                    rewrite_tpl_name = (cfg.get("prompt_rewrite_template") or "rewrite")
-                    rewrite_system = get_prompt_template(str(rewrite_tpl_name)) or REWRITE_INSTR_PREFIX
-                    prompt_used = f"{rewrite_system} {extra}".strip()
-
-                    # fence-safety if content may include ```
-                    safe_payload = payload.replace("```", "``\\`")
-
-                    messages = [
-                        {"role": "system", "content": prompt_used},
-                        {"role": "user", "content": f"{file_meta}\nRewrite the entire file below.\n```{ext}\n{safe_payload}\n```"},
-                    ]
-
-
-                try:
-                    text, meta = llm_chat(cfg, messages, model=cfg.get("model"))
-                    backend = meta.get("backend", cfg.get("backend"))
-                    usage = meta.get("usage") or {}
-                    tokens_in = usage.get("prompt_tokens")
-                    tokens_out = usage.get("completion_tokens")
-                    status = "ok"
-                    err = None
-                except Exception as e:
-                    text = ""
-                    backend = cfg.get("backend")
-                    tokens_in = tokens_out = None
-                    status = "error"
-                    err = str(e)
-
-                action_id = db_insert_action(
-                    conn, run_id, file_id, action, cfg.get("model"), backend, prompt_used, hsh, status, err, tokens_in, tokens_out
-                )
-
-                if status == "ok":
-                    # Validate response is not empty
-                    if not text or text.strip() == "":
-                        status = "error"
-                        err = "Empty response from AI model"
-                        conn.execute("UPDATE actions SET status=?, error=? WHERE id=?", (status, err, action_id))
-                    elif action == "summarize":
-                        # Expect valid JSON; if invalid, store raw text
-                        summary_text = text.strip()
-                        try:
-                            # minimal validation
-                            json.loads(summary_text)
-                        except Exception:
-                            # Wrap as JSON
-                            summary_text = json.dumps({"raw": text}, ensure_ascii=False)
-                        conn.execute("INSERT OR REPLACE INTO summaries(action_id,summary) VALUES(?,?)", (action_id, summary_text))
-                    elif action == "rewrite":
-                        # rewrite: try to extract code block; fallback to full text
-                        body = text
-                        blk = extract_first_codeblock(text)
-                        if blk:
-                            body = blk[1]
-                        new_text = body
-                        old_text = full_bytes.decode("utf-8", errors="ignore")
-                        diff = unified_diff(old_text, new_text, path, path + ".rewritten")
-                        conn.execute(
-                            "INSERT OR REPLACE INTO rewrites(action_id,rewrite,diff) VALUES(?,?,?)",
-                            (action_id, new_text, diff),
-                        )
-                    elif action == "audit":
-                        conn.execute(
-                            "INSERT OR REPLACE INTO audits(action_id,findings) VALUES(?,?)",
-                            (action_id, text),
-                        )
-                    elif action == "test":
-                        conn.execute(
-                            "INSERT OR REPLACE INTO tests(action_id,strategy) VALUES(?,?)",
-                            (action_id, text),
-                        )
-                    elif action == "docs":
-                        conn.execute(
-                            "INSERT OR REPLACE INTO docs(action_id,documentation) VALUES(?,?)",
-                            (action_id, text),
-                        )
-                    elif action == "refactor":
-                        conn.execute(
-                            "INSERT OR REPLACE INTO refactors(action_id,suggestions) VALUES(?,?)",
-                            (action_id, text),
-                        )
-                    else:
-                        status = "error"
-                        err = "Unsupported action type: {0}".format(action)
-                        conn.execute("UPDATE actions SET status=?, error=? WHERE id=?", (status, err, action_id))
-                else:
-                    logging.warning(f"Action failed for {path}: {err}")
-
-                conn.commit()
-                # Mark queued entry as done if present
-                try:
-                    conn.execute("UPDATE queued_files SET status='done' WHERE path=? AND status='pending'", (path,))
-                    conn.commit()
-                except Exception:
-                    pass
-                processed += 1
-
-            except Exception as e:
-                logging.exception(f"Unhandled error processing {path}: {e}")
-                continue
+        # Keep up to `concurrency` llm_chat calls in flight on worker threads.
+        # Reads, prompt building and every DB write stay on this thread, so the
+        # SQLite connection has a single writer. concurrency=1 is the old serial walk.
+        try:
+            concurrency = max(1, int(cfg.get("llm_concurrency") or 1))
+        except Exception:
+            concurrency = 1
+        if concurrency > 1:
+            logging.info(f"LLM concurrency: {concurrency}")
+        global _llm_slots
+        _llm_slots = threading.BoundedSemaphore(concurrency)
+
+        remaining = iter(candidates)
+        exhausted = False
+        in_flight: dict = {}
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="cw-llm") as pool:
+            while True:
+                while not exhausted and len(in_flight) < concurrency and processed + len(in_flight) < limit:
+                    path = next(remaining, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    try:
+                        task = prepare_task(conn, cfg, path, batch)
+                    except Exception as e:
+                        logging.exception(f"Unhandled error processing {path}: {e}")
+                        continue
+                    if task is None:
+                        continue
+                    if task["cached"] is not None:
+                        # Cache hits cost no LLM call, so they don't count toward the limit.
+                        batch.add(task, {
+                            "text": task["cached"], "backend": "cache", "tokens_in": None,
+                            "tokens_out": None, "status": "ok", "error": None,
+                        })
+                        reused += 1
+                        logging.info(f"[cache] {path} ({task['action']})")
+                        continue
+                    in_flight[pool.submit(call_llm, cfg, task)] = task
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    task = in_flight.pop(fut)
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        logging.exception(f"Unhandled error processing {task['path']}: {e}")
+                        continue
+                    processed += 1
+                    batch.add(task, res)
 
-        logging.info(f"Processed {processed} files (limit {limit})")
+        batch.flush()
+        logging.info(f"Processed {processed} files (limit {limit}), reused {reused} cached results, {batch.commits} commits")
 
     finally:
+        try:
+            batch.flush()  # keep results already in hand if the walk was interrupted
+        except Exception as e:
+            logging.exception(f"Could not store buffered results: {e}")
         cur.execute("UPDATE runs SET finished_at=? WHERE id=?", (human_ts(), run_id))
         conn.commit()
         conn.close()
@@ -1121,6 +1970,7 @@ def main():
     parser.add_argument("--limit", type=int, default=None, help="Override per‑run file limit")
     parser.add_argument("--percent-rewrite", type=int, default=None, help="Override rewrite percentage (0‑100)")
     parser.add_argument("--once", action="store_true", help="Run one pass immediately (default)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Override llm_concurrency (parallel LLM requests)")
     args = parser.parse_args()
 
     load_env()
@@ -1132,6 +1982,8 @@ def main():
         limit = args.limit # useless
     if args.percent_rewrite is not None:
         cfg["percent_rewrite"] = max(0, min(100, args.percent_rewrite))
+    if args.concurrency is not None:
+        cfg["llm_concurrency"] = max(1, args.concurrency)
 
     setup_logging(cfg["log_path"])
     logging.info(f"Starting {APP_NAME} v{VERSION} | backend={cfg.get('backend')} model={cfg.get('model')}")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# /web/html/src/scripts/codewalker_bench.py
+"""
+CodeWalker throughput benchmark (no real model needed).
+
+Builds a synthetic tree of unique php/py/sh files and starts a local stub
+OpenAI-compatible server (/v1/chat/completions, SSE streaming) with a fixed
+per-request latency. It then runs codewalker.run_once at each concurrency
+level against a fresh results DB and reports files/sec plus per-phase time:
+
+  walk     gather_candidates (scan index refresh + selection)
+  read     read/hash of candidate files
+  dedupe   is_file_already_processed + result cache lookups
+  llm      main thread blocked waiting for LLM results
+  db       files row upserts, store_result and batch commits
+
+Phase times are wall-clock on the main thread (llm_busy is the summed
+request time across worker threads). --profile writes cProfile stats for the
+main thread only, i.e. everything except the LLM requests themselves.
+
+Usage:
+  python3 codewalker_bench.py [--files 200] [--latency-ms 200] [--concurrency 1,4,8]
+                              [--file-kb 4] [--profile /tmp/cw.prof]
+"""
+import argparse, cProfile, json, logging, os, pstats, random, shutil, socket, sqlite3, sys, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import codewalker as cw
+
+
+# ---------------------- Stub backend ----------------------
+
+def start_stub_server(latency_s: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # headers and body go out in separate writes; without this Nagle + delayed ACK adds ~40ms per request
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            system = (body.get("messages") or [{}])[0].get("content", "")
+            if "JSON" in system:
+                reply = json.dumps({"file_purpose": "benchmark", "key_functions": [], "risks": []})
+            else:
+                reply = "```\n# rewritten by stub\nprint('ok')\n```"
+            time.sleep(latency_s)
+
+            if not body.get("stream"):
+                out = json.dumps({"choices": [{"message": {"content": reply}}],
+                                  "usage": {"prompt_tokens": 100, "completion_tokens": 20}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+                return
+
+            events = [{"choices": [{"delta": {"content": reply[i:i + 16]}}]} for i in range(0, len(reply), 16)]
+            events.append({"choices": [], "usage": {"prompt_tokens": 100, "completion_tokens": 20}})
+            payload = b"".join(b"data: " + json.dumps(e).encode() + b"\n\n" for e in events) + b"data: [DONE]\n\n"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except OSError:
+                pass  # client stopped early
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+# ---------------------- Synthetic tree ----------------------
+
+def build_tree(root: str, files: int, file_kb: int) -> None:
+    rnd = random.Random(11)
+    exts = ["py", "php", "sh"]
+    for i in range(files):
+        d = os.path.join(root, f"pkg{i % 20:02d}", f"mod{i % 7}")
+        os.makedirs(d, exist_ok=True)
+        ext = exts[i % 3]
+        lines = [f"# file {i}"]
+        while sum(len(s) + 1 for s in lines) < file_kb * 1024:
+            lines.append(f"value_{rnd.randint(0, 10 ** 9)} = {rnd.random()!r}")
+        with open(os.path.join(d, f"f{i:05d}.{ext}"), "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+
+
+# ---------------------- Phase timers ----------------------
+
+class Phases:
+    """Wall time per phase. Re-entrant per thread: a wrapped call made inside
+    another call of the same phase (read_file_for_model -> read_file_window,
+    WriteBatch.flush -> store_result) is not counted twice."""
+
+    def __init__(self):
+        self.t = {}
+        self.lock = threading.Lock()
+        self._active = threading.local()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.t[name] = self.t.get(name, 0.0) + seconds
+
+    def wrap(self, name: str, fn):
+        def timed(*a, **kw):
+            active = self._active.__dict__.setdefault("phases", set())
+            if name in active:
+                return fn(*a, **kw)
+            active.add(name)
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                active.discard(name)
+                self.add(name, time.perf_counter() - t0)
+        return timed
+
+
+def instrument(phases: Phases) -> None:
+    cw.gather_candidates = phases.wrap("walk", cw.gather_candidates)
+    cw.read_file_for_model = phases.wrap("read", cw.read_file_for_model)
+    cw.read_file_window = phases.wrap("read", cw.read_file_window)
+    cw.is_file_already_processed = phases.wrap("dedupe", cw.is_file_already_processed)
+    cw.cache_lookup = phases.wrap("dedupe", cw.cache_lookup)
+    cw.wait = phases.wrap("llm", cw.wait)
+    cw.call_llm = phases.wrap("llm_busy", cw.call_llm)
+    cw.db_get_or_create_file = phases.wrap("db", cw.db_get_or_create_file)
+    cw.store_result = phases.wrap("db", cw.store_result)
+    cw.WriteBatch.flush = phases.wrap("db", cw.WriteBatch.flush)
+
+
+# ---------------------- Runs ----------------------
+
+def bench_level(tmp: str, tree: str, port: int, concurrency: int, files: int, stream: bool, profile: str) -> None:
+    db_path = os.path.join(tmp, f"codewalker_c{concurrency}.db")
+    cfg = cw.load_config()
+    cfg.update(
+        mode="cron", scan_path=tree, db_path=db_path, log_path=os.path.join(tmp, "codewalker.log"),
+        lockfile=os.path.join(tmp, "codewalker.lock"), backend="openai_compat", base_url=f"http://127.0.0.1:{port}",
+        api_key=None, model="stub", use_active_ai=False, limit_per_run=files, llm_concurrency=concurrency,
+        llm_stream=stream, file_types=["py", "php", "sh"], exclude_dirs=[], chunk_large_files=False,
+    )
+
+    phases = Phases()
+    instrument(phases)
+    prof = cProfile.Profile() if profile else None
+    t0 = time.perf_counter()
+    if prof:
+        prof.enable()
+    cw.run_once(cfg)
+    if prof:
+        prof.disable()
+    wall = time.perf_counter() - t0
+
+    con = sqlite3.connect(db_path)
+    done = con.execute("SELECT COUNT(*) FROM actions WHERE status='ok'").fetchone()[0]
+    con.close()
+
+    p = phases.t
+    print(f"[cw_bench] c={concurrency:<3} files={done:<5} wall={wall:7.2f}s  {done / wall:7.2f} files/s  "
+          f"walk={p.get('walk', 0):.3f}s read={p.get('read', 0):.3f}s dedupe={p.get('dedupe', 0):.3f}s "
+          f"llm={p.get('llm', 0):.2f}s db={p.get('db', 0):.3f}s llm_busy={p.get('llm_busy', 0):.2f}s")
+
+    if prof:
+        out = f"{profile}.c{concurrency}"
+        prof.dump_stats(out)
+        print(f"[cw_bench] cProfile (main thread) -> {out}")
+        pstats.Stats(prof).sort_stats("tottime").print_stats(12)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark CodeWalker run_once against a stub LLM backend")
+    ap.add_argument("--files", type=int, default=200, help="Synthetic files (all processed per level)")
+    ap.add_argument("--file-kb", type=int, default=4, help="Approximate size per file")
+    ap.add_argument("--latency-ms", type=int, default=200, help="Stub backend latency per request")
+    ap.add_argument("--concurrency", default="1,4,8", help="Comma list of llm_concurrency levels")
+    ap.add_argument("--no-stream", action="store_true", help="Benchmark with llm_stream off")
+    ap.add_argument("--profile", default="", help="Write cProfile stats to PATH.c<level> and print the top entries")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    tmp = tempfile.mkdtemp(prefix="cw_bench_")
+    cw.DB_SETTINGS = os.path.join(tmp, "codewalker_settings.db")
+    tree = os.path.join(tmp, "tree")
+    build_tree(tree, args.files, args.file_kb)
+    srv = start_stub_server(args.latency_ms / 1000.0)
+    print(f"[cw_bench] tmp={tmp} files={args.files} file_kb={args.file_kb} latency={args.latency_ms}ms")
+
+    # keep the unwrapped functions so each level starts from clean wrappers
+    originals = {name: getattr(cw, name) for name in (
+        "gather_candidates", "read_file_for_model", "read_file_window", "is_file_already_processed",
+        "cache_lookup", "wait", "call_llm", "db_get_or_create_file", "store_result")}
+    flush = cw.WriteBatch.flush
+    try:
+        for level in [int(x) for x in args.concurrency.split(",") if x.strip()]:
+            for name, fn in originals.items():
+                setattr(cw, name, fn)
+            cw.WriteBatch.flush = flush
+            bench_level(tmp, tree, srv.server_port, max(1, level), args.files, not args.no_stream, args.profile)
+    finally:
+        srv.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,15 +5,64 @@ from mq import MotherQueue
 
 DB = os.environ.get("MOTHER_QUEUE_DB", "/web/private/db/memory/mother_queue.db")
 
+def read_jsonl(stream, defaults):
+    """
+    One job per line: {"name": ..., "payload": {...}, "queue": ..., "priority": ...,
+    "max_attempts": ..., "dedupe_key": ...}. Missing keys fall back to the CLI flags.
+    """
+    jobs = []
+    for lineno, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {lineno}: invalid JSON: {e}")
+        if not isinstance(item, dict):
+            raise ValueError(f"line {lineno}: expected a JSON object")
+        job = dict(defaults)
+        job.update(item)
+        if not job.get("name"):
+            raise ValueError(f"line {lineno}: missing job name")
+        jobs.append(job)
+    return jobs
+
 def main():
     parser = argparse.ArgumentParser(description='Enqueue a job to mother_queue')
     parser.add_argument('--queue', default='default', help='Queue name')
-    parser.add_argument('--name', required=True, help='Job name')
+    parser.add_argument('--name', help='Job name (required unless --jsonl)')
     parser.add_argument('--payload', default='{}', help='Job payload as JSON string')
     parser.add_argument('--priority', type=int, default=100, help='Job priority')
     parser.add_argument('--max-attempts', type=int, default=5, help='Max retry attempts')
+    parser.add_argument('--dedupe-key', default=None,
+                        help='Collapse into an unfinished job with the same key on this queue')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='Read many jobs as JSON lines from stdin and insert them in one transaction')
     
     args = parser.parse_args()
+
+    if args.jsonl:
+        defaults = {
+            "queue": args.queue,
+            "priority": args.priority,
+            "max_attempts": args.max_attempts,
+        }
+        if args.name:
+            defaults["name"] = args.name
+        try:
+            jobs = read_jsonl(sys.stdin, defaults)
+        except ValueError as e:
+            print(f"Invalid JSONL input: {e}", file=sys.stderr)
+            sys.exit(1)
+
+        with MotherQueue(DB) as mq:
+            res = mq.enqueue_many(jobs)
+        print(f"Jobs enqueued: {res['inserted']} (deduped: {res['deduped']})")
+        return 0
+
+    if not args.name:
+        parser.error('--name is required (or use --jsonl)')
     
     try:
         payload = json.loads(args.payload)
@@ -21,14 +70,15 @@ def main():
         print(f"Invalid JSON payload: {e}", file=sys.stderr)
         sys.exit(1)
     
-    mq = MotherQueue(DB)
-    job_id = mq.enqueue(
-        queue=args.queue,
-        name=args.name,
-        payload=payload,
-        priority=args.priority,
-        max_attempts=args.max_attempts
-    )
+    with MotherQueue(DB) as mq:
+        job_id = mq.enqueue(
+            queue=args.queue,
+            name=args.name,
+            payload=payload,
+            priority=args.priority,
+            max_attempts=args.max_attempts,
+            dedupe_key=args.dedupe_key
+        )
     print(f"Job enqueued: {job_id}")
     return 0
 
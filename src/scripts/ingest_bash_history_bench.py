@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# /web/html/src/scripts/ingest_bash_history_bench.py
+"""
+Bash history ingest benchmark.
+
+Builds a synthetic .bash_history (default 1M lines, Zipf-like repetition over
+a few thousand distinct commands, some blank/comment lines) and times getting
+it into a fresh bash_history.db with:
+  - per-line   the old upsert_command + queue_enrich path (4-5 statements and
+               several now() calls per line)
+  - batched    ingest_bash_history_to_kb.CommandBatch (aggregate in memory,
+               temp-table merge + executemany)
+
+Both read the file with iter_new_lines and parse with base_command, so only
+the write path differs. The resulting commands/base_commands/command_ai/
+enrich_queue contents are compared (timestamps excluded).
+
+Usage:
+  python3 ingest_bash_history_bench.py [--lines 1000000] [--distinct 5000] [--dir /tmp/x] [--skip-per-line]
+"""
+import argparse, datetime, os, random, shutil, sqlite3, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ingest_bash_history_to_kb as ing
+
+
+def build_history(path: str, lines: int, distinct: int) -> None:
+    rnd = random.Random(5)
+    verbs = ["git status", "git log -n", "ls -la", "cd /var/www/site", "sudo systemctl restart", "docker ps -a",
+             "FOO=1 make -j", "tail -f /var/log/syslog", "grep -rn TODO", "python3 manage.py", "vim ~/.bashrc",
+             "sudo apt install", "kubectl get pods -n", "ssh host", "echo hi && ls", "cat /etc/hosts | grep"]
+    cmds = [f"{rnd.choice(verbs)} {i}" for i in range(distinct)]
+    weights = [1.0 / (i + 1) for i in range(distinct)]
+    picks = rnd.choices(cmds, weights=weights, k=lines)
+    with open(path, "w") as f:
+        for i, c in enumerate(picks):
+            if i % 97 == 0:
+                f.write("\n")
+            elif i % 89 == 0:
+                f.write(f"#{1700000000 + i}\n")
+            else:
+                f.write(c + "\n")
+
+
+def _now() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def per_line_upsert(kb: sqlite3.Connection, full_cmd: str, base_cmd: str) -> bool:
+    """The pre-batch write path: one upsert chain per history line."""
+    kb.execute(
+        """
+        INSERT INTO commands(full_cmd, base_cmd, first_seen, last_seen, seen_count)
+        VALUES(?,?,?,?,1)
+        ON CONFLICT(full_cmd) DO UPDATE SET
+          last_seen=excluded.last_seen,
+          seen_count=commands.seen_count+1
+        """,
+        (full_cmd, base_cmd, _now(), _now()),
+    )
+    row = kb.execute("SELECT id FROM commands WHERE full_cmd=? LIMIT 1", (full_cmd,)).fetchone()
+    if row:
+        kb.execute(
+            "INSERT OR IGNORE INTO command_ai(cmd_id, status, updated_at) VALUES(?, 'pending', datetime('now'))",
+            (int(row[0]),),
+        )
+    kb.execute(
+        """
+        INSERT INTO base_commands(base_cmd, first_seen, last_seen, seen_count)
+        VALUES(?,?,?,1)
+        ON CONFLICT(base_cmd) DO UPDATE SET
+          last_seen=excluded.last_seen,
+          seen_count=base_commands.seen_count+1
+        """,
+        (base_cmd, _now(), _now()),
+    )
+    cur = kb.execute(
+        """
+        INSERT INTO enrich_queue(kind, ref, status, priority, attempts, created_at, updated_at)
+        VALUES('base', ?, 'pending', 50, 0, datetime('now'), datetime('now'))
+        ON CONFLICT(kind, ref) DO NOTHING
+        """,
+        (base_cmd,),
+    )
+    return cur.rowcount == 1
+
+
+def ingest(hist: str, db_path: str, batched: bool) -> dict:
+    kb = sqlite3.connect(db_path)
+    ing.ensure_kb_schema(kb)
+    parsed = queued = 0
+    batch = ing.CommandBatch(kb, ing.now()) if batched else None
+    t0 = time.perf_counter()
+    with open(hist, "rb") as f:
+        for full, _ in ing.iter_new_lines(f, 0):
+            if not full.strip() or full.strip().startswith("#"):
+                continue
+            b = ing.base_command(full)
+            if not b:
+                continue
+            parsed += 1
+            if batch is not None:
+                batch.add(full, b)
+            elif per_line_upsert(kb, full, b):
+                queued += 1
+    if batch is not None:
+        batch.flush()
+        queued = batch.queued_enrich
+    kb.commit()
+    elapsed = time.perf_counter() - t0
+    kb.close()
+    return {"seconds": elapsed, "parsed": parsed, "queued": queued}
+
+
+def snapshot(db_path: str) -> tuple:
+    con = sqlite3.connect(db_path)
+    try:
+        return (
+            con.execute("SELECT full_cmd, base_cmd, seen_count FROM commands ORDER BY full_cmd").fetchall(),
+            con.execute("SELECT base_cmd, seen_count FROM base_commands ORDER BY base_cmd").fetchall(),
+            con.execute("SELECT c.full_cmd, a.status FROM command_ai a JOIN commands c ON c.id=a.cmd_id ORDER BY 1").fetchall(),
+            con.execute("SELECT kind, ref, status, priority FROM enrich_queue ORDER BY kind, ref").fetchall(),
+        )
+    finally:
+        con.close()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark per-line vs batched bash history ingest")
+    ap.add_argument("--lines", type=int, default=1_000_000, help="History lines to generate")
+    ap.add_argument("--distinct", type=int, default=5000, help="Distinct commands in the synthetic history")
+    ap.add_argument("--dir", default="", help="Work directory (default: a temp dir, removed afterwards)")
+    ap.add_argument("--skip-per-line", action="store_true", help="Only time the batched path")
+    args = ap.parse_args()
+
+    tmp = args.dir or tempfile.mkdtemp(prefix="ingest_bench_")
+    os.makedirs(tmp, exist_ok=True)
+    hist = os.path.join(tmp, "bash_history")
+    try:
+        t0 = time.perf_counter()
+        build_history(hist, args.lines, args.distinct)
+        print(f"[ingest_bench] built {args.lines} lines ({os.path.getsize(hist) / 1048576:.1f} MiB) "
+              f"in {time.perf_counter() - t0:.1f}s")
+
+        runs = [("batched", True)] + ([] if args.skip_per_line else [("per-line", False)])
+        snaps = {}
+        for label, batched in runs:
+            db_path = os.path.join(tmp, f"kb_{label}.db")
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                try:
+                    os.unlink(db_path + suffix)
+                except OSError:
+                    pass
+            r = ingest(hist, db_path, batched)
+            snaps[label] = snapshot(db_path)
+            print(f"[ingest_bench] {label:<9} {r['seconds']:8.2f}s  {r['parsed'] / r['seconds']:10.0f} lines/s  "
+                  f"parsed={r['parsed']} distinct={len(snaps[label][0])} queued_enrich={r['queued']}")
+
+        if len(snaps) == 2:
+            same = snaps["batched"] == snaps["per-line"]
+            print(f"[ingest_bench] tables identical (excluding timestamps): {same}")
+            return 0 if same else 1
+    finally:
+        if not args.dir:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
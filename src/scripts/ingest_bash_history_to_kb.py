@@ -5,8 +5,10 @@
 
 Core behavior:
 - Reads ~/.bash_history for a target username
-- Tracks inode + last line read in Notes DB table history_state
-- Upserts commands into bash_history.db and queues enrich_queue items
+- Tracks inode + byte offset (plus a checksum of the last consumed bytes) in Notes DB table history_state,
+  so each run seeks straight to the new lines instead of re-reading the whole file
+- Aggregates new lines in memory (counts per full_cmd / base_cmd) and applies them to bash_history.db
+  with a few set-based statements per batch, then queues enrich_queue items
 - Writes a cron heartbeat row into Notes DB table job_runs (running/ok/error + duration)
 
 Cron example:
@@ -20,15 +22,17 @@ http://<host>/admin/notes/?view=jobs
 import argparse
 import datetime
 import fcntl
+import hashlib
 import logging
 import os
-import re
 import socket
 import sqlite3
 import sys
 import time
 from logging.handlers import RotatingFileHandler
-from typing import Tuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from bash_tokens import base_command
 
 
 def _import_domain_memory_bootstrap():
@@ -68,7 +72,12 @@ STATE_DB = os.path.join(PRIVATE_ROOT, "db/memory/human_notes.db")
 TOPIC_STATE_HOST = socket.gethostname()
 LOG_PATH = os.path.join(PRIVATE_ROOT, "logs/ingest_bash_history_to_kb.log")
 
-_LOCK_FDS = []
+# Bytes before the saved offset that must still hash the same for a resume (catches in-place rewrites,
+# e.g. bash trimming the file to HISTFILESIZE).
+STATE_CHECK_BYTES = 4096
+READ_BLOCK = 1024 * 1024
+# Distinct commands held in memory before CommandBatch applies them (bounds memory on huge backfills).
+BATCH_UNIQUE = 50000
 
 
 def setup_logging() -> logging.Logger:
@@ -118,7 +127,8 @@ def now() -> str:
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def lock_or_exit(path: str, logger: logging.LoggerAdapter) -> bool:
+def lock_or_exit(path: str, logger: logging.LoggerAdapter) -> Optional[int]:
+    """Take the per-user flock; returns its fd, or None when another run holds it."""
     try:
         parent = os.path.dirname(path)
         if parent:
@@ -135,10 +145,20 @@ def lock_or_exit(path: str, logger: logging.LoggerAdapter) -> bool:
             os.close(fd)
         except Exception:
             pass
-        return False
+        return None
+    return fd
+
 
-    _LOCK_FDS.append(fd)
-    return True
+def release_lock(fd: Optional[int]) -> None:
+    # main() may run repeatedly (and concurrently) in one MotherQueue worker, so each
+    # call drops only the flock it took.
+    if fd is None:
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+    except Exception:
+        pass
 
 
 def ensure_kb_schema(db: sqlite3.Connection) -> None:
@@ -202,6 +222,8 @@ def ensure_state_schema(db: sqlite3.Connection) -> None:
           path TEXT NOT NULL,
           inode TEXT,
           last_line INTEGER DEFAULT 0,
+          byte_offset INTEGER DEFAULT 0,
+          tail_sha1 TEXT,
           updated_at TEXT,
           PRIMARY KEY (host, path)
         );
@@ -216,6 +238,15 @@ def ensure_state_schema(db: sqlite3.Connection) -> None:
         );
         """
     )
+
+    # Migrate older DBs (line-based state)
+    existing = {str(r[1]).lower() for r in db.execute("PRAGMA table_info(history_state);").fetchall()}
+    for name, typ in (("byte_offset", "INTEGER DEFAULT 0"), ("tail_sha1", "TEXT")):
+        if name not in existing:
+            try:
+                db.execute(f"ALTER TABLE history_state ADD COLUMN {name} {typ}")
+            except Exception:
+                pass
     db.commit()
 
 
@@ -265,108 +296,175 @@ def _job_upsert_finish(db: sqlite3.Connection, job: str, status: str, duration_m
     db.commit()
 
 
-def inode_of(path: str) -> str:
-    try:
-        return str(os.stat(path).st_ino)
-    except Exception:
-        return ""
-
-
-def load_state(db: sqlite3.Connection, host: str, path: str) -> Tuple[str, int]:
+def load_state(db: sqlite3.Connection, host: str, path: str) -> Tuple[str, int, int, str]:
     row = db.execute(
-        "SELECT COALESCE(inode,''), COALESCE(last_line,0) FROM history_state WHERE host=? AND path=? LIMIT 1",
+        """
+        SELECT COALESCE(inode,''), COALESCE(last_line,0), COALESCE(byte_offset,0), COALESCE(tail_sha1,'')
+        FROM history_state WHERE host=? AND path=? LIMIT 1
+        """,
         (host, path),
     ).fetchone()
-    return (row[0], int(row[1])) if row else ("", 0)
+    return (row[0], int(row[1]), int(row[2]), row[3]) if row else ("", 0, 0, "")
 
 
-def save_state(db: sqlite3.Connection, host: str, path: str, inode: str, last_line: int) -> None:
+def save_state(
+    db: sqlite3.Connection, host: str, path: str, inode: str, last_line: int, byte_offset: int, tail_sha1: str
+) -> None:
     db.execute(
         """
-        INSERT INTO history_state(host, path, inode, last_line, updated_at)
-        VALUES(?,?,?,?,?)
+        INSERT INTO history_state(host, path, inode, last_line, byte_offset, tail_sha1, updated_at)
+        VALUES(?,?,?,?,?,?,?)
         ON CONFLICT(host, path) DO UPDATE SET
           inode=excluded.inode,
           last_line=excluded.last_line,
+          byte_offset=excluded.byte_offset,
+          tail_sha1=excluded.tail_sha1,
           updated_at=excluded.updated_at
         """,
-        (host, path, inode, int(last_line), now()),
+        (host, path, inode, int(last_line), int(byte_offset), tail_sha1 or "", now()),
     )
     db.commit()
 
 
-_env_assign_re = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=.*$")
-
-
-def base_command(full_cmd: str) -> str:
-    s = full_cmd.strip()
-    if not s or s.startswith("#"):
-        return ""
-
-    seg = re.split(r"\s*(?:&&|;)\s*", s, maxsplit=1)[0].strip()
-    if not seg:
-        return ""
-
-    toks = seg.split()
-    if not toks:
-        return ""
-
-    i = 0
-    while i < len(toks) and _env_assign_re.match(toks[i]):
-        i += 1
-    if i >= len(toks):
-        return ""
-
-    if toks[i] == "sudo" and i + 1 < len(toks):
-        i += 1
-
-    return toks[i]
-
-
-def upsert_command(kb: sqlite3.Connection, full_cmd: str, base_cmd: str) -> int:
-    kb.execute(
-        """
-        INSERT INTO commands(full_cmd, base_cmd, first_seen, last_seen, seen_count)
-        VALUES(?,?,?,?,1)
-        ON CONFLICT(full_cmd) DO UPDATE SET
-          last_seen=excluded.last_seen,
-          seen_count=commands.seen_count+1
-        """,
-        (full_cmd, base_cmd, now(), now()),
-    )
-
-    row = kb.execute("SELECT id FROM commands WHERE full_cmd=? LIMIT 1", (full_cmd,)).fetchone()
-    cmd_id = int(row[0]) if row else 0
-    if cmd_id:
+def tail_checksum(f: BinaryIO, offset: int) -> str:
+    """sha1 of the (up to) STATE_CHECK_BYTES bytes that end at offset."""
+    start = max(0, offset - STATE_CHECK_BYTES)
+    f.seek(start)
+    return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def offset_after_lines(f: BinaryIO, n: int) -> int:
+    """Byte offset just past the n-th newline, or -1 if the file has fewer lines (used once for old last_line state)."""
+    f.seek(0)
+    pos = 0
+    while n > 0:
+        blk = f.read(READ_BLOCK)
+        if not blk:
+            return -1
+        cnt = blk.count(b"\n")
+        if cnt < n:
+            n -= cnt
+            pos += len(blk)
+            continue
+        idx = -1
+        for _ in range(n):
+            idx = blk.index(b"\n", idx + 1)
+        return pos + idx + 1
+    return pos
+
+
+def resume_offset(
+    f: BinaryIO, size: int, inode: str, old_inode: str, last_line: int, byte_offset: int, tail_sha1: str
+) -> Tuple[int, str]:
+    """Where to continue reading, and why. Offset 0 with a non-"resume" reason means start over."""
+    if not old_inode:
+        return 0, "no_state"
+    if old_inode != inode:
+        return 0, "inode_changed"
+    if byte_offset <= 0 and last_line > 0:
+        off = offset_after_lines(f, last_line)
+        return (off, "legacy_line_state") if off >= 0 else (0, "truncated")
+    if byte_offset > size:
+        return 0, "truncated"
+    if tail_sha1 and tail_checksum(f, byte_offset) != tail_sha1:
+        return 0, "rewritten"
+    return byte_offset, "resume"
+
+
+def iter_new_lines(f: BinaryIO, offset: int) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (line, end_offset) for each complete line after offset. A trailing
+    line without its newline (history still being written) is left for the
+    next run.
+    """
+    f.seek(offset)
+    for raw in f:
+        if not raw.endswith(b"\n"):
+            break
+        offset += len(raw)
+        yield raw.decode("utf-8", errors="ignore").rstrip("\r\n"), offset
+
+
+class CommandBatch:
+    """
+    Counts new history lines per full_cmd and per base_cmd, then applies them
+    in one pass: the distinct commands go into a temp table that is merged into
+    commands/command_ai, and base_commands/enrich_queue get one executemany
+    each. seen_count grows by the number of occurrences, and first_seen/last_seen
+    use the run timestamp, as the old per-line upserts did.
+    """
+
+    def __init__(self, kb: sqlite3.Connection, seen_at: str, max_unique: int = BATCH_UNIQUE):
+        self.kb = kb
+        self.seen_at = seen_at
+        self.max_unique = max(1, int(max_unique))
+        self.cmds: Dict[str, List] = {}
+        self.bases: Dict[str, int] = {}
+        self.queued_enrich = 0
+
+    def add(self, full_cmd: str, base_cmd: str) -> None:
+        e = self.cmds.get(full_cmd)
+        if e is None:
+            self.cmds[full_cmd] = [base_cmd, 1]
+        else:
+            e[1] += 1
+        self.bases[base_cmd] = self.bases.get(base_cmd, 0) + 1
+        if len(self.cmds) >= self.max_unique:
+            self.flush()
+
+    def flush(self) -> None:
+        """Apply pending counts (no commit; the caller owns the transaction)."""
+        if not self.cmds:
+            return
+        kb = self.kb
+        ts = self.seen_at
         kb.execute(
-            "INSERT OR IGNORE INTO command_ai(cmd_id, status, updated_at) VALUES(?, 'pending', datetime('now'))",
-            (cmd_id,),
+            "CREATE TEMP TABLE IF NOT EXISTS ingest_batch(full_cmd TEXT PRIMARY KEY, base_cmd TEXT NOT NULL, n INTEGER NOT NULL)"
         )
-
-    kb.execute(
-        """
-        INSERT INTO base_commands(base_cmd, first_seen, last_seen, seen_count)
-        VALUES(?,?,?,1)
-        ON CONFLICT(base_cmd) DO UPDATE SET
-          last_seen=excluded.last_seen,
-          seen_count=base_commands.seen_count+1
-        """,
-        (base_cmd, now(), now()),
-    )
-
-    return cmd_id
-
-
-def queue_enrich(kb: sqlite3.Connection, kind: str, ref: str, priority: int = 100) -> bool:
-    cur = kb.execute(
-        """
-        INSERT INTO enrich_queue(kind, ref, status, priority, attempts, created_at, updated_at)
-        VALUES(?,?, 'pending', ?, 0, datetime('now'), datetime('now'))
-        ON CONFLICT(kind, ref) DO NOTHING
-        """,
-        (kind, ref, int(priority)),
-    )
-    return cur.rowcount == 1
+        kb.execute("DELETE FROM temp.ingest_batch")
+        kb.executemany(
+            "INSERT INTO temp.ingest_batch(full_cmd, base_cmd, n) VALUES(?,?,?)",
+            ((full, base, n) for full, (base, n) in self.cmds.items()),
+        )
+        # WHERE true: required by SQLite to parse an upsert whose source is a SELECT
+        kb.execute(
+            """
+            INSERT INTO commands(full_cmd, base_cmd, first_seen, last_seen, seen_count)
+            SELECT full_cmd, base_cmd, ?, ?, n FROM temp.ingest_batch WHERE true
+            ON CONFLICT(full_cmd) DO UPDATE SET
+              last_seen=excluded.last_seen,
+              seen_count=commands.seen_count+excluded.seen_count
+            """,
+            (ts, ts),
+        )
+        kb.execute(
+            """
+            INSERT OR IGNORE INTO command_ai(cmd_id, status, updated_at)
+            SELECT c.id, 'pending', datetime('now')
+            FROM temp.ingest_batch b JOIN commands c ON c.full_cmd = b.full_cmd
+            """
+        )
+        kb.executemany(
+            """
+            INSERT INTO base_commands(base_cmd, first_seen, last_seen, seen_count)
+            VALUES(?,?,?,?)
+            ON CONFLICT(base_cmd) DO UPDATE SET
+              last_seen=excluded.last_seen,
+              seen_count=base_commands.seen_count+excluded.seen_count
+            """,
+            ((base, ts, ts, n) for base, n in self.bases.items()),
+        )
+        cur = kb.executemany(
+            """
+            INSERT INTO enrich_queue(kind, ref, status, priority, attempts, created_at, updated_at)
+            VALUES('base', ?, 'pending', 50, 0, datetime('now'), datetime('now'))
+            ON CONFLICT(kind, ref) DO NOTHING
+            """,
+            ((base,) for base in self.bases),
+        )
+        self.queued_enrich += max(0, cur.rowcount)
+        self.cmds = {}
+        self.bases = {}
 
 
 def parse_args(argv) -> argparse.Namespace:
@@ -383,8 +481,8 @@ def parse_args(argv) -> argparse.Namespace:
     return parser.parse_args(argv)
 
 
-def main() -> int:
-    args = parse_args(sys.argv[1:])
+def main(argv=None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
     if getattr(args, "all", False):
         args.import_mode = "all"
 
@@ -399,13 +497,15 @@ def main() -> int:
 
     state_db = None
     kb = None
+    lock_fd = None
     try:
         state_db = sqlite3.connect(STATE_DB)
         ensure_state_schema(state_db)
         _job_upsert_start(state_db, job_name, f"host={TOPIC_STATE_HOST} import_mode={args.import_mode}")
 
         lock_path = os.path.join(PRIVATE_ROOT, "locks", f"ingest_bash_kb_{user}.lock")
-        if not lock_or_exit(lock_path, logger):
+        lock_fd = lock_or_exit(lock_path, logger)
+        if lock_fd is None:
             _job_upsert_finish(state_db, job_name, "ok", int((time.time() - t0) * 1000), "lock_busy")
             return 0
 
@@ -416,67 +516,68 @@ def main() -> int:
             _job_upsert_finish(state_db, job_name, "ok", int((time.time() - t0) * 1000), msg)
             return 0
 
-        with open(hist, "r", errors="ignore") as f:
-            lines = f.read().splitlines()
-
-        inode = inode_of(hist)
-        line_count = len(lines)
-        old_inode, last_line = load_state(state_db, TOPIC_STATE_HOST, hist)
-
-        if args.import_mode == "all":
-            start_line = 1
-        else:
-            start_line = last_line + 1 if (old_inode and old_inode == inode and line_count >= last_line) else 1
-
-        logger.info(
-            "state host=%s path=%s inode=%s old_inode=%s last_line=%s start_line=%s total_lines=%s",
-            TOPIC_STATE_HOST,
-            hist,
-            inode,
-            old_inode,
-            int(last_line),
-            int(start_line),
-            int(line_count),
-        )
-
-        # Detect rotation/truncation: start_line beyond EOF means history was rotated or truncated
-        if start_line > line_count:
-            is_inode_changed = old_inode and old_inode != inode
-            msg = "detected_rotation inode_changed=%s old_inode=%s new_inode=%s line_count=%s start_line=%s" % (
-                bool(is_inode_changed), old_inode, inode, line_count, start_line
+        with open(hist, "rb") as f:
+            st = os.fstat(f.fileno())
+            inode = str(st.st_ino)
+            size = int(st.st_size)
+            old_inode, last_line, old_offset, old_sha = load_state(state_db, TOPIC_STATE_HOST, hist)
+
+            if args.import_mode == "all":
+                start, reason = 0, "import_all"
+            else:
+                start, reason = resume_offset(f, size, inode, old_inode, last_line, old_offset, old_sha)
+            line_no = last_line if reason in ("resume", "legacy_line_state") else 0
+
+            logger.info(
+                "state host=%s path=%s inode=%s old_inode=%s last_line=%s byte_offset=%s start_offset=%s size=%s reason=%s",
+                TOPIC_STATE_HOST,
+                hist,
+                inode,
+                old_inode,
+                int(last_line),
+                int(old_offset),
+                int(start),
+                size,
+                reason,
             )
-            logger.info(msg)
-            # Reset to beginning and reprocess (self-healing from rotation/truncation)
-            start_line = 1
-
-        new_lines = lines[start_line - 1 :]
-        new_lines = [s for s in new_lines if s.strip() and not s.strip().startswith("#")]
-        if not new_lines:
-            save_state(state_db, TOPIC_STATE_HOST, hist, inode, line_count)
-            msg = "noop no_new_lines"
-            logger.info(msg)
-            _job_upsert_finish(state_db, job_name, "ok", int((time.time() - t0) * 1000), msg)
-            return 0
-
-        kb = sqlite3.connect(KB_DB)
-        ensure_kb_schema(kb)
-
-        processed_lines = 0
-        parsed_commands = 0
-        queued_enrich = 0
-
-        for full in new_lines:
-            processed_lines += 1
-            b = base_command(full)
-            if not b:
-                continue
-            parsed_commands += 1
-            upsert_command(kb, full, b)
-            if queue_enrich(kb, "base", b, priority=50):
-                queued_enrich += 1
 
-        kb.commit()
-        save_state(state_db, TOPIC_STATE_HOST, hist, inode, line_count)
+            # Rotation/truncation/rewrite: reset to beginning and reprocess (self-healing)
+            if reason in ("inode_changed", "truncated", "rewritten"):
+                logger.info(
+                    "detected_rotation reason=%s old_inode=%s new_inode=%s size=%s byte_offset=%s",
+                    reason, old_inode, inode, size, old_offset,
+                )
+
+            if start >= size:
+                save_state(state_db, TOPIC_STATE_HOST, hist, inode, line_no, start, tail_checksum(f, start))
+                msg = "noop no_new_lines"
+                logger.info(msg)
+                _job_upsert_finish(state_db, job_name, "ok", int((time.time() - t0) * 1000), msg)
+                return 0
+
+            kb = sqlite3.connect(KB_DB)
+            ensure_kb_schema(kb)
+
+            processed_lines = 0
+            parsed_commands = 0
+            end = start
+            batch = CommandBatch(kb, now())
+
+            for full, end in iter_new_lines(f, start):
+                line_no += 1
+                if not full.strip() or full.strip().startswith("#"):
+                    continue
+                processed_lines += 1
+                b = base_command(full)
+                if not b:
+                    continue
+                parsed_commands += 1
+                batch.add(full, b)
+
+            batch.flush()
+            kb.commit()
+            queued_enrich = batch.queued_enrich
+            save_state(state_db, TOPIC_STATE_HOST, hist, inode, line_no, end, tail_checksum(f, end))
 
         msg = f"done processed_lines={int(processed_lines)} parsed_commands={int(parsed_commands)} queued_enrich={int(queued_enrich)}"
         logger.info(
@@ -499,6 +600,7 @@ def main() -> int:
         return 1
 
     finally:
+        release_lock(lock_fd)
         if kb is not None:
             try:
                 kb.close()
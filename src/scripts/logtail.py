@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Exact, memory-bounded tail for large logs.
+
+Shared by codewalker.py (log payloads), save_bash_history_threaded.py and
+molt_shell.py (READ). Reads the file backwards in fixed-size blocks until
+enough newlines have been seen, so the cost is the size of the last N lines
+plus one block, whatever the file size or line length. use_mmap=True scans the
+mapping with rfind instead of read() calls.
+
+This module is intentionally dependency-light (stdlib only).
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+from typing import List
+
+BLOCK_SIZE = 64 * 1024
+
+
+def _start_of_tail(f, size: int, n: int, block_size: int) -> int:
+    """Offset where the last n lines begin (a trailing newline ends the last line)."""
+    f.seek(size - 1)
+    end = size - 1 if f.read(1) == b"\n" else size
+    pos = end
+    while pos > 0:
+        read = min(block_size, pos)
+        pos -= read
+        f.seek(pos)
+        blk = f.read(read)
+        idx = len(blk)
+        while n > 0:
+            idx = blk.rfind(b"\n", 0, idx)
+            if idx < 0:
+                break
+            n -= 1
+            if n == 0:
+                return pos + idx + 1
+    return 0
+
+
+def _start_of_tail_mmap(mm, size: int, n: int) -> int:
+    idx = size - 1 if mm[size - 1:size] == b"\n" else size
+    for _ in range(n):
+        idx = mm.rfind(b"\n", 0, idx)
+        if idx < 0:
+            return 0
+    return idx + 1
+
+
+def tail_bytes(path: str, n: int, block_size: int = BLOCK_SIZE, use_mmap: bool = False) -> bytes:
+    """Return the raw bytes of the last n lines of path."""
+    if n <= 0:
+        return b""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return b""
+        if use_mmap:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[_start_of_tail_mmap(mm, size, n):size]
+        start = _start_of_tail(f, size, n, block_size)
+        f.seek(start)
+        return f.read(size - start)
+
+
+def tail_lines(
+    path: str,
+    n: int,
+    skip_blank: bool = False,
+    encoding: str = "utf-8",
+    errors: str = "ignore",
+    use_mmap: bool = False,
+) -> List[str]:
+    """Return the last n lines of path (without line endings).
+
+    skip_blank=True returns the last n non-blank lines, widening the window
+    only as far as blank lines require.
+    """
+    if n <= 0:
+        return []
+    want = n
+    while True:
+        lines = tail_bytes(path, want, use_mmap=use_mmap).decode(encoding, errors=errors).split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()  # trailing newline
+        lines = [s[:-1] if s.endswith("\r") else s for s in lines]
+        if not skip_blank:
+            return lines[-n:]
+        kept = [s for s in lines if s.strip()]
+        if len(kept) >= n or len(lines) < want:
+            return kept[-n:]
+        want *= 2
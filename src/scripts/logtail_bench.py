@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# /web/html/src/scripts/logtail_bench.py
+"""
+logtail micro-benchmark.
+
+Builds (or reuses) a large synthetic log and times getting its last N lines:
+  - heuristic   the old codewalker.tail_lines (read n*120 bytes from the end)
+  - read-all    the old save_bash_history_threaded._tail_lines (whole file)
+  - tail -n     coreutils via subprocess (the old molt_shell READ)
+  - logtail     reverse block scan
+  - logtail-mm  reverse scan over mmap
+
+Lines are a mix of short entries and occasional long ones (stack traces,
+JSON blobs), which is where the 120-bytes-per-line guess falls short.
+read-all is skipped above --full-read-max-mb.
+
+Usage:
+  python3 logtail_bench.py [--size-gb 5] [--lines 1200] [--path /tmp/logtail_bench.log] [--keep]
+"""
+import argparse, os, random, subprocess, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import logtail
+
+
+def build_log(path: str, size: int) -> None:
+    rnd = random.Random(7)
+    rows = []
+    for i in range(20000):
+        if rnd.random() < 0.03:
+            rows.append(f"2026-01-01T00:00:{i % 60:02d} ERROR trace " + "x" * rnd.randint(2000, 20000) + "\n")
+        else:
+            rows.append(f"2026-01-01T00:00:{i % 60:02d} INFO request id={i} path=/api/{rnd.randint(1, 999)} ms={rnd.randint(1, 900)}\n")
+    block = "".join(rows).encode()
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            f.write(block)
+            written += len(block)
+
+
+def old_heuristic(path: str, n: int) -> list:
+    to_read = n * 120
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size > to_read:
+            f.seek(-to_read, os.SEEK_END)
+        data = f.read()
+    return data.decode("utf-8", errors="ignore").splitlines()[-n:]
+
+
+def old_read_all(path: str, n: int) -> list:
+    with open(path, "r", errors="ignore") as f:
+        lines = f.read().splitlines()
+    return lines[-n:]
+
+
+def coreutils_tail(path: str, n: int) -> list:
+    out = subprocess.check_output(["tail", "-n", str(n), path], text=True, errors="ignore")
+    return out.splitlines()
+
+
+def measure(label: str, fn, path: str, n: int, expected) -> None:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    lines = fn(path, n)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    exact = "exact" if expected is None or lines == expected else f"WRONG ({len(lines)} lines)"
+    print(f"[logtail_bench] {label:<11} {elapsed * 1000:10.2f} ms  peak={peak / 1048576:9.2f} MiB  {exact}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark tail implementations on a large log")
+    ap.add_argument("--size-gb", type=float, default=5.0, help="Synthetic log size")
+    ap.add_argument("--lines", type=int, default=1200, help="Lines to tail")
+    ap.add_argument("--path", default="/tmp/logtail_bench.log", help="Log path (reused if already big enough)")
+    ap.add_argument("--full-read-max-mb", type=int, default=512, help="Skip read-all above this size")
+    ap.add_argument("--keep", action="store_true", help="Keep the generated log")
+    args = ap.parse_args()
+
+    size = int(args.size_gb * 1024 ** 3)
+    created = False
+    if not os.path.exists(args.path) or os.path.getsize(args.path) < size:
+        t0 = time.perf_counter()
+        build_log(args.path, size)
+        created = True
+        print(f"[logtail_bench] built {os.path.getsize(args.path) / 1024 ** 3:.2f} GiB in {time.perf_counter() - t0:.1f}s")
+    print(f"[logtail_bench] path={args.path} size={os.path.getsize(args.path)} lines={args.lines}")
+
+    try:
+        expected = logtail.tail_lines(args.path, args.lines)
+        measure("logtail", logtail.tail_lines, args.path, args.lines, expected)
+        measure("logtail-mm", lambda p, n: logtail.tail_lines(p, n, use_mmap=True), args.path, args.lines, expected)
+        measure("tail -n", coreutils_tail, args.path, args.lines, expected)
+        measure("heuristic", old_heuristic, args.path, args.lines, expected)
+        if os.path.getsize(args.path) <= args.full_read_max_mb * 1024 ** 2:
+            measure("read-all", old_read_all, args.path, args.lines, expected)
+        else:
+            print(f"[logtail_bench] read-all    skipped (file > {args.full_read_max_mb} MiB)")
+    finally:
+        if created and not args.keep:
+            os.unlink(args.path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
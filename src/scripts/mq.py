@@ -1,7 +1,9 @@
 # /web/private/lib/mother_queue/mq.py
-import json, os, socket, sqlite3, time, uuid
+import errno, json, math, os, select, socket, sqlite3, sys, threading, time, uuid
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 UTC = timezone.utc
 
@@ -30,17 +32,39 @@ CREATE TABLE IF NOT EXISTS jobs (
   created_at   TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
   updated_at   TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
 
-  last_error   TEXT
+  last_error   TEXT,
+
+  dedupe_key   TEXT,  -- optional; at most one unfinished job per (queue, dedupe_key)
+  leased_at    TEXT   -- start of the current/last attempt (run-time stats)
 );
 
-CREATE INDEX IF NOT EXISTS idx_jobs_pick
-  ON jobs(queue, status, run_after, priority);
+-- Matches the lease query: equality on (queue, status), then rows come out
+-- already in ORDER BY priority, created_at; run_after is filtered from the
+-- index without touching the table. (Replaces idx_jobs_pick on
+-- (queue, status, run_after, priority), which forced a sort per lease.)
+-- stats() also finds the oldest eligible queued job here, one seek per
+-- distinct priority, rather than paying for a (queue, status, created_at)
+-- index on every lease/ack/fail.
+CREATE INDEX IF NOT EXISTS idx_jobs_lease
+  ON jobs(queue, status, priority, created_at, run_after);
 
 CREATE INDEX IF NOT EXISTS idx_jobs_locked
   ON jobs(status, locked_until);
 
 CREATE INDEX IF NOT EXISTS idx_jobs_updated
   ON jobs(updated_at);
+
+-- Covers queued AND running so lease/fail/reap transitions never collide.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe
+  ON jobs(queue, dedupe_key)
+  WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running');
+
+-- Stats (see MotherQueue.stats): live counts per (queue, status) and hourly
+-- event counters are kept by triggers on jobs; wait/run latency histograms
+-- (quarter-octave ms buckets) are written by lease/ack/fail.
+CREATE TABLE IF NOT EXISTS job_status_counts (queue, status, n, PRIMARY KEY (queue, status));
+CREATE TABLE IF NOT EXISTS job_counters (hour, queue, event, n, PRIMARY KEY (hour, queue, event));
+CREATE TABLE IF NOT EXISTS job_latency (hour, queue, metric, bucket, n, PRIMARY KEY (hour, queue, metric, bucket));
 """
 
 
@@ -54,23 +78,320 @@ def iso_after(seconds: int) -> str:
 def new_id() -> str:
     return uuid.uuid4().hex
 
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+WAKE_DIR = os.environ.get("MQ_WAKE_DIR", "/tmp")
+FINISHED_STATUSES = ("done", "dead")
+
+# UPDATE ... RETURNING needs SQLite 3.35+; older libs fall back to SELECT ids + UPDATE.
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def wake_socket_path(queue: str) -> str:
+    return os.path.join(WAKE_DIR, f"mq_wake_{queue}.sock")
+
+def notify_queue(queue: str) -> None:
+    """
+    Poke an idle worker on `queue` (best effort). A missing or stale socket just
+    means nobody is listening; the worker's backoff poll still picks the job up.
+    """
+    try:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    except OSError:
+        return
+    try:
+        s.setblocking(False)
+        s.sendto(b"1", wake_socket_path(queue))
+    except OSError:
+        pass
+    finally:
+        s.close()
+
+class QueueWaker:
+    """
+    Unix datagram socket a worker binds for its queue. enqueue() sends a byte
+    to it, so an idle worker blocked in wait() wakes up immediately instead of
+    sleeping out its poll interval.
+    """
+
+    def __init__(self, queue: str):
+        self.path = wake_socket_path(queue)
+        self.sock: Optional[socket.socket] = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.path)
+            sock.setblocking(False)
+            self.sock = sock
+        except OSError as e:
+            # No wakeups (e.g. unwritable WAKE_DIR): wait() degrades to a plain sleep.
+            print(f"[mq] wake socket unavailable ({self.path}): {e}", file=sys.stderr)
+
+    def poke(self, *_args: Any) -> None:
+        """Wake our own wait(); usable as a Future done-callback."""
+        if self.sock is not None:
+            try:
+                self.sock.sendto(b"1", self.path)
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.ENOBUFS):
+                    raise
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to `timeout` seconds. True if poked, False on timeout."""
+        if self.sock is None:
+            time.sleep(max(0.0, timeout))
+            return False
+        ready, _, _ = select.select([self.sock], [], [], max(0.0, timeout))
+        if not ready:
+            return False
+        # Collapse a burst of enqueues into one wakeup.
+        while True:
+            try:
+                self.sock.recv(64)
+            except BlockingIOError:
+                break
+        return True
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+ENQUEUE_SQL = """
+    INSERT INTO jobs
+      (id, queue, name, payload_json, status, priority, run_after, max_attempts, created_at, updated_at, dedupe_key)
+    VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (queue, dedupe_key) WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running')
+    DO NOTHING
+"""
+
+_HOUR = "strftime('%Y-%m-%dT%H', 'now')"
+_EVENT = """CASE
+      WHEN NEW.status = 'running' THEN 'leased'
+      WHEN NEW.status = 'done' THEN 'done'
+      WHEN NEW.status = 'dead' THEN 'dead'
+      WHEN NEW.status = 'queued' AND OLD.status = 'running' THEN 'retry'
+    END"""
+
+# Triggers also see PHP-side edits (delete/retry), so counts never drift.
+STATS_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_jobs_stats_insert AFTER INSERT ON jobs BEGIN
+      INSERT INTO job_status_counts (queue, status, n) VALUES (NEW.queue, NEW.status, 1)
+        ON CONFLICT (queue, status) DO UPDATE SET n = n + 1;
+      INSERT INTO job_counters (hour, queue, event, n) VALUES ({_HOUR}, NEW.queue, 'enqueued', 1)
+        ON CONFLICT (hour, queue, event) DO UPDATE SET n = n + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_jobs_stats_delete AFTER DELETE ON jobs BEGIN
+      UPDATE job_status_counts SET n = n - 1 WHERE queue = OLD.queue AND status = OLD.status;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_jobs_stats_update AFTER UPDATE OF status, queue ON jobs
+    WHEN OLD.status IS NOT NEW.status OR OLD.queue IS NOT NEW.queue BEGIN
+      UPDATE job_status_counts SET n = n - 1 WHERE queue = OLD.queue AND status = OLD.status;
+      INSERT INTO job_status_counts (queue, status, n) VALUES (NEW.queue, NEW.status, 1)
+        ON CONFLICT (queue, status) DO UPDATE SET n = n + 1;
+      INSERT INTO job_counters (hour, queue, event, n)
+        SELECT {_HOUR}, NEW.queue, {_EVENT}, 1
+        WHERE {_EVENT} IS NOT NULL
+        ON CONFLICT (hour, queue, event) DO UPDATE SET n = n + 1;
+    END""",
+]
+
+def _parse_iso(ts: str) -> datetime:
+    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+def latency_bucket(ms: float) -> int:
+    """Quarter-octave bucket index (~19% resolution); bucket b covers up to 2**(b/4) ms."""
+    return 0 if ms <= 1 else int(math.ceil(math.log2(ms) * 4))
+
+def bucket_upper_ms(bucket: int) -> float:
+    return 2 ** (bucket / 4)
+
+def _record_latency(con: sqlite3.Connection, metric: str, samples: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> None:
+    """Add (queue, start_iso, end_iso) samples to the hourly job_latency histogram."""
+    hour = now_iso()[:13]
+    agg: Counter = Counter()
+    for queue, start, end in samples:
+        if not start or not end:
+            continue
+        try:
+            ms = (_parse_iso(end) - _parse_iso(start)).total_seconds() * 1000
+        except ValueError:
+            continue
+        agg[(queue, latency_bucket(ms))] += 1
+    if agg:
+        con.executemany(
+            """INSERT INTO job_latency (hour, queue, metric, bucket, n) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (hour, queue, metric, bucket) DO UPDATE SET n = n + excluded.n""",
+            [(hour, queue, metric, bucket, n) for (queue, bucket), n in agg.items()]
+        )
+
+def _oldest_queued(con: sqlite3.Connection, queue: str, ts: str) -> Optional[str]:
+    """
+    created_at of the oldest queued job that is already eligible (run_after <= ts),
+    walking idx_jobs_lease one priority at a time: per priority the entries are in
+    created_at order, so each step stops at its first eligible entry. Delayed jobs
+    (run_after in the future) are not backlog and are skipped.
+    """
+    oldest = None
+    prio = con.execute(
+        "SELECT MIN(priority) AS p FROM jobs WHERE queue = ? AND status = 'queued'", (queue,)
+    ).fetchone()["p"]
+    while prio is not None:
+        row = con.execute(
+            """SELECT created_at FROM jobs
+               WHERE queue = ? AND status = 'queued' AND priority = ? AND run_after <= ?
+               ORDER BY created_at LIMIT 1""",
+            (queue, prio, ts)
+        ).fetchone()
+        if row and (oldest is None or row["created_at"] < oldest):
+            oldest = row["created_at"]
+        prio = con.execute(
+            "SELECT MIN(priority) AS p FROM jobs WHERE queue = ? AND status = 'queued' AND priority > ?",
+            (queue, prio)
+        ).fetchone()["p"]
+    return oldest
+
+def _record_run_times(con: sqlite3.Connection, job_ids: List[str], ts: str, worker: str) -> None:
+    """Histogram leased_at -> ts for the running jobs `worker` is about to ack/fail."""
+    for i in range(0, len(job_ids), 500):
+        chunk = job_ids[i:i + 500]
+        rows = con.execute(
+            f"""SELECT queue, leased_at FROM jobs
+                WHERE id IN ({",".join("?" * len(chunk))}) AND status = 'running' AND locked_by = ?""",
+            (*chunk, worker)
+        ).fetchall()
+        _record_latency(con, "run", ((r["queue"], r["leased_at"], ts) for r in rows))
+
+class LeaseKeeper:
+    """
+    Background thread that keeps extending the leases of jobs a worker is still
+    holding, so a long handler (e.g. ingest_bash_history) is not reaped while it
+    runs. Ids are added when leased and discarded once acked/failed. Only
+    leases still held by `worker` are extended.
+    """
+
+    def __init__(self, mq: "MotherQueue", lease_seconds: int = 120, interval: Optional[float] = None,
+                 worker: Optional[str] = None):
+        self.mq = mq
+        self.worker = worker or worker_id()
+        self.lease_seconds = lease_seconds
+        self.interval = interval or max(1.0, lease_seconds / 3)
+        self._ids: set = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mq-lease-keeper", daemon=True)
+
+    def __enter__(self) -> "LeaseKeeper":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def add(self, job_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._ids.update(job_ids)
+
+    def discard(self, job_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._ids.difference_update(job_ids)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                ids = list(self._ids)
+            if not ids:
+                continue
+            try:
+                self.mq.heartbeat_many(ids, lease_seconds=self.lease_seconds, worker=self.worker)
+            except sqlite3.Error as e:
+                print(f"[mq] heartbeat failed: {e}", file=sys.stderr)
+
 class MotherQueue:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, persistent: bool = True):
+        """
+        persistent=True keeps one connection per thread (and per process, so a
+        forked child never reuses its parent's handle); PRAGMAs run once and the
+        sqlite3 statement cache is reused across calls. persistent=False is the
+        old connect-per-call behaviour, kept for benchmarks and one-shot CLIs.
+        """
         self.db_path = db_path
+        self.persistent = persistent
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open_conns: List[Tuple[int, sqlite3.Connection]] = []
+        self._generation = 0
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self._init_db()
 
-    def _conn(self) -> sqlite3.Connection:
-        con = sqlite3.connect(self.db_path, timeout=5)
+    def __enter__(self) -> "MotherQueue":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _open(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, cached_statements=256)
         con.row_factory = sqlite3.Row
+        # Only takes effect on a brand-new file (must precede WAL); older DBs
+        # switch over via `mqctl.py archive --full-vacuum`.
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
         con.execute("PRAGMA journal_mode=WAL")
         con.execute("PRAGMA synchronous=NORMAL")
         con.execute("PRAGMA busy_timeout=5000")
         return con
 
+    def _thread_conn(self) -> sqlite3.Connection:
+        loc = self._local
+        pid = os.getpid()
+        con = getattr(loc, "con", None)
+        if con is None or loc.pid != pid or loc.generation != self._generation:
+            con = self._open()
+            loc.con, loc.pid, loc.generation = con, pid, self._generation
+            with self._lock:
+                self._open_conns.append((pid, con))
+        return con
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        """Yield a connection wrapped in a transaction (commit on success, rollback on error)."""
+        con = self._thread_conn() if self.persistent else self._open()
+        try:
+            with con:
+                yield con
+        finally:
+            if not self.persistent:
+                con.close()
+
+    def close(self) -> None:
+        """Close every pooled connection this process opened."""
+        with self._lock:
+            conns, self._open_conns = self._open_conns, []
+            self._generation += 1
+        pid = os.getpid()
+        for owner, con in conns:
+            # Handles inherited across fork() belong to the parent; leave them alone.
+            if owner != pid:
+                continue
+            try:
+                con.close()
+            except sqlite3.Error:
+                pass
+
     def _init_db(self) -> None:
         """Create tables if they don't exist."""
         with self._conn() as con:
+            # One write transaction, so two processes starting on a new/old DB can't
+            # both see job_status_counts missing and backfill it twice.
+            con.execute("BEGIN IMMEDIATE")
             con.execute("""
                 CREATE TABLE IF NOT EXISTS jobs (
                   id           TEXT PRIMARY KEY,
@@ -91,42 +412,147 @@ class MotherQueue:
                   created_at   TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
                   updated_at   TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
 
-                  last_error   TEXT
+                  last_error   TEXT,
+
+                  dedupe_key   TEXT,
+                  leased_at    TEXT
                 )
             """)
+            cols = {r["name"] for r in con.execute("PRAGMA table_info(jobs)")}
+            for col in ("dedupe_key", "leased_at"):
+                if col not in cols:
+                    con.execute(f"ALTER TABLE jobs ADD COLUMN {col} TEXT")
+            con.execute("DROP INDEX IF EXISTS idx_jobs_pick")
             con.execute("""
-                CREATE INDEX IF NOT EXISTS idx_jobs_pick
-                  ON jobs(queue, status, run_after, priority)
+                CREATE INDEX IF NOT EXISTS idx_jobs_lease
+                  ON jobs(queue, status, priority, created_at, run_after)
             """)
             con.execute("""
                 CREATE INDEX IF NOT EXISTS idx_jobs_locked
                   ON jobs(status, locked_until)
             """)
+            # stats() reads the oldest queued job from idx_jobs_lease instead (_oldest_queued).
+            con.execute("DROP INDEX IF EXISTS idx_jobs_queued_age")
             con.execute("""
                 CREATE INDEX IF NOT EXISTS idx_jobs_updated
                   ON jobs(updated_at)
             """)
-            con.commit()
+            con.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe
+                  ON jobs(queue, dedupe_key)
+                  WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running')
+            """)
+            self._init_stats(con)
+
+    def _init_stats(self, con: sqlite3.Connection) -> None:
+        fresh = not con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='job_status_counts'"
+        ).fetchone()
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS job_status_counts (
+              queue  TEXT NOT NULL,
+              status TEXT NOT NULL,
+              n      INTEGER NOT NULL DEFAULT 0,
+              PRIMARY KEY (queue, status)
+            ) WITHOUT ROWID
+        """)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS job_counters (
+              hour  TEXT NOT NULL,   -- YYYY-MM-DDTHH (UTC)
+              queue TEXT NOT NULL,
+              event TEXT NOT NULL,   -- enqueued|leased|done|retry|dead
+              n     INTEGER NOT NULL DEFAULT 0,
+              PRIMARY KEY (hour, queue, event)
+            ) WITHOUT ROWID
+        """)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS job_latency (
+              hour   TEXT NOT NULL,
+              queue  TEXT NOT NULL,
+              metric TEXT NOT NULL,   -- wait (eligible->leased) | run (leased->ack/fail)
+              bucket INTEGER NOT NULL,
+              n      INTEGER NOT NULL DEFAULT 0,
+              PRIMARY KEY (hour, queue, metric, bucket)
+            ) WITHOUT ROWID
+        """)
+        if fresh:
+            # Triggers are created below in the same transaction, so no job change falls in between.
+            con.execute("""
+                INSERT INTO job_status_counts (queue, status, n)
+                SELECT queue, status, COUNT(*) FROM jobs GROUP BY queue, status
+            """)
+        for stmt in STATS_TRIGGERS:
+            con.execute(stmt)
 
     def enqueue(self, queue: str, name: str, payload: Dict[str, Any],
                 priority: int = 100, run_after: Optional[str] = None,
-                max_attempts: int = 5, job_id: Optional[str] = None) -> str:
+                max_attempts: int = 5, job_id: Optional[str] = None,
+                dedupe_key: Optional[str] = None) -> str:
+        """
+        Insert one job. With a dedupe_key, an unfinished (queued/running) job
+        with the same (queue, dedupe_key) absorbs this one and its id is
+        returned instead.
+        """
         job_id = job_id or new_id()
         run_after = run_after or now_iso()
         payload_json = json.dumps(payload, ensure_ascii=False)
         ts = now_iso()
 
         with self._conn() as con:
-            con.execute(
-                """INSERT INTO jobs
-                   (id, queue, name, payload_json, status, priority, run_after, max_attempts, created_at, updated_at)
-                   VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?)""",
-                (job_id, queue, name, payload_json, priority, run_after, max_attempts, ts, ts)
+            cur = con.execute(
+                ENQUEUE_SQL,
+                (job_id, queue, name, payload_json, priority, run_after, max_attempts, ts, ts, dedupe_key)
             )
+            if cur.rowcount == 0:
+                row = con.execute(
+                    """SELECT id FROM jobs
+                       WHERE queue=? AND dedupe_key=? AND status IN ('queued', 'running')""",
+                    (queue, dedupe_key)
+                ).fetchone()
+                return row["id"] if row else job_id
+        notify_queue(queue)
         return job_id
 
-    def lease_one(self, queue: str, lease_seconds: int = 120) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
-        worker = f"{socket.gethostname()}:{os.getpid()}"
+    def enqueue_many(self, jobs: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Insert many jobs in a single transaction. Each item takes the same keys
+        as enqueue(): queue (default 'default'), name, payload, priority,
+        run_after, max_attempts, job_id, dedupe_key. Duplicates by dedupe_key
+        (against the table or earlier items) are dropped.
+        Returns {"inserted": n, "deduped": n}.
+        """
+        ts = now_iso()
+        rows = []
+        queues = set()
+        for job in jobs:
+            if not job.get("name"):
+                raise ValueError(f"enqueue_many: job without a name: {job!r}")
+            queue = job.get("queue") or "default"
+            queues.add(queue)
+            rows.append((
+                job.get("job_id") or new_id(),
+                queue,
+                job["name"],
+                json.dumps(job.get("payload") or {}, ensure_ascii=False),
+                int(job.get("priority", 100)),
+                job.get("run_after") or ts,
+                int(job.get("max_attempts", 5)),
+                ts,
+                ts,
+                job.get("dedupe_key"),
+            ))
+        if not rows:
+            return {"inserted": 0, "deduped": 0}
+
+        with self._conn() as con:
+            inserted = con.executemany(ENQUEUE_SQL, rows).rowcount
+        for queue in queues:
+            notify_queue(queue)
+        return {"inserted": inserted, "deduped": len(rows) - inserted}
+
+    def lease_one(self, queue: str, lease_seconds: int = 120,
+                  worker: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        worker = worker or worker_id()
         lock_until = iso_after(lease_seconds)
         ts = now_iso()
 
@@ -153,32 +579,46 @@ class MotherQueue:
                        locked_by=?,
                        locked_until=?,
                        attempts=attempts+1,
+                       leased_at=?,
                        updated_at=?
                    WHERE id=?""",
-                (worker, lock_until, ts, row["id"])
+                (worker, lock_until, ts, ts, row["id"])
             )
+            _record_latency(con, "wait", [(queue, max(row["created_at"], row["run_after"]), ts)])
             con.execute("COMMIT")
 
             job = dict(row)
             payload = json.loads(job["payload_json"])
             return job, payload
 
-    def ack(self, job_id: str) -> None:
+    def ack(self, job_id: str, worker: Optional[str] = None) -> bool:
+        """
+        Mark a job done. Only the worker holding the lease can settle it; False
+        means the lease was lost (reaped and maybe re-leased) and nothing changed.
+        """
+        worker = worker or worker_id()
         ts = now_iso()
         with self._conn() as con:
-            con.execute(
+            _record_run_times(con, [job_id], ts, worker)
+            cur = con.execute(
                 """UPDATE jobs
                    SET status='done', locked_by=NULL, locked_until=NULL, last_error=NULL, updated_at=?
-                   WHERE id=?""",
-                (ts, job_id)
+                   WHERE id=? AND status='running' AND locked_by=?""",
+                (ts, job_id, worker)
             )
+            return cur.rowcount == 1
 
-    def fail(self, job_id: str, error: str, retry_delay_seconds: int = 60) -> None:
+    def fail(self, job_id: str, error: str, retry_delay_seconds: int = 60, worker: Optional[str] = None) -> None:
+        worker = worker or worker_id()
         ts = now_iso()
         with self._conn() as con:
-            row = con.execute("SELECT attempts, max_attempts FROM jobs WHERE id=?", (job_id,)).fetchone()
+            row = con.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id=? AND status='running' AND locked_by=?",
+                (job_id, worker)
+            ).fetchone()
             if not row:
                 return
+            _record_run_times(con, [job_id], ts, worker)
             attempts = int(row["attempts"])
             max_attempts = int(row["max_attempts"])
 
@@ -186,8 +626,8 @@ class MotherQueue:
                 con.execute(
                     """UPDATE jobs
                        SET status='dead', locked_by=NULL, locked_until=NULL, last_error=?, updated_at=?
-                       WHERE id=?""",
-                    (error[:4000], ts, job_id)
+                       WHERE id=? AND status='running' AND locked_by=?""",
+                    (error[:4000], ts, job_id, worker)
                 )
             else:
                 con.execute(
@@ -198,6 +638,352 @@ class MotherQueue:
                            last_error=?,
                            run_after=?,
                            updated_at=?
-                       WHERE id=?""",
-                    (error[:4000], iso_after(retry_delay_seconds), ts, job_id)
+                       WHERE id=? AND status='running' AND locked_by=?""",
+                    (error[:4000], iso_after(retry_delay_seconds), ts, job_id, worker)
+                )
+
+    def lease_many(self, queue: str, limit: int = 10, lease_seconds: int = 120,
+                   worker: Optional[str] = None) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Claim up to `limit` jobs in one write transaction. Returned in pick order."""
+        if limit <= 0:
+            return []
+        worker = worker or worker_id()
+        lock_until = iso_after(lease_seconds)
+        ts = now_iso()
+
+        with self._conn() as con:
+            # Cheap read-only probe first so an idle poll never takes the write lock.
+            if not con.execute(
+                """SELECT 1 FROM jobs
+                   WHERE queue = ?
+                     AND status = 'queued'
+                     AND run_after <= ?
+                   LIMIT 1""",
+                (queue, ts)
+            ).fetchone():
+                return []
+
+            con.execute("BEGIN IMMEDIATE")
+
+            if HAS_RETURNING:
+                rows = con.execute(
+                    """UPDATE jobs
+                       SET status='running',
+                           locked_by=?,
+                           locked_until=?,
+                           attempts=attempts+1,
+                           leased_at=?,
+                           updated_at=?
+                       WHERE id IN (
+                         SELECT id FROM jobs
+                         WHERE queue = ?
+                           AND status = 'queued'
+                           AND run_after <= ?
+                         ORDER BY priority ASC, created_at ASC
+                         LIMIT ?
+                       )
+                       RETURNING *""",
+                    (worker, lock_until, ts, ts, queue, ts, limit)
+                ).fetchall()
+            else:
+                ids = [r["id"] for r in con.execute(
+                    """SELECT id FROM jobs
+                       WHERE queue = ?
+                         AND status = 'queued'
+                         AND run_after <= ?
+                       ORDER BY priority ASC, created_at ASC
+                       LIMIT ?""",
+                    (queue, ts, limit)
+                ).fetchall()]
+                rows = []
+                if ids:
+                    marks = ",".join("?" * len(ids))
+                    con.execute(
+                        f"""UPDATE jobs
+                            SET status='running',
+                                locked_by=?,
+                                locked_until=?,
+                                attempts=attempts+1,
+                                leased_at=?,
+                                updated_at=?
+                            WHERE id IN ({marks})""",
+                        (worker, lock_until, ts, ts, *ids)
+                    )
+                    rows = con.execute(f"SELECT * FROM jobs WHERE id IN ({marks})", ids).fetchall()
+            _record_latency(con, "wait", ((r["queue"], max(r["created_at"], r["run_after"]), ts) for r in rows))
+            con.execute("COMMIT")
+
+        # RETURNING order is unspecified; restore the pick order.
+        jobs = sorted((dict(r) for r in rows), key=lambda j: (j["priority"], j["created_at"]))
+        return [(job, json.loads(job["payload_json"])) for job in jobs]
+
+    def ack_many(self, job_ids: Iterable[str], worker: Optional[str] = None) -> int:
+        """ack() for several jobs in one transaction; returns how many were still ours."""
+        ids = list(job_ids)
+        if not ids:
+            return 0
+        worker = worker or worker_id()
+        ts = now_iso()
+        with self._conn() as con:
+            _record_run_times(con, ids, ts, worker)
+            cur = con.executemany(
+                """UPDATE jobs
+                   SET status='done', locked_by=NULL, locked_until=NULL, last_error=NULL, updated_at=?
+                   WHERE id=? AND status='running' AND locked_by=?""",
+                [(ts, job_id, worker) for job_id in ids]
+            )
+            return cur.rowcount
+
+    def fail_many(self, failures: Iterable[Tuple[str, str]], retry_delay_seconds: int = 60,
+                  worker: Optional[str] = None) -> int:
+        """
+        Fail several (job_id, error) pairs in one transaction; same dead/retry and
+        lease-ownership rules as fail(). Returns how many were still ours.
+        """
+        rows = [(error[:4000], job_id) for job_id, error in failures]
+        if not rows:
+            return 0
+        worker = worker or worker_id()
+        ts = now_iso()
+        retry_at = iso_after(retry_delay_seconds)
+        with self._conn() as con:
+            _record_run_times(con, [job_id for _, job_id in rows], ts, worker)
+            cur = con.executemany(
+                """UPDATE jobs
+                   SET status=CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                       run_after=CASE WHEN attempts >= max_attempts THEN run_after ELSE ? END,
+                       locked_by=NULL,
+                       locked_until=NULL,
+                       last_error=?,
+                       updated_at=?
+                   WHERE id=? AND status='running' AND locked_by=?""",
+                [(retry_at, err, ts, job_id, worker) for err, job_id in rows]
+            )
+            return cur.rowcount
+
+    def heartbeat(self, job_id: str, lease_seconds: int = 120, worker: Optional[str] = None) -> bool:
+        """
+        Extend a running job's lease held by `worker` (default: this process).
+        Handlers doing long work can call this periodically; False means the
+        lease is gone: finished, or reaped and possibly re-leased by another worker.
+        """
+        return self.heartbeat_many([job_id], lease_seconds=lease_seconds, worker=worker) == 1
+
+    def heartbeat_many(self, job_ids: Iterable[str], lease_seconds: int = 120, worker: Optional[str] = None) -> int:
+        ids = list(job_ids)
+        if not ids:
+            return 0
+        worker = worker or worker_id()
+        lock_until = iso_after(lease_seconds)
+        with self._conn() as con:
+            cur = con.executemany(
+                "UPDATE jobs SET locked_until=? WHERE id=? AND status='running' AND locked_by=?",
+                [(lock_until, job_id, worker) for job_id in ids]
+            )
+            return cur.rowcount
+
+    def reap_expired(self, batch_size: int = 500, retry_delay_seconds: int = 0) -> int:
+        """
+        Requeue running jobs whose lease ran out (worker killed or hung). Jobs
+        that already used all attempts go to 'dead'. Walks idx_jobs_locked in
+        batches of `batch_size` so each write transaction stays short.
+        Returns the number of jobs reaped.
+        """
+        total = 0
+        while True:
+            ts = now_iso()
+            with self._conn() as con:
+                cur = con.execute(
+                    """UPDATE jobs
+                       SET status=CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                           run_after=CASE WHEN attempts >= max_attempts THEN run_after ELSE ? END,
+                           last_error='lease expired (locked_by=' || COALESCE(locked_by, '?') || ')',
+                           locked_by=NULL,
+                           locked_until=NULL,
+                           updated_at=?
+                       WHERE id IN (
+                         SELECT id FROM jobs
+                         WHERE status = 'running'
+                           AND locked_until < ?
+                         LIMIT ?
+                       )""",
+                    (iso_after(retry_delay_seconds), ts, ts, batch_size)
                 )
+                n = cur.rowcount
+            total += n
+            if n < batch_size:
+                return total
+
+    def archive_dir(self) -> str:
+        return os.path.join(os.path.dirname(self.db_path), "mother_queue_archive")
+
+    def archive_finished(self, older_than_days: float = 7, statuses: Iterable[str] = FINISHED_STATUSES,
+                         batch_size: int = 1000, archive_dir: Optional[str] = None,
+                         vacuum_pages: int = 2000) -> Dict[str, int]:
+        """
+        Move finished jobs last touched more than `older_than_days` ago into
+        monthly archive files (<archive_dir>/jobs_YYYY-MM.db, by updated_at).
+        Walks idx_jobs_updated oldest-first, one short transaction per batch so
+        workers are never locked out for long, then reclaims free pages with
+        incremental_vacuum and truncates the WAL.
+        Returns {"archived": n, "batches": n, "vacuum_pages": n}.
+        """
+        statuses = tuple(statuses)
+        if not statuses:
+            raise ValueError("archive_finished: no statuses given")
+        archive_dir = archive_dir or self.archive_dir()
+        os.makedirs(archive_dir, exist_ok=True)
+        cutoff = iso_after(int(-older_than_days * 86400))
+        marks = ",".join("?" * len(statuses))
+        stats = {"archived": 0, "batches": 0, "vacuum_pages": 0}
+
+        # ATTACH/DETACH cannot run inside a transaction, and the pooled
+        # connection must not keep an archive attached, so use a private one.
+        con = self._open()
+        con.isolation_level = None
+        try:
+            con.execute("CREATE TEMP TABLE IF NOT EXISTS _archive_ids (id TEXT PRIMARY KEY)")
+            while True:
+                row = con.execute(
+                    f"""SELECT substr(updated_at, 1, 7) AS month FROM jobs
+                        WHERE updated_at < ? AND status IN ({marks})
+                        ORDER BY updated_at LIMIT 1""",
+                    (cutoff, *statuses)
+                ).fetchone()
+                if not row:
+                    break
+                month = row["month"]
+                year, mon = int(month[:4]), int(month[5:7])
+                next_month = f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+                upper = min(cutoff, f"{next_month}-01T00:00:00.000Z")
+
+                con.execute("ATTACH DATABASE ? AS arch", (os.path.join(archive_dir, f"jobs_{month}.db"),))
+                try:
+                    con.execute("CREATE TABLE IF NOT EXISTS arch.jobs AS SELECT * FROM main.jobs WHERE 0")
+                    con.execute("CREATE UNIQUE INDEX IF NOT EXISTS arch.idx_archive_id ON jobs(id)")
+                    # Archives written before a schema change lack newer columns.
+                    cols = [r["name"] for r in con.execute("PRAGMA main.table_info(jobs)")]
+                    have = {r["name"] for r in con.execute("PRAGMA arch.table_info(jobs)")}
+                    for col in cols:
+                        if col not in have:
+                            con.execute(f"ALTER TABLE arch.jobs ADD COLUMN {col}")
+                    col_list = ", ".join(cols)
+                    while True:
+                        con.execute("BEGIN IMMEDIATE")
+                        try:
+                            con.execute("DELETE FROM _archive_ids")
+                            con.execute(
+                                f"""INSERT INTO _archive_ids (id)
+                                    SELECT id FROM main.jobs
+                                    WHERE updated_at < ? AND status IN ({marks})
+                                    ORDER BY updated_at LIMIT ?""",
+                                (upper, *statuses, batch_size)
+                            )
+                            n = con.execute(
+                                f"""INSERT OR REPLACE INTO arch.jobs ({col_list})
+                                    SELECT {col_list} FROM main.jobs WHERE id IN (SELECT id FROM _archive_ids)"""
+                            ).rowcount
+                            con.execute("DELETE FROM main.jobs WHERE id IN (SELECT id FROM _archive_ids)")
+                            con.execute("COMMIT")
+                        except Exception:
+                            con.execute("ROLLBACK")
+                            raise
+                        if n <= 0:
+                            break
+                        stats["archived"] += n
+                        stats["batches"] += 1
+                        if n < batch_size:
+                            break
+                finally:
+                    con.execute("DETACH DATABASE arch")
+
+            if stats["archived"] and vacuum_pages > 0 and con.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                before = con.execute("PRAGMA freelist_count").fetchone()[0]
+                # execute() steps the pragma only once (one page); executescript runs it to completion.
+                con.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+                stats["vacuum_pages"] = before - con.execute("PRAGMA freelist_count").fetchone()[0]
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            con.close()
+        return stats
+
+    def full_vacuum(self) -> None:
+        """One-off VACUUM that also switches an old DB to auto_vacuum=INCREMENTAL. Blocks writers while it runs."""
+        con = self._open()
+        con.isolation_level = None
+        try:
+            con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            con.execute("VACUUM")
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            con.close()
+
+    def stats(self, window_hours: int = 24, queue: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-queue snapshot from the maintained stats tables (no jobs table scan):
+          counts            current jobs per status
+          oldest_queued_s   age of the oldest queued job that may run now (delayed
+                            jobs excluded; index-only via idx_jobs_lease)
+          events            enqueued/leased/done/retry/dead over the window
+          retry_rate        retry / leased, dead_rate = dead / leased
+          wait_ms / run_ms  n, p50, p95, p99 (bucket upper bounds) over the window
+        """
+        since = iso_after(-window_hours * 3600)[:13]
+        where, args = ("", ()) if queue is None else (" AND queue = ?", (queue,))
+        out: Dict[str, Dict[str, Any]] = {}
+
+        def q(name: str) -> Dict[str, Any]:
+            return out.setdefault(name, {
+                "counts": {}, "oldest_queued_s": None, "events": {},
+                "retry_rate": None, "dead_rate": None, "wait_ms": {}, "run_ms": {},
+            })
+
+        with self._conn() as con:
+            for r in con.execute(f"SELECT queue, status, n FROM job_status_counts WHERE n > 0{where}", args):
+                q(r["queue"])["counts"][r["status"]] = r["n"]
+            for r in con.execute(
+                f"SELECT queue, event, SUM(n) AS n FROM job_counters WHERE hour >= ?{where} GROUP BY queue, event",
+                (since, *args)
+            ):
+                q(r["queue"])["events"][r["event"]] = r["n"]
+            hist: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+            for r in con.execute(
+                f"""SELECT queue, metric, bucket, SUM(n) AS n FROM job_latency
+                    WHERE hour >= ?{where} GROUP BY queue, metric, bucket ORDER BY bucket""",
+                (since, *args)
+            ):
+                hist.setdefault((r["queue"], r["metric"]), []).append((r["bucket"], r["n"]))
+            ts = now_iso()
+            for name, data in out.items():
+                if data["counts"].get("queued"):
+                    oldest = _oldest_queued(con, name, ts)
+                    if oldest:
+                        data["oldest_queued_s"] = round((datetime.now(UTC) - _parse_iso(oldest)).total_seconds(), 1)
+
+        for (name, metric), buckets in hist.items():
+            total = sum(n for _, n in buckets)
+            pct: Dict[str, Any] = {"n": total}
+            for label, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+                seen = 0
+                for bucket, n in buckets:
+                    seen += n
+                    if seen >= p * total:
+                        pct[label] = round(bucket_upper_ms(bucket), 1)
+                        break
+            q(name)[f"{metric}_ms"] = pct
+
+        for data in out.values():
+            leased = data["events"].get("leased", 0)
+            if leased:
+                data["retry_rate"] = round(data["events"].get("retry", 0) / leased, 4)
+                data["dead_rate"] = round(data["events"].get("dead", 0) / leased, 4)
+        return out
+
+    def prune_stats(self, keep_days: int = 30) -> int:
+        """Drop hourly counter/latency rows older than keep_days."""
+        cutoff = iso_after(-keep_days * 86400)[:13]
+        with self._conn() as con:
+            n = con.execute("DELETE FROM job_counters WHERE hour < ?", (cutoff,)).rowcount
+            n += con.execute("DELETE FROM job_latency WHERE hour < ?", (cutoff,)).rowcount
+            con.execute("DELETE FROM job_status_counts WHERE n <= 0")
+        return n
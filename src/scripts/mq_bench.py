@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# /web/html/src/scripts/mq_bench.py
+"""
+MotherQueue micro-benchmark.
+
+Compares connect-per-call (the old behaviour, persistent=False) against the
+pooled per-thread connection for:
+  - enqueue
+  - lease_one + ack cycles
+  - lease_many + ack_many cycles (batch)
+
+--scale N instead fills the jobs table with N queued rows and measures
+per-lease latency against that backlog; add --legacy-index to compare
+with the old idx_jobs_pick(queue, status, run_after, priority) layout.
+
+Uses a throwaway DB under a temp dir unless --db is given.
+
+Usage:
+  python3 mq_bench.py [--n 2000] [--batch 50] [--db /tmp/mq_bench.db]
+  python3 mq_bench.py --scale 1000000 [--samples 500] [--legacy-index]
+"""
+import argparse, os, random, shutil, sys, tempfile, time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mq import UTC, MotherQueue, now_iso
+
+
+def _rate(n: int, seconds: float) -> str:
+    return f"{n / seconds:10.1f} ops/s  ({seconds * 1000 / max(n, 1):.3f} ms/op)"
+
+
+def _reset_db(db_path: str) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.unlink(db_path + suffix)
+        except OSError:
+            pass
+
+
+def _pct(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def bench(db_path: str, persistent: bool, n: int, batch: int) -> None:
+    _reset_db(db_path)
+
+    label = "pooled" if persistent else "per-call"
+    with MotherQueue(db_path, persistent=persistent) as mq:
+        t0 = time.perf_counter()
+        for i in range(n):
+            mq.enqueue("bench", "noop", {"i": i})
+        print(f"[{label:<8}] enqueue             {_rate(n, time.perf_counter() - t0)}")
+
+        t0 = time.perf_counter()
+        done = 0
+        while True:
+            leased = mq.lease_one("bench")
+            if not leased:
+                break
+            mq.ack(leased[0]["id"])
+            done += 1
+        print(f"[{label:<8}] lease_one+ack       {_rate(done, time.perf_counter() - t0)}")
+
+        for i in range(n):
+            mq.enqueue("bench", "noop", {"i": i})
+        t0 = time.perf_counter()
+        done = 0
+        while True:
+            jobs = mq.lease_many("bench", limit=batch)
+            if not jobs:
+                break
+            mq.ack_many(job["id"] for job, _ in jobs)
+            done += len(jobs)
+        print(f"[{label:<8}] lease_many+ack_many {_rate(done, time.perf_counter() - t0)} batch={batch}")
+
+
+def bench_scale(db_path: str, rows: int, samples: int, legacy_index: bool) -> None:
+    _reset_db(db_path)
+    with MotherQueue(db_path) as mq:
+        if legacy_index:
+            with mq._conn() as con:
+                con.execute("DROP INDEX IF EXISTS idx_jobs_lease")
+                con.execute("CREATE INDEX idx_jobs_pick ON jobs(queue, status, run_after, priority)")
+
+        # Mixed priorities, ~10% delayed retries, plus a second queue as noise.
+        t0 = time.perf_counter()
+        base = datetime.now(UTC) - timedelta(days=1)
+        rnd = random.Random(42)
+
+        def gen():
+            for i in range(rows):
+                created = (base + timedelta(microseconds=i * 50)).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+                run_after = created if rnd.random() > 0.1 else "2999-01-01T00:00:00.000Z"
+                queue = "bench" if i % 4 else "other"
+                yield (f"job{i:09d}", queue, "noop", "{}", rnd.randint(50, 150), run_after, created, created)
+
+        with mq._conn() as con:
+            con.executemany(
+                """INSERT INTO jobs (id, queue, name, payload_json, status, priority, run_after, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)""",
+                gen()
+            )
+        print(f"[mq_bench] filled {rows} rows in {time.perf_counter() - t0:.1f}s "
+              f"index={'legacy idx_jobs_pick' if legacy_index else 'idx_jobs_lease'}")
+
+        with mq._conn() as con:
+            plan = con.execute(
+                """EXPLAIN QUERY PLAN SELECT * FROM jobs
+                   WHERE queue = ? AND status = 'queued' AND run_after <= ?
+                   ORDER BY priority ASC, created_at ASC LIMIT 1""",
+                ("bench", now_iso())
+            ).fetchall()
+        for row in plan:
+            print(f"[mq_bench] plan: {row[3]}")
+
+        lat = []
+        for _ in range(samples):
+            t0 = time.perf_counter()
+            jobs = mq.lease_many("bench", limit=1)
+            lat.append((time.perf_counter() - t0) * 1000)
+            mq.ack_many(job["id"] for job, _ in jobs)
+        print(f"[mq_bench] lease latency over {samples} leases: "
+              f"p50={_pct(lat, 0.50):.3f}ms p95={_pct(lat, 0.95):.3f}ms max={max(lat):.3f}ms")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark MotherQueue enqueue / lease+ack throughput")
+    ap.add_argument("--n", type=int, default=2000, help="Jobs per phase")
+    ap.add_argument("--batch", type=int, default=50, help="lease_many batch size")
+    ap.add_argument("--db", default="", help="DB path (default: temp dir, removed afterwards)")
+    ap.add_argument("--scale", type=int, default=0, help="Fill N rows and measure lease latency instead")
+    ap.add_argument("--samples", type=int, default=500, help="Leases timed in --scale mode")
+    ap.add_argument("--legacy-index", action="store_true", help="--scale against the old idx_jobs_pick layout")
+    args = ap.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if not db_path:
+        tmp = tempfile.mkdtemp(prefix="mq_bench_")
+        db_path = os.path.join(tmp, "mother_queue.db")
+
+    try:
+        if args.scale:
+            print(f"[mq_bench] db={db_path} scale={args.scale}")
+            bench_scale(db_path, args.scale, args.samples, args.legacy_index)
+            return 0
+        print(f"[mq_bench] db={db_path} n={args.n}")
+        bench(db_path, persistent=False, n=args.n, batch=args.batch)
+        bench(db_path, persistent=True, n=args.n, batch=args.batch)
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# /web/html/admin/AI/scripts/mqctl.py
+"""
+MotherQueue maintenance CLI (companion to enqueue.py / worker.py).
+
+  mqctl.py archive [--days 7] [--status done,dead] [--batch 1000]
+                   [--archive-dir DIR] [--vacuum-pages 2000] [--full-vacuum]
+  mqctl.py reap
+  mqctl.py stats [--hours 24] [--queue NAME] [--json]
+
+Cron example (nightly retention):
+  30 3 * * * /usr/bin/python3 /web/private/bin/mqctl.py archive --days 14 >> /web/private/logs/mq_maint.log 2>&1
+"""
+import argparse, json, os, sys
+from mq import FINISHED_STATUSES, MotherQueue
+
+DB = os.environ.get("MOTHER_QUEUE_DB", "/web/private/db/memory/mother_queue.db")
+
+def cmd_archive(mq, args):
+    statuses = [s.strip() for s in args.status.split(",") if s.strip()]
+    bad = [s for s in statuses if s not in FINISHED_STATUSES]
+    if bad:
+        print(f"Refusing to archive non-finished status: {', '.join(bad)}", file=sys.stderr)
+        return 1
+
+    stats = mq.archive_finished(
+        older_than_days=args.days,
+        statuses=statuses,
+        batch_size=args.batch,
+        archive_dir=args.archive_dir or None,
+        vacuum_pages=args.vacuum_pages,
+    )
+    print(f"[mqctl] archived={stats['archived']} batches={stats['batches']} "
+          f"vacuumed_pages={stats['vacuum_pages']} archive_dir={args.archive_dir or mq.archive_dir()}")
+
+    pruned = mq.prune_stats(keep_days=args.stats_days)
+    if pruned:
+        print(f"[mqctl] pruned {pruned} stats rows older than {args.stats_days}d")
+
+    if args.full_vacuum:
+        mq.full_vacuum()
+        print("[mqctl] full VACUUM done (auto_vacuum=INCREMENTAL)")
+    return 0
+
+def cmd_reap(mq, args):
+    print(f"[mqctl] reaped={mq.reap_expired()}")
+    return 0
+
+def cmd_stats(mq, args):
+    stats = mq.stats(window_hours=args.hours, queue=args.queue or None)
+    if args.json:
+        print(json.dumps(stats, indent=2, sort_keys=True))
+        return 0
+    if not stats:
+        print("[mqctl] no queues")
+        return 0
+
+    def pct(d):
+        if not d:
+            return "-"
+        return f"n={d['n']} p50={d.get('p50')}ms p95={d.get('p95')}ms p99={d.get('p99')}ms"
+
+    for name in sorted(stats):
+        s = stats[name]
+        counts = " ".join(f"{k}={v}" for k, v in sorted(s["counts"].items())) or "-"
+        events = " ".join(f"{k}={v}" for k, v in sorted(s["events"].items())) or "-"
+        print(f"queue={name}")
+        print(f"  counts   {counts}")
+        print(f"  oldest   {s['oldest_queued_s'] if s['oldest_queued_s'] is not None else '-'}s queued")
+        print(f"  last {args.hours}h {events}")
+        print(f"  retry    rate={s['retry_rate']} dead_rate={s['dead_rate']}")
+        print(f"  wait     {pct(s['wait_ms'])}")
+        print(f"  run      {pct(s['run_ms'])}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="MotherQueue maintenance")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("archive", help="Move old done/dead jobs into monthly archive DBs")
+    p.add_argument("--days", type=float, default=7, help="Archive jobs finished more than N days ago")
+    p.add_argument("--status", default=",".join(FINISHED_STATUSES), help="Comma list of statuses to archive")
+    p.add_argument("--batch", type=int, default=1000, help="Rows moved per transaction")
+    p.add_argument("--archive-dir", default="", help="Archive directory (default: next to the queue DB)")
+    p.add_argument("--vacuum-pages", type=int, default=2000, help="Pages reclaimed by incremental_vacuum (0 = skip)")
+    p.add_argument("--stats-days", type=int, default=30, help="Keep hourly stats rows this many days")
+    p.add_argument("--full-vacuum", action="store_true",
+                   help="Run a full VACUUM afterwards (one-off; converts old DBs to incremental auto_vacuum)")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("reap", help="Requeue running jobs whose lease expired")
+    p.set_defaults(func=cmd_reap)
+
+    p = sub.add_parser("stats", help="Per-queue counts, wait/run percentiles, retry rates")
+    p.add_argument("--hours", type=int, default=24, help="Window for events and latency percentiles")
+    p.add_argument("--queue", default="", help="Only this queue")
+    p.add_argument("--json", action="store_true", help="Machine-readable output")
+    p.set_defaults(func=cmd_stats)
+
+    args = parser.parse_args()
+    with MotherQueue(DB) as mq:
+        return args.func(mq, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ from logging.handlers import RotatingFileHandler
 
 
 from notes_config import get_config, get_private_root
+from bash_tokens import base_command
 
 PRIVATE_ROOT = get_private_root(__file__)
 KB_DB = os.path.join(PRIVATE_ROOT, "db/memory/bash_history.db")
@@ -350,6 +351,8 @@ def main():
 
     for (cmd_id, base_cmd, full_cmd, search_query) in rows:
         processed += 1
+        # Rows ingested before bash_tokens may carry e.g. "ls|grep" or "-u"; re-derive from full_cmd
+        base_cmd = base_command(str(full_cmd or "")) or base_cmd
         try:
             # optional: deprioritize noisy base commands
             # if base_cmd in ('cd', 'ls', 'clear'): continue
@@ -25,6 +25,7 @@ import sqlite3
 import sys
 from typing import Dict, List, Optional
 
+from logtail import tail_lines
 from notes_config import get_private_root
 
 PRIVATE_ROOT = get_private_root(__file__)
@@ -184,13 +185,8 @@ def ensure_notes_schema(db: sqlite3.Connection) -> None:
 
 
 def _tail_lines(path: str, limit: int) -> List[str]:
-    if limit <= 0:
-        return []
-    with open(path, "r", errors="ignore") as f:
-        lines = f.read().splitlines()
     # Keep last N non-empty lines (but preserve original order)
-    out = [s for s in lines if s.strip()]
-    return out[-limit:]
+    return tail_lines(path, limit, skip_blank=True)
 
 
 def find_or_create_parent(
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+bash_tokens.base_command golden checks: a fixed table of edge cases plus
+tests/data/bash_history_sample.tsv (history lines with their expected base
+command: sudo options, env prefixes, subshells, redirections, quoting).
+
+Run: python3 -m unittest discover -s src/scripts/tests
+"""
+import os, sys, unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+import bash_tokens
+
+SAMPLE = os.path.join(HERE, "data", "bash_history_sample.tsv")
+
+GOLDEN = [
+    ("ls -la", "ls"),
+    ("   git status", "git"),
+    ("# 1700000000", ""),
+    ("", ""),
+    ("FOO=1 make -j8", "make"),
+    ("FOO=1", ""),
+    ("FOO=1 && ls", ""),
+    ('FOO="a b" cmd --x', "cmd"),
+    ("x=$(date) ls", "ls"),
+    ("sudo", "sudo"),
+    ("sudo apt update", "apt"),
+    ("sudo -u www-data php artisan migrate", "php"),
+    ("sudo -E FOO=1 make install", "make"),
+    ("sudo -- ls /root", "ls"),
+    ("ls|grep x", "ls"),
+    ("cat /etc/hosts | grep local", "cat"),
+    ("make || echo failed", "make"),
+    ("cd /srv && git pull; systemctl restart app", "cd"),
+    ("(cd build && make)", "cd"),
+    ("{ echo a; echo b; } > out", "echo"),
+    ("\\ls -l", "ls"),
+    ("'my tool' --flag", "my tool"),
+    ("./run.sh --fast", "./run.sh"),
+    ("${HOME}/bin/sync", "${HOME}/bin/sync"),
+    ('echo "unterminated', "echo"),
+    (">out ls", "ls"),
+    ("2>/dev/null ls", "ls"),
+    ("</tmp/in sort", "sort"),
+    (">>log echo hi", "echo"),
+    ("2>&1 make", "make"),
+    ("&>/dev/null rsync -a src/ dst/", "rsync"),
+    ("<<EOF cat", "cat"),
+    ("ls>out", "ls"),
+    ("echo 2 > x", "echo"),
+]
+
+
+
+def load_sample(path: str) -> list:
+    """(line, expected) pairs from a '<expected>\\t<history line>' file; '##' lines are comments."""
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            raw = raw.rstrip("\n")
+            if raw.startswith("##"):
+                continue
+            want, line = raw.split("\t", 1)
+            out.append((line, want))
+    return out
+
+
+class BaseCommandTest(unittest.TestCase):
+    def check(self, cases: list) -> None:
+        for line, want in cases:
+            with self.subTest(line=line):
+                self.assertEqual(bash_tokens.base_command(line), want)
+                self.assertEqual(bash_tokens.base_command.__wrapped__(line), want)
+
+    def test_golden(self):
+        self.check(GOLDEN)
+
+    def test_history_sample(self):
+        cases = load_sample(SAMPLE)
+        self.assertGreater(len(cases), 30)
+        self.check(cases)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+MotherQueue lease ownership: a worker whose lease was reaped and handed to
+another worker must not extend or settle the job any more. Also: the
+job_status_counts backfill on an older DB runs once even when several
+workers start together, and stats() does not count delayed jobs as backlog.
+
+Run: python3 -m unittest discover -s src/scripts/tests
+"""
+import multiprocessing, os, shutil, sys, tempfile, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mq import MotherQueue
+
+
+class LeaseOwnershipTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="mq_test_")
+        self.mq = MotherQueue(os.path.join(self.tmp, "mother_queue.db"))
+        self.job_id = self.mq.enqueue("t", "noop", {}, max_attempts=5)
+
+    def tearDown(self):
+        self.mq.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def job(self):
+        with self.mq._conn() as con:
+            return dict(con.execute("SELECT * FROM jobs WHERE id=?", (self.job_id,)).fetchone())
+
+    def expire_lease(self):
+        with self.mq._conn() as con:
+            con.execute("UPDATE jobs SET locked_until='2000-01-01T00:00:00Z' WHERE id=?", (self.job_id,))
+
+    def test_reaped_then_released_job_belongs_to_new_worker(self):
+        [(job, _)] = self.mq.lease_many("t", limit=1, worker="stale")
+        self.assertTrue(self.mq.heartbeat(job["id"], worker="stale"))
+
+        self.expire_lease()
+        self.assertEqual(self.mq.reap_expired(), 1)
+        [(job, _)] = self.mq.lease_many("t", limit=1, worker="fresh")
+        self.assertEqual(job["id"], self.job_id)
+
+        self.assertFalse(self.mq.heartbeat(self.job_id, worker="stale"))
+        self.assertFalse(self.mq.ack(self.job_id, worker="stale"))
+        self.assertEqual(self.mq.ack_many([self.job_id], worker="stale"), 0)
+        self.assertEqual(self.mq.fail_many([(self.job_id, "late")], worker="stale"), 0)
+        self.mq.fail(self.job_id, "late", worker="stale")
+        row = self.job()
+        self.assertEqual((row["status"], row["locked_by"], row["attempts"]), ("running", "fresh", 2))
+
+        self.assertTrue(self.mq.heartbeat(self.job_id, worker="fresh"))
+        self.assertTrue(self.mq.ack(self.job_id, worker="fresh"))
+        self.assertEqual(self.job()["status"], "done")
+
+    def test_oldest_queued_ignores_delayed_jobs(self):
+        delayed = self.mq.enqueue("t", "noop", {}, priority=1, run_after="2999-01-01T00:00:00Z")
+        with self.mq._conn() as con:
+            con.execute("UPDATE jobs SET created_at='2000-01-01T00:00:00Z' WHERE id=?", (delayed,))
+        age = self.mq.stats(queue="t")["t"]["oldest_queued_s"]
+        self.assertIsNotNone(age)
+        self.assertLess(age, 60)
+
+
+def _open_queue(db_path, start):
+    start.wait()
+    MotherQueue(db_path).close()
+
+
+class StatsBackfillTest(unittest.TestCase):
+    def test_concurrent_openers_backfill_once(self):
+        tmp = tempfile.mkdtemp(prefix="mq_test_")
+        self.addCleanup(shutil.rmtree, tmp, True)
+        db_path = os.path.join(tmp, "mother_queue.db")
+        with MotherQueue(db_path) as mq:
+            mq.enqueue_many({"queue": "t", "name": "noop", "payload": {}} for _ in range(50))
+            with mq._conn() as con:  # a DB from before the stats tables
+                con.execute("DROP TABLE job_status_counts")
+                for event in ("insert", "delete", "update"):
+                    con.execute(f"DROP TRIGGER trg_jobs_stats_{event}")
+
+        start = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=_open_queue, args=(db_path, start)) for _ in range(6)]
+        for p in procs:
+            p.start()
+        start.set()
+        for p in procs:
+            p.join(30)
+        self.assertEqual([p.exitcode for p in procs], [0] * len(procs))
+        with MotherQueue(db_path) as mq:
+            self.assertEqual(mq.stats()["t"]["counts"], {"queued": 50})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+mq_handlers script loading, as worker.py does it: the worker's cwd and sys.path
+are not the script's directory.
+
+Run: python3 -m unittest discover -s src/scripts/tests
+"""
+import logging, os, subprocess, sys, tempfile, textwrap, unittest
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INGEST = os.path.join(SCRIPTS, "ingest_bash_history_to_kb.py")
+
+
+class RegisterScriptTest(unittest.TestCase):
+    def run_child(self, code: str) -> subprocess.CompletedProcess:
+        # A fresh interpreter whose sys.path has only mq_handlers' directory copied in
+        # (not the scripts dir itself), started from an unrelated cwd.
+        with tempfile.TemporaryDirectory() as tmp:
+            lib = os.path.join(tmp, "lib")
+            os.makedirs(lib)
+            with open(os.path.join(SCRIPTS, "mq_handlers.py")) as src, \
+                    open(os.path.join(lib, "mq_handlers.py"), "w") as dst:
+                dst.write(src.read())
+            env = dict(os.environ, PYTHONPATH=lib)
+            return subprocess.run([sys.executable, "-c", textwrap.dedent(code)], cwd=tmp, env=env,
+                                  capture_output=True, text=True, timeout=60)
+
+    def test_ingest_script_imports_its_siblings(self):
+        p = self.run_child(f"""
+            import sys
+            from mq_handlers import HandlerRegistry
+            assert not any(p.endswith("scripts") for p in sys.path[1:]), sys.path
+            reg = HandlerRegistry()
+            reg.register_script("ingest_bash_history", {INGEST!r}, lambda payload: ["--help"])
+            reg.run("ingest_bash_history", {{}}, {{}})
+            print("ok", reg.metrics()["ingest_bash_history"]["runs"])
+        """)
+        self.assertEqual(p.returncode, 0, p.stderr)
+        self.assertIn("ok 1", p.stdout)
+
+
+class IngestLockTest(unittest.TestCase):
+    def test_lock_is_owned_by_one_call(self):
+        sys.path.insert(0, SCRIPTS)
+        try:
+            import ingest_bash_history_to_kb as ing
+        finally:
+            sys.path.remove(SCRIPTS)
+        log = logging.LoggerAdapter(logging.getLogger("test_mq_handlers"), {})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "locks", "ingest.lock")
+            a = ing.lock_or_exit(path, log)
+            self.assertIsNotNone(a)
+            # A concurrent main() in the same worker process must see the lock as busy ...
+            self.assertIsNone(ing.lock_or_exit(path, log))
+            ing.release_lock(a)
+            # ... and only the owner's release frees it.
+            b = ing.lock_or_exit(path, log)
+            self.assertIsNotNone(b)
+            ing.release_lock(b)
+
+
+if __name__ == "__main__":
+    unittest.main()